@@ -30,39 +30,14 @@ export function Dashboard() {
   });
 
   useEffect(() => {
-    // Simular dados do dashboard
-    const mockData = {
-      summary: {
-        total_surgeries: 156,
-        pending_surgeries: 23,
-        approved_surgeries: 98,
-        rejected_surgeries: 12,
-        total_reimbursement: 485750.00
-      },
-      monthly_surgeries: [
-        { month: '2024-01', count: 18 },
-        { month: '2024-02', count: 25 },
-        { month: '2024-03', count: 32 },
-        { month: '2024-04', count: 28 },
-        { month: '2024-05', count: 35 },
-        { month: '2024-06', count: 18 }
-      ],
-      surgeries_by_type: [
-        { type: 'Catarata', count: 45 },
-        { type: 'Artroscopia', count: 32 },
-        { type: 'Colecistectomia', count: 28 },
-        { type: 'Hernia', count: 25 },
-        { type: 'Outros', count: 26 }
-      ],
-      surgeries_by_status: [
-        { status: 'approved', count: 98 },
-        { status: 'pending', count: 23 },
-        { status: 'in_analysis', count: 23 },
-        { status: 'rejected', count: 12 }
-      ]
-    };
-    
-    setDashboardData(mockData);
+    fetch('/api/dashboard')
+      .then((response) => response.json())
+      .then((data) => {
+        if (!data.error) {
+          setDashboardData(data);
+        }
+      })
+      .catch((error) => console.error('Erro ao carregar o dashboard:', error));
   }, []);
 
   const formatCurrency = (value) => {
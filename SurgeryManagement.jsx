@@ -33,6 +33,7 @@ import {
 export function SurgeryManagement() {
   const [surgeries, setSurgeries] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [statusFilter, setStatusFilter] = useState('all');
   const [isNewSurgeryDialogOpen, setIsNewSurgeryDialogOpen] = useState(false);
 
@@ -86,11 +87,44 @@ export function SurgeryManagement() {
     setSurgeries(mockSurgeries);
   }, []);
 
-  const filteredSurgeries = surgeries.filter(surgery => {
-    const matchesSearch = surgery.patient_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         surgery.surgery_type.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesStatus = statusFilter === 'all' || surgery.status === statusFilter;
-    return matchesSearch && matchesStatus;
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!term) {
+      setSearchResults(null);
+      return;
+    }
+
+    // Busca no servidor (cirurgias e texto dos documentos), aguardando o usuário parar de digitar.
+    // Um novo termo cancela a busca anterior: uma resposta atrasada não sobrescreve a atual
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch(`/api/search?q=${encodeURIComponent(term)}&per_page=100`, { signal: controller.signal })
+        .then((response) => response.json())
+        .then((data) => {
+          if (!data.error) {
+            // Documentos encontrados trazem a cirurgia a que pertencem; cada cirurgia aparece uma vez
+            const seen = new Set();
+            setSearchResults(
+              data.items
+                .map((item) => item.surgery)
+                .filter((surgery) => !seen.has(surgery.id) && seen.add(surgery.id))
+            );
+          }
+        })
+        .catch((error) => {
+          if (error.name !== 'AbortError') {
+            console.error('Erro na busca:', error);
+          }
+        });
+    }, 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
+  const filteredSurgeries = (searchResults ?? surgeries).filter(surgery => {
+    return statusFilter === 'all' || surgery.status === statusFilter;
   });
 
   const formatCurrency = (value) => {
@@ -1,123 +1,216 @@
-import openai
-import os
+import re
+import json
+import threading
 from flask import current_app
+from src.services.cache import TTLCache
+from src.services.intent_classifier import INTENTS
+from src.services.lifecycle import after_fork
+from src.services.metrics import integration_timer, record_error
+from src.services.report_builder import ReportBuilder, aggregate_rows
 
-class AIService:
-    def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY'),
-            base_url=os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+# Versões dos prompts: altere ao mudar o texto do prompt para não reaproveitar respostas antigas do cache
+INTENT_PROMPT_VERSION = 'intent-v1'
+EXTRACTION_PROMPT_VERSION = 'extraction-v1'
+
+# Resposta fixa a cumprimentos (sem LLM) e também a resposta quando o LLM falha
+GREETING_RESPONSE = "Olá! Sou o assistente da REVERSE. Como posso ajudá-lo com seu reembolso de cirurgia hoje?"
+
+class BaseAIService:
+    """Prompts, modelo e cache compartilhados pelo AIService e pelo AsyncAIService"""
+
+    def __init__(self, cache=None):
+        # O SDK da OpenAI é o import mais pesado do app: só carrega quando o serviço é usado
+        import openai
+
+        config = current_app.config
+        self.client = self._create_client(openai, config)
+        self.model = config.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+        self.cache = cache or TTLCache(
+            maxsize=config.get('AI_CACHE_MAXSIZE', 2048),
+            ttl=config.get('AI_CACHE_TTL_SECONDS', 3600),
+            name='ai'
         )
     
-    def generate_response(self, user_message, phone_number):
-        """Gerar resposta usando ChatGPT/LLM"""
+    @staticmethod
+    def _client_options(config):
+        return {
+            'api_key': config.get('OPENAI_API_KEY'),
+            'base_url': config.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+        }
+    
+    def _cache_key(self, prompt_version, message, fold_case):
+        """Chave do cache: versão do prompt + modelo + mensagem normalizada"""
+        normalized = re.sub(r'\s+', ' ', message).strip()
+        if fold_case:
+            normalized = normalized.lower().rstrip('!?.,; ')
+        return (prompt_version, self.model, normalized)
+    
+    @staticmethod
+    def _parse_intent(content):
+        """Intenção respondida pelo LLM, ou None se não for uma das categorias conhecidas"""
+        intent = content.strip().strip('.').lower()
+        return intent if intent in INTENTS else None
+    
+    def cache_stats(self):
+        """Estatísticas do cache de respostas"""
+        return self.cache.stats()
+    
+    def _response_request(self, user_message, history=None, context=None):
+        """Argumentos do chat completions da resposta ao paciente"""
+        system_prompt = """
+        Você é um assistente virtual da REVERSE, uma empresa especializada em gestão de cirurgias e reembolso.
+        
+        Suas responsabilidades:
+        - Ajudar pacientes com dúvidas sobre reembolso de cirurgias
+        - Orientar sobre documentação necessária
+        - Fornecer informações sobre status de processos
+        - Ser sempre cordial, profissional e prestativo
+        
+        Tipos de documentos necessários:
+        - Guia médica
+        - CNH ou RG
+        - Carteirinha do plano de saúde
+        - Relatórios médicos
+        - Laudos
+        
+        Se o paciente perguntar sobre status, oriente-o a fornecer CPF ou nome completo.
+        Se precisar de documentos, explique quais são necessários e como enviar.
+        
+        Mantenha as respostas concisas e úteis.
+        """
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        if context:
+            messages.append({"role": "system", "content": f"Dados do paciente desta conversa: {context}"})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": user_message})
+        return {'messages': messages, 'max_tokens': 300, 'temperature': 0.7}
+    
+    def _intent_request(self, message):
+        system_prompt = """
+        Classifique a intenção da mensagem do usuário em uma das categorias:
+        - status_inquiry: pergunta sobre status do reembolso
+        - document_submission: envio de documentos
+        - general_question: pergunta geral sobre processo
+        - complaint: reclamação ou problema
+        - greeting: cumprimento ou saudação
+        
+        Responda apenas com a categoria.
+        """
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            'max_tokens': 50,
+            'temperature': 0.1
+        }
+    
+    def _extraction_request(self, message):
+        system_prompt = """
+        Extraia as seguintes informações da mensagem, se disponíveis:
+        - Nome completo
+        - CPF
+        - Telefone
+        - Tipo de cirurgia
+        - Data da cirurgia
+        - Nome do médico
+        - Hospital
+        
+        Retorne em formato JSON. Se alguma informação não estiver disponível, use null.
+        """
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            'max_tokens': 200,
+            'temperature': 0.1
+        }
+
+class AIService(BaseAIService):
+    @staticmethod
+    def _create_client(openai, config):
+        return openai.OpenAI(**BaseAIService._client_options(config))
+    
+    def _chat(self, **kwargs):
+        """Chamada ao chat completions, medida na métrica de integrações"""
+        with integration_timer('openai', 'chat.completions'):
+            return self.client.chat.completions.create(model=self.model, **kwargs)
+    
+    def generate_response(self, user_message, phone_number, history=None, context=None):
+        """Gerar resposta usando ChatGPT/LLM
+
+        `history` são as últimas mensagens da conversa ({'role', 'content'}) e
+        `context` um resumo da cirurgia do paciente, quando já identificado.
+        """
         try:
-            system_prompt = """
-            Você é um assistente virtual da REVERSE, uma empresa especializada em gestão de cirurgias e reembolso.
-            
-            Suas responsabilidades:
-            - Ajudar pacientes com dúvidas sobre reembolso de cirurgias
-            - Orientar sobre documentação necessária
-            - Fornecer informações sobre status de processos
-            - Ser sempre cordial, profissional e prestativo
-            
-            Tipos de documentos necessários:
-            - Guia médica
-            - CNH ou RG
-            - Carteirinha do plano de saúde
-            - Relatórios médicos
-            - Laudos
-            
-            Se o paciente perguntar sobre status, oriente-o a fornecer CPF ou nome completo.
-            Se precisar de documentos, explique quais são necessários e como enviar.
-            
-            Mantenha as respostas concisas e úteis.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=300,
-                temperature=0.7
-            )
-            
+            response = self._chat(**self._response_request(user_message, history, context))
             return response.choices[0].message.content.strip()
         
         except Exception as e:
             print(f"AI Service error: {str(e)}")
-            return "Olá! Sou o assistente da REVERSE. Como posso ajudá-lo com seu reembolso de cirurgia hoje?"
+            record_error('ai_service', 'generate_response')
+            return GREETING_RESPONSE
     
     def classify_intent(self, message):
         """Classificar a intenção da mensagem"""
+        cache_key = self._cache_key(INTENT_PROMPT_VERSION, message, fold_case=True)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            system_prompt = """
-            Classifique a intenção da mensagem do usuário em uma das categorias:
-            - status_inquiry: pergunta sobre status do reembolso
-            - document_submission: envio de documentos
-            - general_question: pergunta geral sobre processo
-            - complaint: reclamação ou problema
-            - greeting: cumprimento ou saudação
-            
-            Responda apenas com a categoria.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=50,
-                temperature=0.1
-            )
-            
-            return response.choices[0].message.content.strip()
+            response = self._chat(**self._intent_request(message))
+            intent = self._parse_intent(response.choices[0].message.content)
+            if intent is None:
+                # Resposta fora das categorias não vai para o cache: a próxima mensagem igual pergunta de novo
+                return "general_question"
+            self.cache.set(cache_key, intent)
+            return intent
         
         except Exception as e:
             print(f"Intent classification error: {str(e)}")
+            record_error('ai_service', 'classify_intent')
             return "general_question"
     
     def extract_patient_info(self, message):
         """Extrair informações do paciente da mensagem"""
+        # Sem normalizar maiúsculas: nomes e dados extraídos dependem do texto original
+        cache_key = self._cache_key(EXTRACTION_PROMPT_VERSION, message, fold_case=False)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         try:
-            system_prompt = """
-            Extraia as seguintes informações da mensagem, se disponíveis:
-            - Nome completo
-            - CPF
-            - Telefone
-            - Tipo de cirurgia
-            - Data da cirurgia
-            - Nome do médico
-            - Hospital
-            
-            Retorne em formato JSON. Se alguma informação não estiver disponível, use null.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=200,
-                temperature=0.1
-            )
-            
-            import json
-            return json.loads(response.choices[0].message.content.strip())
+            response = self._chat(**self._extraction_request(message))
+            info = json.loads(response.choices[0].message.content.strip())
+            self.cache.set(cache_key, info)
+            return dict(info)
         
         except Exception as e:
             print(f"Info extraction error: {str(e)}")
+            record_error('ai_service', 'extract_patient_info')
             return {}
     
-    def generate_report_summary(self, surgeries_data):
-        """Gerar resumo de relatório usando IA"""
-        try:
+    def _report_completion(self, system_prompt, content, max_tokens):
+        """Chamada ao LLM dos relatórios; retorna (texto, tokens usados)"""
+        response = self._chat(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.5
+        )
+        usage = getattr(response, 'usage', None)
+        return response.choices[0].message.content.strip(), getattr(usage, 'total_tokens', 0) or 0
+    
+    def summarize_report_chunk(self, overview, chunk, final=True):
+        """Resumir um bloco de dados agregados de cirurgias (etapa map do relatório)"""
+        if final:
             system_prompt = """
-            Gere um resumo executivo baseado nos dados de cirurgias fornecidos.
+            Gere um resumo executivo baseado nos dados agregados de cirurgias fornecidos.
             Inclua:
             - Total de cirurgias
             - Status dos processos
@@ -126,20 +219,119 @@ class AIService:
             
             Seja conciso e profissional.
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": str(surgeries_data)}
-                ],
-                max_tokens=500,
-                temperature=0.5
-            )
-            
-            return response.choices[0].message.content.strip()
+        else:
+            system_prompt = """
+            Você recebe os totais de um período e uma parte dos dados agregados de cirurgias.
+            Liste em tópicos curtos os fatos e insights relevantes desta parte
+            (concentrações, valores fora do padrão, pendências), citando os números.
+            Não repita os totais gerais.
+            """
+        content = f"{overview}\n\n{chunk}" if chunk else overview
+        return self._report_completion(system_prompt, content, max_tokens=500 if final else 300)
+    
+    def merge_report_summaries(self, overview, partials, final=True):
+        """Combinar resumos parciais do relatório (etapa reduce)"""
+        system_prompt = """
+        Combine os resumos parciais de um relatório de cirurgias em um único texto,
+        sem repetir informações. %s
+        """ % ("Gere um resumo executivo com total de cirurgias, status dos processos, valores de reembolso e principais insights. Seja conciso e profissional."
+               if final else "Mantenha os tópicos curtos e os números citados.")
+        content = overview + '\n\n' + '\n\n'.join(f'Parte {i}:\n{partial}' for i, partial in enumerate(partials, 1))
+        return self._report_completion(system_prompt, content, max_tokens=500 if final else 400)
+    
+    def generate_report_summary(self, surgeries_data):
+        """Gerar resumo de relatório usando IA
+        
+        Aceita os agregados de report_builder.aggregate_period ou uma lista de cirurgias
+        (dicts), que é agregada localmente antes de ir para o LLM.
+        """
+        try:
+            aggregates = surgeries_data if isinstance(surgeries_data, dict) else aggregate_rows(surgeries_data)
+            summary, usage = ReportBuilder.from_config(self, current_app.config).summarize(aggregates)
+            return summary
         
         except Exception as e:
             print(f"Report generation error: {str(e)}")
+            record_error('ai_service', 'generate_report_summary')
             return "Erro ao gerar resumo do relatório."
 
+class AsyncAIService(BaseAIService):
+    """Chamadas da conversa do WhatsApp com o AsyncOpenAI (modo de ingestão 'async')
+
+    Mesmos prompts e fallbacks do AIService; com `cache=get_ai_service().cache`,
+    as intenções já classificadas valem para os dois. Relatórios continuam no AIService.
+    """
+    
+    @staticmethod
+    def _create_client(openai, config):
+        return openai.AsyncOpenAI(**BaseAIService._client_options(config))
+    
+    async def _chat(self, **kwargs):
+        with integration_timer('openai', 'chat.completions'):
+            return await self.client.chat.completions.create(model=self.model, **kwargs)
+    
+    async def generate_response(self, user_message, phone_number, history=None, context=None):
+        try:
+            response = await self._chat(**self._response_request(user_message, history, context))
+            return response.choices[0].message.content.strip()
+        
+        except Exception as e:
+            print(f"AI Service error: {str(e)}")
+            record_error('ai_service', 'generate_response')
+            return GREETING_RESPONSE
+    
+    async def classify_intent(self, message):
+        cache_key = self._cache_key(INTENT_PROMPT_VERSION, message, fold_case=True)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._chat(**self._intent_request(message))
+            intent = self._parse_intent(response.choices[0].message.content)
+            if intent is None:
+                # Resposta fora das categorias não vai para o cache: a próxima mensagem igual pergunta de novo
+                return "general_question"
+            self.cache.set(cache_key, intent)
+            return intent
+        
+        except Exception as e:
+            print(f"Intent classification error: {str(e)}")
+            record_error('ai_service', 'classify_intent')
+            return "general_question"
+    
+    async def extract_patient_info(self, message):
+        cache_key = self._cache_key(EXTRACTION_PROMPT_VERSION, message, fold_case=False)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        try:
+            response = await self._chat(**self._extraction_request(message))
+            info = json.loads(response.choices[0].message.content.strip())
+            self.cache.set(cache_key, info)
+            return dict(info)
+        
+        except Exception as e:
+            print(f"Info extraction error: {str(e)}")
+            record_error('ai_service', 'extract_patient_info')
+            return {}
+
+_ai_service = None
+_ai_service_lock = threading.Lock()
+
+def get_ai_service():
+    """Obter o AIService compartilhado do processo (um cliente OpenAI e um cache por worker)"""
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                _ai_service = AIService()
+    return _ai_service
+
+@after_fork
+def _discard_inherited_service():
+    """O cliente OpenAI (pool httpx) criado antes do fork não é usado pelo filho"""
+    global _ai_service, _ai_service_lock
+    _ai_service = None
+    _ai_service_lock = threading.Lock()
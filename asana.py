@@ -1,57 +1,157 @@
 from flask import Blueprint, request, jsonify, current_app
-import requests
-from datetime import datetime
+import hashlib
+import hmac
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
 from src.models.user import db
 from src.models.surgery import Surgery
+from src.models.document import Document
+from src.models.asana_webhook_event import AsanaWebhookEvent
+from src.models.webhook_secret import WebhookSecret
+from src.services.http_client import get_client
+from src.services.lifecycle import after_fork
+from src.services.metrics import record_error
+from src.services.job_queue import acquire_lock, enqueue_many, register_handler, release_lock, renew_lock
+
+# A Batch API do Asana aceita no máximo 10 ações por requisição
+ASANA_BATCH_MAX_ACTIONS = 10
+
+# Seção do projeto no Asana -> status interno (nomes comparados em minúsculas)
+ASANA_SECTION_STATUS = {
+    'pendente': 'pending', 'pending': 'pending', 'not started': 'pending',
+    'em análise': 'in_analysis', 'em analise': 'in_analysis', 'in progress': 'in_analysis',
+    'aprovado': 'approved', 'aprovada': 'approved', 'approved': 'approved',
+    'rejeitado': 'rejected', 'rejeitada': 'rejected', 'rejected': 'rejected',
+    'concluído': 'completed', 'concluido': 'completed', 'completed': 'completed'
+}
+FINAL_STATUSES = ('approved', 'rejected', 'completed')
+# Etapa de cada status: o webhook só move a cirurgia para uma etapa posterior
+STATUS_PROGRESS = {'pending': 0, 'in_analysis': 1, 'approved': 2, 'rejected': 2, 'completed': 3}
+# Trava (tabela lease_locks) que impede duas sincronizações ao mesmo tempo
+ASANA_SYNC_LOCK = 'asana_sync'
+
+class SyncAlreadyRunning(Exception):
+    """Outra sincronização com o Asana está em andamento (ou a trava desta foi perdida)"""
+
+class AsanaRateLimited(Exception):
+    """429 do Asana com Retry-After maior que HTTP_BACKOFF_MAX (o cliente HTTP não esperou)"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Asana rate limited: retry after {retry_after:g}s')
+        self.retry_after = retry_after
+
+def retry_after_seconds(response, default=60.0):
+    """Segundos do cabeçalho Retry-After (ou `default` quando ausente/inválido)"""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return default
 
 asana_bp = Blueprint('asana', __name__)
 
 class AsanaService:
-    def __init__(self):
-        self.api_url = current_app.config.get('ASANA_API_URL', 'https://app.asana.com/api/1.0')
-        self.api_token = current_app.config.get('ASANA_API_TOKEN')
-        self.headers = {
-            'Authorization': f'Bearer {self.api_token}',
-            'Content-Type': 'application/json'
+    def __init__(self, client=None):
+        self.client = client or get_client('asana')
+        self.project_id = current_app.config.get('ASANA_PROJECT_ID')
+    
+    def task_payload(self, surgery_data):
+        """Dados da tarefa do Asana para uma cirurgia"""
+        return {
+            'name': f"Reembolso - {surgery_data['patient_name']} - {surgery_data['surgery_type']}",
+            'notes': f"""
+            Paciente: {surgery_data['patient_name']}
+            CPF: {surgery_data['patient_cpf']}
+            Telefone: {surgery_data['patient_phone']}
+            Cirurgia: {surgery_data['surgery_type']}
+            Data da Cirurgia: {surgery_data['surgery_date']}
+            Médico: {surgery_data['doctor_name']}
+            Hospital: {surgery_data['hospital_name']}
+            Convênio: {surgery_data['insurance_company']}
+            """,
+            'projects': [self.project_id],
+            'due_on': datetime.now().strftime('%Y-%m-%d')
         }
     
     def create_task(self, surgery_data):
         """Criar tarefa no Asana para uma cirurgia"""
         try:
-            task_data = {
-                'data': {
-                    'name': f"Reembolso - {surgery_data['patient_name']} - {surgery_data['surgery_type']}",
-                    'notes': f"""
-                    Paciente: {surgery_data['patient_name']}
-                    CPF: {surgery_data['patient_cpf']}
-                    Telefone: {surgery_data['patient_phone']}
-                    Cirurgia: {surgery_data['surgery_type']}
-                    Data da Cirurgia: {surgery_data['surgery_date']}
-                    Médico: {surgery_data['doctor_name']}
-                    Hospital: {surgery_data['hospital_name']}
-                    Convênio: {surgery_data['insurance_company']}
-                    """,
-                    'projects': [current_app.config.get('ASANA_PROJECT_ID')],
-                    'due_on': datetime.now().strftime('%Y-%m-%d')
-                }
-            }
+            task_data = {'data': self.task_payload(surgery_data)}
             
-            response = requests.post(
-                f'{self.api_url}/tasks',
-                headers=self.headers,
-                json=task_data
-            )
+            response = self.client.post('/tasks', json=task_data)
             
             if response.status_code == 201:
                 return response.json()['data']['gid']
             else:
                 print(f"Asana API error: {response.text}")
+                record_error('asana', 'create_task')
                 return None
         
         except Exception as e:
             print(f"Error creating Asana task: {str(e)}")
+            record_error('asana', 'create_task')
             return None
     
+    def create_tasks_batch(self, surgeries):
+        """Criar até 10 tarefas numa única chamada à Batch API
+        
+        `surgeries` é uma lista de (surgery_id, surgery_data). Retorna (criadas, erros):
+        dicts surgery_id -> gid e surgery_id -> mensagem. 429 na requisição do lote é
+        refeito pelo cliente HTTP respeitando Retry-After; quando a espera passa de
+        HTTP_BACKOFF_MAX, levanta AsanaRateLimited (nenhuma tarefa do lote foi criada).
+        """
+        actions = [
+            {'relative_path': '/tasks', 'method': 'post', 'data': self.task_payload(surgery_data), 'options': {'fields': ['gid']}}
+            for surgery_id, surgery_data in surgeries
+        ]
+        try:
+            # Sem retentativa em 5xx: parte do lote pode ter sido criada (o sync seguinte refaz só o que faltou)
+            response = self.client.post('/batch', json={'data': {'actions': actions}}, retry=False)
+            if response.status_code == 429:
+                raise AsanaRateLimited(retry_after_seconds(response))
+            if response.status_code != 200:
+                print(f"Asana batch API error: {response.text}")
+                record_error('asana', 'create_tasks_batch')
+                return {}, {surgery_id: f'HTTP {response.status_code}' for surgery_id, _ in surgeries}
+            results = response.json()['data']
+        except AsanaRateLimited:
+            raise
+        except Exception as e:
+            print(f"Error creating Asana tasks in batch: {str(e)}")
+            record_error('asana', 'create_tasks_batch')
+            return {}, {surgery_id: str(e) for surgery_id, _ in surgeries}
+        
+        created, errors = {}, {}
+        for (surgery_id, _), result in zip(surgeries, results):
+            if result.get('status_code') == 201:
+                created[surgery_id] = result['body']['data']['gid']
+            else:
+                errors[surgery_id] = f"HTTP {result.get('status_code')}: {result.get('body')}"
+        return created, errors
+    
+    def get_tasks(self, task_gids, concurrency=4):
+        """Ler conclusão e seções de várias tarefas pela Batch API; retorna gid -> dados"""
+        actions = [
+            {'relative_path': f'/tasks/{gid}', 'method': 'get', 'options': {'fields': ['completed', 'memberships.section.name']}}
+            for gid in task_gids
+        ]
+        batches = [actions[i:i + ASANA_BATCH_MAX_ACTIONS] for i in range(0, len(actions), ASANA_BATCH_MAX_ACTIONS)]
+        
+        def run(batch):
+            response = self.client.post('/batch', json={'data': {'actions': batch}})
+            if response.status_code != 200:
+                raise RuntimeError(f'Asana batch API error: HTTP {response.status_code}')
+            return response.json()['data']
+        
+        tasks = {}
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for batch, results in zip(batches, executor.map(run, batches)):
+                for action, result in zip(batch, results):
+                    if result.get('status_code') == 200:
+                        tasks[action['relative_path'].rsplit('/', 1)[-1]] = result['body']['data']
+        return tasks
+    
     def update_task_status(self, task_id, status, notes=None):
         """Atualizar status da tarefa no Asana"""
         try:
@@ -73,16 +173,13 @@ class AsanaService:
             if notes:
                 update_data['data']['notes'] = notes
             
-            response = requests.put(
-                f'{self.api_url}/tasks/{task_id}',
-                headers=self.headers,
-                json=update_data
-            )
+            response = self.client.put(f'/tasks/{task_id}', json=update_data)
             
             return response.status_code == 200
         
         except Exception as e:
             print(f"Error updating Asana task: {str(e)}")
+            record_error('asana', 'update_task')
             return False
     
     def add_comment(self, task_id, comment):
@@ -94,18 +191,136 @@ class AsanaService:
                 }
             }
             
-            response = requests.post(
-                f'{self.api_url}/tasks/{task_id}/stories',
-                headers=self.headers,
-                json=comment_data
-            )
+            response = self.client.post(f'/tasks/{task_id}/stories', json=comment_data)
             
             return response.status_code == 201
         
         except Exception as e:
             print(f"Error adding Asana comment: {str(e)}")
+            record_error('asana', 'add_comment')
             return False
 
+_asana_service = None
+
+def get_asana_service():
+    """Obter o AsanaService compartilhado do processo"""
+    global _asana_service
+    if _asana_service is None:
+        _asana_service = AsanaService()
+    return _asana_service
+
+@after_fork
+def _discard_inherited_service():
+    """O serviço guarda o cliente HTTP do processo pai; o filho cria o seu"""
+    global _asana_service
+    _asana_service = None
+
+def sync_missing_tasks(asana_service=None, limit=None, batch_size=None, concurrency=None):
+    """Criar tarefas no Asana para todas as cirurgias sem asana_task_id
+    
+    As cirurgias são lidas em páginas por id; cada página vira vários lotes da Batch
+    API executados com no máximo `concurrency` requisições em andamento, e os ids das
+    tarefas criadas são gravados com um único UPDATE em lote por página. Como o
+    progresso é gravado a cada página, uma execução interrompida retoma de onde parou.
+    Duas sincronizações simultâneas gerariam tarefas duplicadas: a trava
+    ASANA_SYNC_LOCK, renovada a cada página, garante uma por vez entre todos os
+    processos; sem ela, levanta SyncAlreadyRunning.
+    
+    Um 429 com Retry-After longo encerra a execução sem marcar as cirurgias do lote
+    como falhas: o resultado traz `retry_after` e um job asana_sync é agendado para
+    depois dessa espera, retomando pelas cirurgias que ainda não têm tarefa.
+    """
+    lock_seconds = current_app.config.get('ASANA_SYNC_LOCK_SECONDS', 600)
+    token = acquire_lock(ASANA_SYNC_LOCK, lock_seconds)
+    if token is None:
+        raise SyncAlreadyRunning('Outra sincronização com o Asana está em andamento')
+    try:
+        result = _sync_missing_tasks(token, lock_seconds, asana_service, limit, batch_size, concurrency)
+    finally:
+        release_lock(ASANA_SYNC_LOCK, token)
+    
+    if result.get('retry_after') is not None:
+        available_at = datetime.utcnow() + timedelta(seconds=result['retry_after'])
+        processed = result['created'] + result['failed']
+        enqueue_many('asana_sync', [(
+            f"asana_sync:retry:{available_at.strftime('%Y%m%d%H%M%S')}",
+            {'limit': None if limit is None else limit - processed}
+        )], available_at=available_at)
+    return result
+
+def _sync_missing_tasks(token, lock_seconds, asana_service, limit, batch_size, concurrency):
+    asana_service = asana_service or get_asana_service()
+    batch_size = min(batch_size or current_app.config.get('ASANA_BATCH_SIZE', ASANA_BATCH_MAX_ACTIONS), ASANA_BATCH_MAX_ACTIONS)
+    concurrency = max(1, concurrency or current_app.config.get('ASANA_SYNC_CONCURRENCY', 4))
+    
+    result = {'created': 0, 'failed': 0, 'errors': {}}
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while limit is None or result['created'] + result['failed'] < limit:
+            page_size = batch_size * concurrency
+            if limit is not None:
+                page_size = min(page_size, limit - result['created'] - result['failed'])
+            
+            surgeries = Surgery.query.filter(Surgery.asana_task_id.is_(None), Surgery.id > last_id) \
+                .order_by(Surgery.id).limit(page_size).all()
+            if not surgeries:
+                break
+            last_id = surgeries[-1].id
+            # Trava expirada e assumida por outro processo: parar antes de criar tarefas em duplicidade
+            if not renew_lock(ASANA_SYNC_LOCK, token, lock_seconds):
+                raise SyncAlreadyRunning('Trava da sincronização com o Asana perdida')
+            
+            # Resumo dos documentos da página inteira numa consulta, não uma por cirurgia
+            summaries = Document.summaries_for([surgery.id for surgery in surgeries])
+            items = [
+                (surgery.id, surgery.to_dict(include_documents=False,
+                                             document_summary=summaries.get(surgery.id, Document.empty_summary())))
+                for surgery in surgeries
+            ]
+            batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+            
+            created = {}
+            retry_after = None
+            for future in [executor.submit(asana_service.create_tasks_batch, batch) for batch in batches]:
+                try:
+                    batch_created, batch_errors = future.result()
+                except AsanaRateLimited as e:
+                    # Lote não criado: fica sem tarefa e entra na próxima execução
+                    retry_after = max(retry_after or 0.0, e.retry_after)
+                    continue
+                created.update(batch_created)
+                result['errors'].update(batch_errors)
+                result['failed'] += len(batch_errors)
+            
+            if created:
+                db.session.execute(update(Surgery), [
+                    {'id': surgery_id, 'asana_task_id': task_id} for surgery_id, task_id in created.items()
+                ])
+            db.session.commit()
+            result['created'] += len(created)
+            
+            if retry_after is not None:
+                # Não disparar a próxima página contra um limite que ainda vale
+                result['retry_after'] = retry_after
+                break
+    
+    result['remaining'] = Surgery.query.filter(Surgery.asana_task_id.is_(None)).count()
+    return result
+
+def handle_sync_job(payload):
+    """Executar a sincronização em lote retirada da fila"""
+    try:
+        result = sync_missing_tasks(limit=payload.get('limit'))
+    except SyncAlreadyRunning as e:
+        # A sincronização em andamento já cobre as cirurgias sem tarefa
+        print(f"Asana sync skipped: {str(e)}")
+        return
+    print(f"Asana sync: {result['created']} tarefas criadas, {result['failed']} falhas, {result['remaining']} pendentes")
+    if result.get('retry_after') is not None:
+        print(f"Asana sync: limite de requisições atingido, retomando em {result['retry_after']:g}s")
+
+register_handler('asana_sync', handle_sync_job)
+
 @asana_bp.route('/asana/create-task', methods=['POST'])
 def create_asana_task():
     """Criar tarefa no Asana para uma cirurgia"""
@@ -115,8 +330,8 @@ def create_asana_task():
         
         surgery = Surgery.query.get_or_404(surgery_id)
         
-        asana_service = AsanaService()
-        task_id = asana_service.create_task(surgery.to_dict())
+        asana_service = get_asana_service()
+        task_id = asana_service.create_task(surgery.to_dict(include_documents=False))
         
         if task_id:
             surgery.asana_task_id = task_id
@@ -132,6 +347,29 @@ def create_asana_task():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@asana_bp.route('/asana/sync-tasks', methods=['POST'])
+def sync_asana_tasks():
+    """Criar em lote as tarefas do Asana das cirurgias que ainda não têm tarefa"""
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = data.get('limit')
+        
+        if data.get('wait'):
+            try:
+                result = sync_missing_tasks(limit=limit)
+            except SyncAlreadyRunning as e:
+                return jsonify({'error': str(e)}), 409
+            return jsonify(result), 200
+        
+        # Padrão: rodar num worker da fila; a chave por minuto evita disparos duplicados
+        dedup_key = f"asana_sync:{datetime.utcnow().strftime('%Y%m%d%H%M')}"
+        enqueued = enqueue_many('asana_sync', [(dedup_key, {'limit': limit})])
+        missing = Surgery.query.filter(Surgery.asana_task_id.is_(None)).count()
+        return jsonify({'message': 'Asana sync enqueued' if enqueued else 'Asana sync already enqueued', 'missing': missing}), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @asana_bp.route('/asana/update-task', methods=['PUT'])
 def update_asana_task():
     """Atualizar tarefa no Asana"""
@@ -146,7 +384,7 @@ def update_asana_task():
         if not surgery.asana_task_id:
             return jsonify({'error': 'No Asana task associated with this surgery'}), 400
         
-        asana_service = AsanaService()
+        asana_service = get_asana_service()
         success = asana_service.update_task_status(surgery.asana_task_id, status, notes)
         
         if success:
@@ -170,7 +408,7 @@ def add_asana_comment():
         if not surgery.asana_task_id:
             return jsonify({'error': 'No Asana task associated with this surgery'}), 400
         
-        asana_service = AsanaService()
+        asana_service = get_asana_service()
         success = asana_service.add_comment(surgery.asana_task_id, comment)
         
         if success:
@@ -181,27 +419,131 @@ def add_asana_comment():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def event_key(event):
+    """Identidade de um evento de webhook
+    
+    Eventos do Asana não têm id: a mesma entrega reenviada traz o mesmo conteúdo
+    (incluindo created_at), então o hash do JSON canônico identifica o evento.
+    """
+    return hashlib.sha256(json.dumps(event, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def status_from_task(task, current_status):
+    """Status interno a partir da seção da tarefa ou, sem seção conhecida, da conclusão
+    
+    O status só avança: um status final não é rebaixado e um evento atrasado ou
+    reenviado não leva a cirurgia de volta a uma etapa anterior.
+    """
+    status = None
+    for membership in task.get('memberships') or []:
+        section = ((membership.get('section') or {}).get('name') or '').strip().lower()
+        if section in ASANA_SECTION_STATUS:
+            status = ASANA_SECTION_STATUS[section]
+            break
+    
+    # Tarefa concluída sem seção conhecida (aprovar/rejeitar no app também conclui a tarefa)
+    if status is None and task.get('completed') and current_status not in FINAL_STATUSES:
+        status = 'completed'
+    
+    if status is None or STATUS_PROGRESS[status] <= STATUS_PROGRESS.get(current_status, 0):
+        return current_status
+    return status
+
+def changes_status(event):
+    """Evento que pode mudar o status: conclusão da tarefa ou mudança de seção"""
+    if (event.get('resource') or {}).get('resource_type') != 'task':
+        return False
+    if event.get('action') == 'changed':
+        return (event.get('change') or {}).get('field') in ('completed', 'memberships')
+    if event.get('action') in ('added', 'removed'):
+        return (event.get('parent') or {}).get('resource_type') == 'section'
+    return False
+
+def apply_webhook_events(events, asana_service=None):
+    """Aplicar uma entrega de eventos do webhook numa única transação
+    
+    Eventos repetidos (desta entrega ou de entregas anteriores) são descartados,
+    e só os que mudam conclusão ou seção da tarefa são considerados; eles são
+    agrupados por tarefa e as cirurgias afetadas são buscadas com uma única
+    consulta IN. Cada tarefa é lida uma vez (Batch API), não uma vez por evento.
+    """
+    keyed = {}
+    for event in events:
+        keyed.setdefault(event_key(event), event)
+    
+    seen = {row[0] for row in db.session.query(AsanaWebhookEvent.event_key)
+            .filter(AsanaWebhookEvent.event_key.in_(list(keyed)))} if keyed else set()
+    new_events = {key: event for key, event in keyed.items() if key not in seen}
+    
+    task_gids = {event['resource']['gid'] for event in new_events.values() if changes_status(event)}
+    
+    updated = 0
+    if task_gids:
+        surgeries = Surgery.query.filter(Surgery.asana_task_id.in_(task_gids)).all()
+        if surgeries:
+            asana_service = asana_service or get_asana_service()
+            tasks = asana_service.get_tasks(
+                sorted({surgery.asana_task_id for surgery in surgeries}),
+                concurrency=current_app.config.get('ASANA_SYNC_CONCURRENCY', 4)
+            )
+            for surgery in surgeries:
+                task = tasks.get(surgery.asana_task_id)
+                if task is None:
+                    continue
+                status = status_from_task(task, surgery.status)
+                if status != surgery.status:
+                    surgery.status = status
+                    updated += 1
+    
+    if new_events:
+        now = datetime.utcnow()
+        db.session.execute(AsanaWebhookEvent.__table__.insert(), [
+            {'event_key': key, 'task_gid': (event.get('resource') or {}).get('gid'), 'received_at': now}
+            for key, event in new_events.items()
+        ])
+        retention = timedelta(days=current_app.config.get('ASANA_EVENT_RETENTION_DAYS', 7))
+        db.session.execute(delete(AsanaWebhookEvent).where(AsanaWebhookEvent.received_at < now - retention))
+    db.session.commit()
+    
+    return {'events': len(events), 'new_events': len(new_events), 'tasks': len(task_gids), 'updated': updated}
+
+def handle_webhook_job(payload):
+    """Aplicar uma entrega do webhook retirada da fila (falha ao ler as tarefas gera nova tentativa)"""
+    result = apply_webhook_events(payload['events'])
+    if result['updated']:
+        print(f"Asana webhook: {result['updated']} cirurgias atualizadas")
+
+register_handler('asana_webhook', handle_webhook_job)
+
 @asana_bp.route('/asana/webhook', methods=['POST'])
 def asana_webhook():
     """Webhook para receber atualizações do Asana"""
     try:
-        data = request.get_json()
+        # Handshake: o Asana envia X-Hook-Secret e espera o mesmo cabeçalho na resposta
+        hook_secret = request.headers.get('X-Hook-Secret')
+        if hook_secret:
+            # Só o primeiro handshake é aceito; senão qualquer um poderia trocar o segredo
+            if WebhookSecret.get_secret('asana'):
+                return jsonify({'error': 'Webhook secret already registered'}), 409
+            WebhookSecret.set_secret('asana', hook_secret)
+            db.session.commit()
+            response = jsonify({'status': 'success'})
+            response.headers['X-Hook-Secret'] = hook_secret
+            return response, 200
+        
+        secret = WebhookSecret.get_secret('asana')
+        if secret:
+            expected = hmac.new(secret.encode('utf-8'), request.get_data(), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected, request.headers.get('X-Hook-Signature', '')):
+                return jsonify({'error': 'Invalid signature'}), 401
         
-        # Processar eventos do Asana
-        for event in data.get('events', []):
-            if event['type'] == 'task' and event['action'] == 'changed':
-                task_id = event['resource']['gid']
-                
-                # Encontrar cirurgia associada
-                surgery = Surgery.query.filter_by(asana_task_id=task_id).first()
-                
-                if surgery:
-                    # Atualizar status baseado no evento do Asana
-                    # Implementar lógica específica conforme necessário
-                    pass
-        
-        return jsonify({'status': 'success'}), 200
+        # Responder logo: leitura das tarefas e atualização das cirurgias rodam num worker da fila
+        events = (request.get_json() or {}).get('events', [])
+        enqueued = 0
+        if events:
+            enqueued = enqueue_many('asana_webhook', [(f'asana_webhook:{event_key(events)}', {'events': events})])
+        
+        return jsonify({'status': 'success', 'events': len(events), 'enqueued': enqueued}), 200
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
-
@@ -0,0 +1,19 @@
+from datetime import datetime
+from src.models.user import db
+
+class AsanaWebhookEvent(db.Model):
+    """Eventos de webhook do Asana já aplicados (entregas repetidas são ignoradas)"""
+    __tablename__ = 'asana_webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_key = db.Column(db.String(64), nullable=False, unique=True)  # SHA-256 do evento
+    task_gid = db.Column(db.String(100), nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_key': self.event_key,
+            'task_gid': self.task_gid,
+            'received_at': self.received_at.isoformat() if self.received_at else None
+        }
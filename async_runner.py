@@ -0,0 +1,131 @@
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from src.services.ai_service import AsyncAIService, get_ai_service
+from src.services.http_client import AsyncIntegrationClient, build_client
+from src.services.lifecycle import after_fork
+
+class AsyncRunner:
+    """Event loop do processo, numa thread própria, para o caminho assíncrono do WhatsApp
+
+    Tarefas com a mesma chave (o telefone) rodam na ordem em que foram
+    submetidas; chaves diferentes rodam em paralelo, até `max_concurrency` ao
+    mesmo tempo. Chamadas ao LLM e ao WhatsApp são assíncronas (centenas em voo
+    por worker); o código síncrono (banco, sessão, fila) vai para `run_sync`,
+    num pool de threads, cada chamada com o seu próprio app context.
+    """
+
+    def __init__(self, app, max_concurrency=200, sync_threads=8, drain_seconds=10):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.drain_seconds = drain_seconds
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=sync_threads, thread_name_prefix='async-sync')
+        self._semaphore = None  # Criado dentro do loop (no Python 3.9 o semáforo fica preso ao loop atual)
+        self._tails = {}  # Chave -> última tarefa submetida com ela
+        self._clients = {}
+        self._ai_service = None
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-runner', daemon=True)
+        self.thread.start()
+
+    def submit(self, key, function, *args):
+        """Agendar a corrotina `function(*args)` depois das tarefas da mesma chave (de qualquer thread)
+
+        Retorna um concurrent.futures.Future com o resultado.
+        """
+        return asyncio.run_coroutine_threadsafe(self._ordered(key, function, args), self.loop)
+
+    async def _ordered(self, key, function, args):
+        # Os primeiros passos das tarefas rodam na ordem de submissão: a fila por chave é montada aqui
+        previous = self._tails.get(key)
+        current = asyncio.current_task()
+        self._tails[key] = current
+        try:
+            if previous is not None:
+                # Espera sem propagar a falha da anterior; não ocupa vaga do semáforo enquanto isso
+                await asyncio.wait([previous])
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            async with self._semaphore:
+                with self.app.app_context():
+                    return await function(*args)
+        finally:
+            if self._tails.get(key) is current:
+                del self._tails[key]
+
+    async def run_sync(self, function, *args):
+        """Rodar código síncrono no pool de threads, sem bloquear o loop"""
+        return await self.loop.run_in_executor(self.executor, self._call_in_app_context, function, args)
+
+    def _call_in_app_context(self, function, args):
+        # App context próprio: a sessão do SQLAlchemy é por app context e não pode ser dividida entre threads
+        with self.app.app_context():
+            return function(*args)
+
+    def client(self, name):
+        """Cliente HTTP assíncrono da integração (só dentro do loop)"""
+        if name not in self._clients:
+            self._clients[name] = build_client(name, self.app.config, AsyncIntegrationClient)
+        return self._clients[name]
+
+    def ai_service(self):
+        """AsyncAIService do loop, com o mesmo cache de respostas do AIService do processo"""
+        if self._ai_service is None:
+            self._ai_service = AsyncAIService(cache=get_ai_service().cache)
+        return self._ai_service
+
+    def stop(self):
+        """Esperar as tarefas em andamento (até `drain_seconds`), fechar os clientes e parar o loop"""
+        if os.getpid() != self.pid or not self.thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(self.drain_seconds), self.loop).result(self.drain_seconds + 5)
+        except Exception as e:
+            print(f"Async runner shutdown error: {str(e)}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.executor.shutdown(wait=False)
+
+    async def _drain(self, timeout):
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        for client in self._clients.values():
+            await client.close()
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_async_runner():
+    """Obter o AsyncRunner do processo (o loop e a thread nascem no primeiro uso)"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                config = current_app.config
+                _runner = AsyncRunner(
+                    current_app._get_current_object(),
+                    max_concurrency=config.get('ASYNC_MAX_CONCURRENCY', 200),
+                    sync_threads=config.get('ASYNC_SYNC_THREADS', 8),
+                    drain_seconds=config.get('ASYNC_DRAIN_SECONDS', 10)
+                )
+                # Fora do gunicorn (que chama no worker_exit); no atexit o Python já recusa novas
+                # tarefas nos pools de threads, então o que ainda depende do banco pode se perder
+                atexit.register(stop_async_runner)
+    return _runner
+
+def stop_async_runner():
+    """Encerrar o AsyncRunner do processo, se houver, terminando as mensagens já aceitas pelo webhook"""
+    if _runner is not None:
+        _runner.stop()
+
+@after_fork
+def _discard_inherited_runner():
+    """A thread do loop não existe no filho"""
+    global _runner, _runner_lock
+    _runner = None
+    _runner_lock = threading.Lock()
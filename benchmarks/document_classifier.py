@@ -0,0 +1,113 @@
+"""Micro-benchmark da classificação de documentos em textos longos de OCR
+
+Uso: python -m benchmarks.document_classifier [--pages 1 10 50] [--batch 200] [--json saida.json]
+
+Compara o antigo encadeamento if/elif de `in` (primeiro acerto, sem pontuação),
+uma pontuação equivalente feita com uma passada por palavra-chave (`str.count`) e
+o classificador por autômato (uma passada só), em textos sintéticos de várias
+páginas e no modo em lote.
+"""
+import argparse
+import json
+import random
+import time
+
+from src.services.document_classifier import DocumentClassifier, fold_text
+
+PAGE_WORDS = 450  # Uma página A4 de OCR tem da ordem de 400-500 palavras
+
+FILLER = (
+    'paciente hospital data nome valor total rua numero resultado normal exame medico '
+    'sao paulo atendimento internado alta convenio unidade setor quarto leito horario '
+    'observacao assinatura carimbo documento pagina folha codigo tabela quantidade'
+).split()
+
+TYPE_PHRASES = {
+    'guide': ['guia de solicitação de internação', 'procedimento cirúrgico', 'cirurgia eletiva', 'senha de autorização'],
+    'cnh': ['carteira nacional de habilitação', 'detran', 'permissão para dirigir'],
+    'medical_report': ['relatório médico', 'laudo', 'impressão diagnóstica', 'CID-10 M23.2'],
+    'insurance_card': ['carteirinha', 'plano de saúde', 'beneficiário', 'acomodação apartamento'],
+    'medical_record': ['prontuário', 'anamnese', 'evolução clínica'],
+}
+
+def legacy_classify(ocr_text):
+    """Implementação anterior de OCRService.classify_document (referência)"""
+    text_lower = ocr_text.lower()
+
+    if 'guia' in text_lower and ('cirurgia' in text_lower or 'procedimento' in text_lower):
+        return 'guide'
+    elif 'carteira nacional de habilitação' in text_lower or 'cnh' in text_lower:
+        return 'cnh'
+    elif 'relatório médico' in text_lower or 'laudo' in text_lower:
+        return 'medical_report'
+    elif 'carteirinha' in text_lower or 'plano de saúde' in text_lower:
+        return 'insurance_card'
+    elif 'prontuário' in text_lower:
+        return 'medical_record'
+    else:
+        return 'other'
+
+def multipass_scores(classifier, ocr_text):
+    """Mesma pontuação do autômato, mas com uma passada no texto por palavra-chave"""
+    text = fold_text(ocr_text)
+    return {keyword: text.count(keyword) for keyword in classifier.keyword_weights}
+
+def make_document(doc_type, pages, rng):
+    """Texto sintético com `pages` páginas e algumas frases típicas do tipo"""
+    words = [rng.choice(FILLER) for _ in range(pages * PAGE_WORDS)]
+    for _ in range(max(2, pages)):
+        words.insert(rng.randrange(len(words)), rng.choice(TYPE_PHRASES[doc_type]))
+    return ' '.join(words)
+
+def _time(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+def run(page_counts, batch_size, repeat=20, seed=0):
+    rng = random.Random(seed)
+    classifier = DocumentClassifier()
+    results = {'single': [], 'batch': None}
+
+    for pages in page_counts:
+        documents = [make_document(doc_type, pages, rng) for doc_type in TYPE_PHRASES]
+        legacy_s = _time(lambda: [legacy_classify(text) for text in documents], repeat) / len(documents)
+        multipass_s = _time(lambda: [multipass_scores(classifier, text) for text in documents], repeat) / len(documents)
+        automaton_s = _time(lambda: [classifier.classify(text) for text in documents], repeat) / len(documents)
+        accuracy = sum(classifier.classify(text)[0] == doc_type for text, doc_type in zip(documents, TYPE_PHRASES)) / len(documents)
+        results['single'].append({
+            'pages': pages,
+            'chars': sum(len(text) for text in documents) // len(documents),
+            'legacy_ms': round(legacy_s * 1000, 3),
+            'multipass_ms': round(multipass_s * 1000, 3),
+            'automaton_ms': round(automaton_s * 1000, 3),
+            'automaton_accuracy': accuracy
+        })
+
+    batch = [make_document(rng.choice(list(TYPE_PHRASES)), rng.randint(1, 10), rng) for _ in range(batch_size)]
+    batch_s = _time(lambda: classifier.classify_many(batch), max(1, repeat // 5))
+    results['batch'] = {
+        'documents': batch_size,
+        'total_ms': round(batch_s * 1000, 2),
+        'documents_per_s': round(batch_size / batch_s, 1)
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(args.pages, args.batch, repeat=args.repeat)
+    print(json.dumps(result, indent=2))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
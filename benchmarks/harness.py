@@ -0,0 +1,226 @@
+"""Utilitários comuns dos benchmarks: app com banco temporário, dados sintéticos e medições
+
+O `main` lê o Config das variáveis de ambiente na importação, por isso
+`configure_environment` precisa rodar antes de `load_app`, e cada benchmark que
+sobe o app roda no seu próprio processo (ver benchmarks/run_all.py).
+"""
+import importlib
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+FIRST_NAMES = ['Maria', 'José', 'Ana', 'João', 'Francisca', 'Antônio', 'Adriana', 'Carlos', 'Juliana', 'Paulo']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes']
+SURGERY_TYPES = ['Artroscopia de joelho', 'Colecistectomia', 'Hernioplastia inguinal', 'Rinoplastia', 'Catarata']
+HOSPITALS = ['Hospital Santa Helena', 'Hospital São Luiz', 'Hospital Sírio-Libanês', 'Hospital Albert Einstein']
+INSURERS = ['Bradesco Saúde', 'SulAmérica', 'Amil', 'Unimed', 'Porto Seguro']
+STATUSES = ['pending', 'in_analysis', 'approved', 'rejected', 'completed']
+DOCUMENT_TYPES = ['guide', 'cnh', 'medical_report', 'insurance_card', 'medical_record']
+OCR_WORDS = (
+    'guia solicitação internação procedimento cirúrgico paciente beneficiário hospital médico crm '
+    'data valor autorização senha convênio laudo relatório diagnóstico cid exame carteirinha plano'
+).split()
+
+def configure_environment(workdir, stubs_environment=None, overrides=None):
+    """Apontar o app para um banco SQLite e uploads em `workdir` (e para os stubs, se houver)"""
+    os.makedirs(workdir, exist_ok=True)
+    environment = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(os.path.abspath(workdir), 'benchmark.db')}",
+        'UPLOAD_FOLDER': os.path.join(os.path.abspath(workdir), 'uploads'),
+        'SECRET_KEY': 'benchmark',
+    }
+    environment.update(stubs_environment or {})
+    environment.update(overrides or {})
+    os.environ.update(environment)
+    return environment
+
+def load_app():
+    """Importar o app Flask (`main:app`, o mesmo do gunicorn) e criar o schema, como o `flask init-db`"""
+    main = importlib.import_module('main')
+    main.init_database(main.app)
+    return main.app
+
+def app_directory():
+    """Diretório do main.py e do gunicorn.conf.py"""
+    return os.path.dirname(os.path.abspath(importlib.import_module('main').__file__))
+
+def format_cpf(number):
+    digits = f'{number:011d}'
+    return f'{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}'
+
+def ocr_text(rng, chars):
+    words = []
+    size = 0
+    while size < chars:
+        word = rng.choice(OCR_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:chars]
+
+def seed_surgeries(app, count, documents_per_surgery=0, ocr_chars=0, seed=0, batch_size=1000):
+    """Inserir `count` cirurgias sintéticas (e documentos) em lote; retorna os pacientes
+
+    Cada paciente é um dict com id, phone (formato do WhatsApp), cpf e asana_task_id.
+    """
+    from src.models.user import db
+    from src.models.surgery import Surgery, normalize_phone
+    from src.models.document import Document
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    patients = []
+    with app.app_context():
+        first_id = (db.session.query(db.func.max(Surgery.id)).scalar() or 0) + 1
+        for start in range(0, count, batch_size):
+            surgeries, documents = [], []
+            for surgery_id in range(first_id + start, first_id + min(start + batch_size, count)):
+                phone = f'(11) 9{rng.randrange(10 ** 7, 10 ** 8)}'
+                patient = {
+                    'id': surgery_id,
+                    'phone': normalize_phone(phone),
+                    'cpf': format_cpf(rng.randrange(10 ** 10, 10 ** 11)),
+                    'asana_task_id': str(10 ** 15 + surgery_id)
+                }
+                patients.append(patient)
+                surgeries.append({
+                    'id': surgery_id,
+                    'patient_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    'patient_cpf': patient['cpf'],
+                    'patient_phone': phone,
+                    'patient_phone_normalized': patient['phone'],
+                    'surgery_type': rng.choice(SURGERY_TYPES),
+                    'surgery_date': now - timedelta(days=rng.randrange(0, 730)),
+                    'doctor_name': f'Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    'hospital_name': rng.choice(HOSPITALS),
+                    'insurance_company': rng.choice(INSURERS),
+                    'status': rng.choice(STATUSES),
+                    'reimbursement_amount': round(rng.uniform(500, 50000), 2),
+                    'created_at': now,
+                    'updated_at': now,
+                    'asana_task_id': patient['asana_task_id']
+                })
+                for index in range(documents_per_surgery):
+                    documents.append({
+                        'surgery_id': surgery_id,
+                        'document_type': rng.choice(DOCUMENT_TYPES),
+                        'file_name': f'documento_{surgery_id}_{index}.jpg',
+                        'file_path': f'uploads/documento_{surgery_id}_{index}.jpg',
+                        'file_size': rng.randrange(50_000, 5_000_000),
+                        'mime_type': 'image/jpeg',
+                        'ocr_text': ocr_text(rng, ocr_chars) if ocr_chars else None,
+                        'is_processed': bool(ocr_chars),
+                        'is_valid': True,
+                        'created_at': now,
+                        'updated_at': now
+                    })
+            db.session.execute(Surgery.__table__.insert(), surgeries)
+            if documents:
+                db.session.execute(Document.__table__.insert(), documents)
+            db.session.commit()
+    return patients
+
+def percentiles(values, points=(50, 95, 99)):
+    """Percentis (interpolação linear) e máximo, em milissegundos a partir de segundos"""
+    if not values:
+        return {f'p{point}_ms': None for point in points}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        position = (len(ordered) - 1) * point / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        value = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        result[f'p{point}_ms'] = round(value * 1000, 3)
+    result['max_ms'] = round(ordered[-1] * 1000, 3)
+    result['mean_ms'] = round(statistics.mean(ordered) * 1000, 3)
+    return result
+
+def rss_mb(pid):
+    """Memória residente do processo em MB (Linux; None em outros sistemas)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def child_pids(pid):
+    """Filhos diretos do processo (ex.: workers do gunicorn), lidos do /proc"""
+    children = []
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # O nome do processo vem entre parênteses e pode conter espaços
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+def peak_rss_mb():
+    """Pico de memória residente deste processo (ru_maxrss: KB no Linux, bytes no macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class MemorySampler:
+    """Amostrar a RSS somada de um processo e dos seus filhos numa thread, guardando o pico"""
+
+    def __init__(self, pid=None, include_children=False, interval=0.1):
+        self.pid = pid or os.getpid()
+        self.include_children = include_children
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def current(self):
+        pids = [self.pid] + (child_pids(self.pid) if self.include_children else [])
+        values = [rss_mb(pid) for pid in pids]
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            value = self.current()
+            if value is not None:
+                self.samples.append(value)
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return {'rss_start_mb': None, 'rss_end_mb': None, 'rss_peak_mb': None}
+        return {
+            'rss_start_mb': round(self.samples[0], 1),
+            'rss_end_mb': round(self.samples[-1], 1),
+            'rss_peak_mb': round(max(self.samples), 1)
+        }
+
+def timed(function, repeat=1):
+    """Tempo médio por execução em segundos"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
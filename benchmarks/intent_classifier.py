@@ -0,0 +1,88 @@
+"""Avaliação offline do classificador local de intenção
+
+Uso: python -m benchmarks.intent_classifier [--samples arquivo.jsonl] [--threshold 0.6] [--json saida.json]
+
+Mede acurácia por intenção, cobertura (mensagens resolvidas sem o LLM) e
+latência por mensagem sobre uma amostra rotulada.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+from src.services.intent_classifier import INTENTS, IntentClassifier
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(__file__), 'data', 'intent_samples.jsonl')
+
+def load_samples(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run(samples, threshold=0.6, repeat=200):
+    """Avaliar o classificador e medir a latência por mensagem"""
+    started = time.perf_counter()
+    classifier = IntentClassifier(threshold=threshold)
+    training_ms = (time.perf_counter() - started) * 1000
+
+    correct = Counter()
+    total = Counter()
+    covered = covered_correct = 0
+    errors = []
+
+    for sample in samples:
+        intent, confidence = classifier.classify(sample['text'])
+        total[sample['intent']] += 1
+        if intent == sample['intent']:
+            correct[sample['intent']] += 1
+        if confidence < threshold:
+            continue
+        covered += 1
+        covered_correct += intent == sample['intent']
+        # Erros com confiança alta são os que escapam do LLM
+        if intent != sample['intent']:
+            errors.append({'text': sample['text'], 'expected': sample['intent'], 'got': intent,
+                           'confidence': round(confidence, 3)})
+
+    latencies = []
+    for _ in range(repeat):
+        for sample in samples:
+            t0 = time.perf_counter()
+            classifier.classify(sample['text'])
+            latencies.append((time.perf_counter() - t0) * 1e6)
+    latencies.sort()
+
+    return {
+        'samples': len(samples),
+        'threshold': threshold,
+        'training_ms': round(training_ms, 2),
+        'accuracy': round(sum(correct.values()) / len(samples), 4),
+        'accuracy_by_intent': {intent: round(correct[intent] / total[intent], 4) for intent in INTENTS if total[intent]},
+        'coverage': round(covered / len(samples), 4),  # Fração resolvida sem chamar o LLM
+        'accuracy_when_confident': round(covered_correct / covered, 4) if covered else None,
+        'latency_us': {
+            'p50': round(statistics.median(latencies), 1),
+            'p95': round(latencies[int(len(latencies) * 0.95) - 1], 1),
+            'p99': round(latencies[int(len(latencies) * 0.99) - 1], 1)
+        },
+        'confident_errors': errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES)
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(load_samples(args.samples), threshold=args.threshold, repeat=args.repeat)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
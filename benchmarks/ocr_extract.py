@@ -0,0 +1,105 @@
+"""Benchmark do OCRService.extract_text sobre um conjunto fixo de imagens/PDFs
+
+Uso: python -m benchmarks.ocr_extract [--images DIR] [--generate N] [--repeat 1] [--provider tesseract|remote]
+         [--latency-ms 300] [--json saida.json]
+
+Mede o tempo por arquivo (p50/p95/p99), arquivos/s e falhas do caminho completo
+de extração (pré-processamento conforme OCR_PREPROCESS, Tesseract local ou pool de
+processos para PDFs). Com --provider remote, o OCR vai para um stub local no
+formato OCR.space com a latência indicada, passando pelo cliente HTTP do app.
+As fixtures padrão são as mesmas do benchmarks.ocr_preprocessing.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.harness import peak_rss_mb, percentiles, write_json
+from benchmarks.ocr_preprocessing import DEFAULT_IMAGES, generate_fixtures
+
+FIXTURE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'pdf')
+ERROR_PREFIXES = ('Erro ao processar OCR', 'Tipo de arquivo não suportado')
+
+def find_fixtures(directory):
+    return sorted(p for ext in FIXTURE_EXTENSIONS for p in glob.glob(os.path.join(directory, f'*.{ext}')))
+
+def run_extraction(service, files, repeat):
+    """Rodar extract_text em todos os arquivos `repeat` vezes"""
+    timings, rows, failures = [], [], 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            file_started = time.perf_counter()
+            text = service.extract_text(path)
+            seconds = time.perf_counter() - file_started
+            failed = text.startswith(ERROR_PREFIXES)
+            failures += failed
+            timings.append(seconds)
+            rows.append({'file': os.path.basename(path), 'seconds': round(seconds, 3), 'chars': len(text), 'failed': failed})
+    elapsed = time.perf_counter() - started
+    return {
+        'files': len(files),
+        'extractions': len(timings),
+        'failures': failures,
+        'total_s': round(elapsed, 3),
+        'files_per_s': round(len(timings) / elapsed, 2) if elapsed > 0 else None,
+        **percentiles(timings),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'results': rows
+    }
+
+def run(files, repeat=1, provider='tesseract', latency_ms=300.0):
+    if provider == 'tesseract':
+        from src.services.ocr_service import OCRService
+
+        os.environ['OCR_PROVIDER'] = 'tesseract'
+        result = run_extraction(OCRService(), files, repeat)
+        return {'provider': provider, **result}
+
+    # OCR remoto passa pelo get_client('ocr'), que precisa do app configurado para o stub
+    from benchmarks.harness import configure_environment, load_app
+    from benchmarks.stubs import start_stubs, stub_environment
+
+    workdir = tempfile.mkdtemp(prefix='benchmark-ocr-')
+    stubs = start_stubs(latency_ms)
+    try:
+        configure_environment(workdir, stub_environment(stubs), {'OCR_PROVIDER': 'remote'})
+        app = load_app()
+        from src.services.ocr_service import OCRService
+
+        with app.app_context():
+            result = run_extraction(OCRService(), files, repeat)
+        return {'provider': provider, 'latency_ms': latency_ms, **result}
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default=DEFAULT_IMAGES)
+    parser.add_argument('--generate', type=int, default=0, help='Gerar N imagens sintéticas antes de rodar')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--provider', choices=['tesseract', 'remote'], default='tesseract')
+    parser.add_argument('--latency-ms', type=float, default=300.0, help='Latência do stub de OCR (--provider remote)')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_fixtures(args.images, args.generate)
+
+    files = find_fixtures(args.images)
+    if not files:
+        parser.error(f'Nenhuma imagem ou PDF em {args.images} (use --generate N)')
+
+    result = run(files, repeat=args.repeat, provider=args.provider, latency_ms=args.latency_ms)
+    print(json.dumps({key: value for key, value in result.items() if key != 'results'}, indent=2))
+
+    if args.json_path:
+        write_json(args.json_path, result)
+
+if __name__ == '__main__':
+    main()
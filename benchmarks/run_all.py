@@ -0,0 +1,180 @@
+"""Rodar a suíte de benchmarks, gravar um JSON único e comparar com uma execução de referência
+
+Uso: python -m benchmarks.run_all [--profile quick|full] [--only NOME ...] [--ocr-images DIR]
+         [--baseline referencia.json] [--tolerance 0.25] [--json saida.json]
+
+Cada benchmark roda num processo próprio (o app lê a configuração na importação).
+Com --baseline, as métricas de tempo, memória, vazão e qualidade são comparadas
+com a referência: piora acima da tolerância relativa (e acima de um piso absoluto,
+para não acusar ruído em números pequenos) é listada em `regressions` e o
+processo termina com código 1, para o CI marcar a execução.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import write_json
+from benchmarks.ocr_extract import find_fixtures
+from benchmarks.ocr_preprocessing import DEFAULT_IMAGES
+
+PROFILES = {
+    'quick': {
+        'document_classifier': ['--pages', '1', '10', '--batch', '50', '--repeat', '5'],
+        'intent_classifier': ['--repeat', '50'],
+        'serialization': ['--sizes', '100', '1000', '--repeat', '3'],
+        'webhook_load': ['--bursts', '3', '--burst-size', '100', '--concurrency', '8',
+                         '--latency-ms', '20', '--jitter-ms', '10', '--patients', '500'],
+        'ocr_extract': ['--repeat', '1'],
+        'startup': ['--runs', '3'],
+    },
+    'full': {
+        'document_classifier': [],
+        'intent_classifier': [],
+        'serialization': [],
+        'webhook_load': [],
+        'ocr_extract': ['--repeat', '3'],
+        'startup': ['--runs', '10', '--gunicorn'],
+    },
+}
+
+# Partes do resultado que descrevem a execução, não o desempenho
+IGNORED_KEYS = {'config', 'statuses', 'stub_calls', 'results', 'images', 'confident_errors', 'seed_s', 'threshold',
+                'top_imports'}
+# Piso absoluto de variação por unidade, abaixo do qual a diferença é tratada como ruído
+NOISE_FLOOR = {'_ms': 1.0, '_s': 0.05, '_mb': 5.0, '_us': 2.0}
+
+def metric_direction(path):
+    """'lower' ou 'higher' (o que é melhor) para a métrica no caminho `a.b.c`, ou None se não comparável"""
+    name = path.rsplit('.', 1)[-1]
+    if name.endswith('per_s') or 'accuracy' in name or 'coverage' in name or '.accuracy_by_intent.' in path:
+        return 'higher'
+    if name in ('errors', 'failures') or name.endswith(('_ms', '_s', '_mb', '_us', '_us_per_item')) or '_us.' in path:
+        return 'lower'
+    return None
+
+def noise_floor(path):
+    name = path.rsplit('.', 1)[-1]
+    for suffix, floor in NOISE_FLOOR.items():
+        if name.endswith(suffix) or f'{suffix}.' in path or name.endswith(f'{suffix}_per_item'):
+            return floor
+    return 0.0
+
+def flatten(data, prefix=''):
+    """Folhas numéricas do resultado como {'a.b.0.c': valor}"""
+    items = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key not in IGNORED_KEYS:
+                items.update(flatten(value, f'{prefix}{key}.'))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            items.update(flatten(value, f'{prefix}{index}.'))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        items[prefix[:-1]] = data
+    return items
+
+def compare(current, baseline, tolerance):
+    """Métricas que pioraram mais que `tolerance` (relativo) em relação à referência"""
+    regressions = []
+    current_metrics = flatten(current)
+    for path, before in flatten(baseline).items():
+        direction = metric_direction(path)
+        after = current_metrics.get(path)
+        if direction is None or after is None:
+            continue
+        worse = after - before if direction == 'lower' else before - after
+        if worse <= noise_floor(path):
+            continue
+        if before == 0 or worse / abs(before) > tolerance:
+            regressions.append({
+                'metric': path,
+                'baseline': before,
+                'current': after,
+                'change': round((after - before) / abs(before), 4) if before else None
+            })
+    return regressions
+
+def run_benchmark(name, arguments, timeout):
+    """Rodar `python -m benchmarks.<name>` e ler o JSON gravado"""
+    handle, json_path = tempfile.mkstemp(prefix=f'benchmark-{name}-', suffix='.json')
+    os.close(handle)
+    try:
+        process = subprocess.run([sys.executable, '-m', f'benchmarks.{name}', *arguments, '--json', json_path],
+                                 capture_output=True, text=True, timeout=timeout)
+        if process.returncode != 0:
+            return {'error': (process.stderr or process.stdout).strip().splitlines()[-20:]}
+        with open(json_path, encoding='utf-8') as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {'error': [f'Timeout após {timeout}s']}
+    finally:
+        os.remove(json_path)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(profile='quick', only=None, ocr_images=DEFAULT_IMAGES, timeout=1800):
+    results = {
+        'meta': {
+            'profile': profile,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'started_at': datetime.datetime.utcnow().isoformat() + 'Z'
+        },
+        'benchmarks': {}
+    }
+    for name, arguments in PROFILES[profile].items():
+        if only and name not in only:
+            continue
+        if name == 'ocr_extract':
+            if not find_fixtures(ocr_images):
+                results['benchmarks'][name] = {'skipped': f'Nenhuma fixture em {ocr_images}'}
+                continue
+            arguments = [*arguments, '--images', ocr_images]
+        print(f'{name}...', file=sys.stderr, flush=True)
+        results['benchmarks'][name] = run_benchmark(name, arguments, timeout)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--only', nargs='+', choices=sorted(PROFILES['quick']))
+    parser.add_argument('--ocr-images', default=DEFAULT_IMAGES)
+    parser.add_argument('--timeout', type=int, default=1800, help='Segundos por benchmark')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Piora relativa aceita (0.25 = 25%%)')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(args.profile, args.only, args.ocr_images, args.timeout)
+    failed = [name for name, data in result['benchmarks'].items() if 'error' in data]
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        result['regressions'] = compare(result['benchmarks'], baseline.get('benchmarks', {}), args.tolerance)
+
+    if args.json_path:
+        write_json(args.json_path, result)
+
+    summary = {'benchmarks': {name: 'error' if name in failed else 'skipped' if 'skipped' in data else 'ok'
+                              for name, data in result['benchmarks'].items()}}
+    if 'regressions' in result:
+        summary['regressions'] = result['regressions']
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    if failed or result.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
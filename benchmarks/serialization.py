@@ -0,0 +1,110 @@
+"""Micro-benchmark da serialização de listas grandes de cirurgias (Surgery.to_dict)
+
+Uso: python -m benchmarks.serialization [--sizes 100 1000 5000] [--documents 3] [--ocr-chars 2000] [--json saida.json]
+
+Para cada tamanho de lista, mede separadamente a consulta, o `to_dict` e o
+`json.dumps` de dois formatos: completo (documentos com ocr_text, carregados com
+selectinload) e resumido (document_count/document_types agregados em lote,
+como em Surgery.list_page). O banco é um SQLite temporário.
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+from sqlalchemy.orm import selectinload
+
+from benchmarks.harness import configure_environment, load_app, peak_rss_mb, seed_surgeries, write_json
+
+def _measure(query, serialize, repeat):
+    """Melhor de `repeat` execuções de consulta, to_dict e json.dumps"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        surgeries = query()
+        loaded = time.perf_counter()
+        items = serialize(surgeries)
+        serialized = time.perf_counter()
+        payload = json.dumps(items)
+        dumped = time.perf_counter()
+        sample = (loaded - started, serialized - loaded, dumped - serialized, len(payload))
+        if best is None or sum(sample[:3]) < sum(best[:3]):
+            best = sample
+    query_s, to_dict_s, json_s, size = best
+    return {
+        'query_ms': round(query_s * 1000, 2),
+        'to_dict_ms': round(to_dict_s * 1000, 2),
+        'json_ms': round(json_s * 1000, 2),
+        'total_ms': round((query_s + to_dict_s + json_s) * 1000, 2),
+        'to_dict_us_per_item': round(to_dict_s * 1e6 / max(len(items), 1), 2),
+        'payload_bytes': size
+    }
+
+def run(sizes, documents_per_surgery=3, ocr_chars=2000, repeat=3, seed=0):
+    workdir = tempfile.mkdtemp(prefix='benchmark-serialization-')
+    try:
+        configure_environment(workdir, overrides={'METRICS_ENABLED': '0'})
+        app = load_app()
+
+        from src.models.user import db
+        from src.models.surgery import Surgery
+        from src.models.document import Document
+
+        started = time.perf_counter()
+        seed_surgeries(app, max(sizes), documents_per_surgery, ocr_chars, seed=seed)
+        results = {
+            'config': {'documents_per_surgery': documents_per_surgery, 'ocr_chars': ocr_chars, 'repeat': repeat},
+            'seed_s': round(time.perf_counter() - started, 2),
+            'sizes': []
+        }
+
+        with app.app_context():
+            for size in sizes:
+                ordered = Surgery.query.order_by(Surgery.surgery_date.desc(), Surgery.id.desc()).limit(size)
+
+                def full_query():
+                    db.session.expunge_all()
+                    return ordered.options(selectinload(Surgery.documents)).all()
+
+                def summary_query():
+                    db.session.expunge_all()
+                    return ordered.all()
+
+                def summary_serialize(surgeries):
+                    summaries = Document.summaries_for([surgery.id for surgery in surgeries])
+                    return [
+                        surgery.to_dict(include_documents=False,
+                                        document_summary=summaries.get(surgery.id, Document.empty_summary()))
+                        for surgery in surgeries
+                    ]
+
+                results['sizes'].append({
+                    'surgeries': size,
+                    'full': _measure(full_query, lambda surgeries: [surgery.to_dict() for surgery in surgeries], repeat),
+                    'summary': _measure(summary_query, summary_serialize, repeat)
+                })
+            db.session.remove()
+
+        results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--documents', type=int, default=3, help='Documentos por cirurgia')
+    parser.add_argument('--ocr-chars', type=int, default=2000, help='Tamanho do ocr_text de cada documento')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(args.sizes, args.documents, args.ocr_chars, repeat=args.repeat)
+    print(json.dumps(result, indent=2))
+
+    if args.json_path:
+        write_json(args.json_path, result)
+
+if __name__ == '__main__':
+    main()
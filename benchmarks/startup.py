@@ -0,0 +1,159 @@
+"""Benchmark de inicialização: importação do app, custo adiado para o primeiro uso e boot dos workers
+
+Uso: python -m benchmarks.startup [--runs 5] [--top 10] [--gunicorn] [--json saida.json]
+
+Em processos novos, mede o `import main` (que cria o app), um `create_app()`
+adicional, a RSS após a importação e o custo que ficou para o primeiro uso
+(cliente OpenAI e OCRService). Lista os imports diretos do main mais caros
+(python -X importtime). Com --gunicorn, mede também o cold start (do processo
+ao primeiro 200/403) e a reciclagem de um worker morto (SIGKILL até a próxima
+resposta), com e sem --preload.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.harness import child_pids, configure_environment, write_json
+
+IMPORT_SNIPPET = '''
+import json, os, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+created = time.perf_counter()
+from benchmarks.harness import rss_mb
+rss = rss_mb(os.getpid())
+with main.app.app_context():
+    t = time.perf_counter()
+    from src.services.ai_service import get_ai_service
+    get_ai_service()
+    ai_service = time.perf_counter() - t
+    t = time.perf_counter()
+    from src.services.ocr_service import OCRService
+    OCRService()
+    ocr_service = time.perf_counter() - t
+print(json.dumps({
+    'import_s': imported - started, 'create_app_s': created - imported, 'rss_mb': rss,
+    'first_ai_service_s': ai_service, 'first_ocr_service_s': ocr_service
+}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+def _summary(values, digits=3):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {'median': round(statistics.median(values), digits), 'min': round(min(values), digits),
+            'max': round(max(values), digits)}
+
+def measure_import(runs):
+    """Importação do app em `runs` processos novos"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: _summary([sample[key] for sample in samples], 1 if key.endswith('_mb') else 3) for key in samples[0]}
+
+def top_imports(limit):
+    """Imports diretos do main ordenados pelo tempo acumulado (python -X importtime)"""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], capture_output=True, text=True)
+    entries = []
+    main_depth = None
+    for line in reversed(process.stderr.splitlines()):
+        # A saída lista cada módulo depois dos que ele importou; lida ao contrário, o main vem primeiro
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == 'main':
+            main_depth = depth
+        elif main_depth is not None and depth == main_depth + 2:
+            entries.append({'module': name, 'cumulative_ms': round(cumulative / 1000, 1)})
+    return sorted(entries, key=lambda entry: entry['cumulative_ms'], reverse=True)[:limit]
+
+def _wait_response(url, timeout=60):
+    """Esperar qualquer resposta HTTP; retorna os segundos até ela"""
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=timeout)
+            return time.perf_counter() - started
+        except requests.RequestException:
+            time.sleep(0.01)
+    raise RuntimeError(f'Sem resposta de {url} em {timeout}s')
+
+def measure_gunicorn(preload, runs):
+    """Cold start e reciclagem de worker com um worker do gunicorn"""
+    from benchmarks.harness import app_directory
+    from benchmarks.webhook_load import free_port
+
+    directory = app_directory()
+    cold, recycle = [], []
+    for _ in range(runs):
+        port = free_port()
+        url = f'http://127.0.0.1:{port}/api/whatsapp/webhook'
+        command = [sys.executable, '-m', 'gunicorn', '--config', os.path.join(directory, 'gunicorn.conf.py'),
+                   '--workers', '1', '--bind', f'127.0.0.1:{port}', '--log-level', 'critical', 'main:app']
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=directory, env={**os.environ, 'GUNICORN_PRELOAD': '1' if preload else '0'})
+        try:
+            _wait_response(url)
+            cold.append(time.perf_counter() - started)
+            # O master mantém o socket: a requisição espera na fila até o novo worker aceitar
+            workers = child_pids(process.pid)
+            if workers:
+                os.kill(workers[0], signal.SIGKILL)
+                recycle.append(_wait_response(url))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return {'cold_start_s': _summary(cold), 'worker_recycle_s': _summary(recycle)}
+
+def run(runs=5, top=10, gunicorn=False):
+    workdir = tempfile.mkdtemp(prefix='benchmark-startup-')
+    try:
+        # O cliente OpenAI exige uma chave, mesmo que nenhuma chamada seja feita
+        configure_environment(workdir, overrides={'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY') or 'benchmark'})
+        results = {
+            'config': {'runs': runs},
+            'import': measure_import(runs),
+            'top_imports': top_imports(top)
+        }
+        if gunicorn:
+            results['gunicorn'] = {
+                'preload': measure_gunicorn(True, runs),
+                'no_preload': measure_gunicorn(False, runs)
+            }
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Imports diretos do main listados')
+    parser.add_argument('--gunicorn', action='store_true', help='Medir também cold start e reciclagem de workers')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(args.runs, args.top, args.gunicorn)
+    print(json.dumps(result, indent=2))
+
+    if args.json_path:
+        write_json(args.json_path, result)
+
+if __name__ == '__main__':
+    main()
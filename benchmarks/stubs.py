@@ -0,0 +1,253 @@
+"""Servidores locais que imitam as APIs externas nos benchmarks (sem rede)
+
+Cada stub roda num ThreadingHTTPServer numa thread própria, em 127.0.0.1 e
+porta livre, com latência injetada configurável (fixa + variação aleatória):
+
+- WhatsApp Cloud API: POST .../messages, GET /<media_id> (metadados) e o download da mídia
+- Asana: POST /tasks, PUT /tasks/<gid>, POST /tasks/<gid>/stories e POST /batch
+- OpenAI (compatível com OPENAI_API_BASE): POST /chat/completions
+- OCR (formato OCR.space, para OCR_PROVIDER=remote): POST /
+"""
+import functools
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from src.services.intent_classifier import INTENTS
+
+OCR_TEXT = 'GUIA DE SOLICITAÇÃO DE INTERNAÇÃO\nProcedimento cirúrgico: artroscopia de joelho\nBeneficiário: Maria da Silva Santos'
+
+@functools.lru_cache(maxsize=1)
+def media_content():
+    """JPEG pequeno servido como mídia do WhatsApp"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (240, 240, 240)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+class Latency:
+    """Atraso injetado em cada resposta: `base_ms` + uniforme em [0, `jitter_ms`]"""
+
+    def __init__(self, base_ms=0.0, jitter_ms=0.0, seed=None):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sleep(self):
+        with self.lock:
+            delay = self.base_ms + (self.rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Fila do listen() (padrão 5): com centenas de conexões abertas ao mesmo tempo (modo 'async'), o excesso seria resetado
+    request_queue_size = 1024
+    daemon_threads = True
+
+class StubServer:
+    """Servidor HTTP local; subclasses implementam `handle(method, path, body, headers)` -> (status, headers, corpo)"""
+    name = 'stub'
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive: o pool do requests reaproveita as conexões
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stub.latency.sleep()
+                status, headers, content = stub.handle(method, self.path.split('?', 1)[0], body, self.headers)
+                with stub.lock:
+                    stub.requests[f'{method} {stub.route_name(self.path)}'] += 1
+                if not isinstance(content, bytes):
+                    content = json.dumps(content).encode('utf-8')
+                    headers = {'Content-Type': 'application/json', **headers}
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if method != 'HEAD':
+                    self.wfile.write(content)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PUT(self):
+                self._dispatch('PUT')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = StubHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f'stub-{self.name}', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route_name(self, path):
+        """Rota sem ids, para a contagem de chamadas"""
+        parts = path.split('?', 1)[0].split('/')
+        return '/'.join('{id}' if len(part) > 3 and any(c.isdigit() for c in part) else part for part in parts)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.requests)
+
+    def handle(self, method, path, body, headers):
+        raise NotImplementedError
+
+class WhatsAppStub(StubServer):
+    """WhatsApp Cloud API; WHATSAPP_API_URL aponta para `<url>/<phone_number_id>`"""
+    name = 'whatsapp'
+    phone_number_id = '100000000000001'
+
+    @property
+    def api_url(self):
+        return f'{self.url}/{self.phone_number_id}'
+
+    def handle(self, method, path, body, headers):
+        parts = [part for part in path.split('/') if part]
+        if method == 'POST' and parts[-1:] == ['messages']:
+            return 200, {}, {'messaging_product': 'whatsapp', 'messages': [{'id': f'wamid.{uuid.uuid4().hex}'}]}
+        if method == 'GET' and parts[:1] == ['_media']:
+            return 200, {'Content-Type': 'image/jpeg'}, media_content()
+        if method == 'GET' and parts:
+            # Metadados da mídia: a URL de download aponta para o próprio stub
+            media_id = parts[-1]
+            return 200, {}, {
+                'id': media_id,
+                'url': f'{self.url}/_media/{media_id}',
+                'mime_type': 'image/jpeg',
+                'sha256': hashlib.sha256(media_content()).hexdigest(),
+                'file_size': len(media_content())
+            }
+        return 404, {}, {'error': {'message': 'Unknown path', 'code': 100}}
+
+class AsanaStub(StubServer):
+    """Asana API 1.0 (tarefas, comentários e Batch API)"""
+    name = 'asana'
+
+    def __init__(self, latency=None, completed_ratio=0.3, seed=0):
+        super().__init__(latency)
+        self.completed_ratio = completed_ratio
+        self.rng = random.Random(seed)
+
+    def task(self, gid):
+        with self.lock:
+            completed = self.rng.random() < self.completed_ratio
+        return {'gid': gid, 'completed': completed, 'memberships': []}
+
+    def action(self, action):
+        method = action.get('method', 'get').upper()
+        path = action.get('relative_path', '')
+        status, _, body = self.handle(method, path, json.dumps({'data': action.get('data') or {}}).encode('utf-8'), {})
+        return {'status_code': status, 'headers': {}, 'body': body}
+
+    def handle(self, method, path, body, headers):
+        parts = [part for part in path.split('/') if part]
+        if parts and parts[-1] == 'batch' and method == 'POST':
+            actions = (json.loads(body or b'{}').get('data') or {}).get('actions') or []
+            return 200, {}, {'data': [self.action(action) for action in actions]}
+        if parts[-1:] == ['tasks'] and method == 'POST':
+            return 201, {}, {'data': {'gid': str(self.rng.randrange(10 ** 15, 10 ** 16)), 'resource_type': 'task'}}
+        if len(parts) >= 2 and parts[-2] == 'tasks':
+            if method == 'GET':
+                return 200, {}, {'data': self.task(parts[-1])}
+            if method == 'PUT':
+                return 200, {}, {'data': {'gid': parts[-1], **(json.loads(body or b'{}').get('data') or {})}}
+        if len(parts) >= 3 and parts[-1] == 'stories' and method == 'POST':
+            return 201, {}, {'data': {'gid': str(self.rng.randrange(10 ** 15, 10 ** 16)), 'resource_type': 'story'}}
+        return 404, {}, {'errors': [{'message': 'Unknown path'}]}
+
+class OpenAIStub(StubServer):
+    """API compatível com OpenAI (OPENAI_API_BASE = `<url>/v1`)"""
+    name = 'openai'
+
+    @property
+    def api_base(self):
+        return f'{self.url}/v1'
+
+    def completion_text(self, messages):
+        system = ' '.join(m.get('content') or '' for m in messages if m.get('role') == 'system')
+        user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        if 'Classifique a intenção' in system:
+            return INTENTS[len(user) % len(INTENTS)]
+        if 'formato JSON' in system:
+            return json.dumps({'nome': None, 'cpf': None, 'telefone': None})
+        return f'Resposta simulada para: {user[:80]}'
+
+    def handle(self, method, path, body, headers):
+        if method == 'POST' and path.rstrip('/').endswith('/chat/completions'):
+            request = json.loads(body or b'{}')
+            content = self.completion_text(request.get('messages') or [])
+            return 200, {}, {
+                'id': f'chatcmpl-{uuid.uuid4().hex}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model') or 'stub',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 50, 'completion_tokens': 20, 'total_tokens': 70}
+            }
+        return 404, {}, {'error': {'message': 'Unknown path', 'type': 'invalid_request_error'}}
+
+class OCRStub(StubServer):
+    """API de OCR no formato OCR.space (uma página de texto fixo por arquivo)"""
+    name = 'ocr'
+
+    def handle(self, method, path, body, headers):
+        if method == 'POST':
+            return 200, {}, {'ParsedResults': [{'ParsedText': OCR_TEXT}], 'IsErroredOnProcessing': False}
+        return 404, {}, {'ErrorMessage': 'Unknown path', 'IsErroredOnProcessing': True}
+
+def start_stubs(latency_ms=0.0, jitter_ms=0.0, seed=0):
+    """Iniciar todos os stubs com a mesma latência; retorna dict nome -> stub"""
+    stubs = {
+        'whatsapp': WhatsAppStub(Latency(latency_ms, jitter_ms, seed)),
+        'asana': AsanaStub(Latency(latency_ms, jitter_ms, seed + 1), seed=seed),
+        'openai': OpenAIStub(Latency(latency_ms, jitter_ms, seed + 2)),
+        'ocr': OCRStub(Latency(latency_ms, jitter_ms, seed + 3)),
+    }
+    for stub in stubs.values():
+        stub.start()
+    return stubs
+
+def stub_environment(stubs):
+    """Variáveis de ambiente que apontam o app para os stubs"""
+    return {
+        'WHATSAPP_API_URL': stubs['whatsapp'].api_url,
+        'WHATSAPP_API_TOKEN': 'benchmark',
+        'ASANA_API_URL': stubs['asana'].url,
+        'ASANA_API_TOKEN': 'benchmark',
+        'ASANA_PROJECT_ID': '1200000000000001',
+        'OPENAI_API_BASE': stubs['openai'].api_base,
+        'OPENAI_API_KEY': 'benchmark',
+        'OCR_API_URL': stubs['ocr'].url,
+        'OCR_API_KEY': 'benchmark',
+    }
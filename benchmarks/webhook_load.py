@@ -0,0 +1,283 @@
+"""Teste de carga dos webhooks do WhatsApp e do Asana contra stubs locais das APIs externas
+
+Uso: python -m benchmarks.webhook_load [--scenario whatsapp asana] [--bursts 5] [--burst-size 200]
+         [--concurrency 16] [--latency-ms 50] [--jitter-ms 20] [--gunicorn WORKERS]
+         [--env CHAVE=VALOR ...] [--json saida.json]
+
+Sobe stubs do WhatsApp Cloud API, do Asana e de uma API compatível com OpenAI
+(com latência injetada), um banco SQLite temporário com cirurgias sintéticas e o
+app Flask. Depois reenvia rajadas de webhooks sintéticos (mensagens de texto e
+status de entrega do WhatsApp; eventos de tarefas do Asana, assinados) e reporta
+requisições/s, p50/p95/p99, erros, chamadas aos stubs e memória (RSS).
+
+Sem --gunicorn, o app roda numa thread do próprio processo (servidor do werkzeug)
+e disputa o GIL com o gerador de carga: use os números para comparar versões,
+não como capacidade de produção (a memória inclui stubs e gerador). Com
+--gunicorn N, o app roda em N workers do gunicorn (gunicorn.conf.py) e a memória
+é a soma do master e dos workers.
+Com --database-url, usa outro banco (ex.: PostgreSQL) em vez do SQLite temporário.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.harness import MemorySampler, app_directory, configure_environment, load_app, percentiles, seed_surgeries, write_json
+from benchmarks.stubs import start_stubs, stub_environment
+
+ASANA_HOOK_SECRET = 'benchmark-hook-secret'
+
+TEXT_MESSAGES = [
+    'Oi', 'Bom dia!', 'Olá, tudo bem?',
+    'Qual o status do meu reembolso?', 'Como está o andamento do meu processo?', 'Já foi aprovado?',
+    'Quais documentos preciso enviar?', 'Quanto tempo demora o reembolso?', 'Vocês aceitam foto da CNH?',
+    'Estou esperando há semanas e ninguém responde', 'Meu CPF é {cpf}',
+]
+
+def whatsapp_message(patient, rng):
+    text = rng.choice(TEXT_MESSAGES).format(cpf=patient['cpf'])
+    return {
+        'from': patient['phone'],
+        'id': f'wamid.{uuid.uuid4().hex}',
+        'timestamp': str(int(time.time())),
+        'type': 'text',
+        'text': {'body': text}
+    }
+
+def whatsapp_payload(patients, rng, status_ratio):
+    """Entrega do webhook do WhatsApp: uma mensagem de texto ou status de entrega"""
+    if rng.random() < status_ratio:
+        value = {'statuses': [{
+            'id': f'wamid.{uuid.uuid4().hex}',
+            'status': rng.choice(['sent', 'delivered', 'read']),
+            'timestamp': str(int(time.time())),
+            'recipient_id': rng.choice(patients)['phone']
+        }]}
+    else:
+        value = {
+            'messaging_product': 'whatsapp',
+            'contacts': [],
+            'messages': [whatsapp_message(rng.choice(patients), rng)]
+        }
+    return {'object': 'whatsapp_business_account', 'entry': [{'id': '1', 'changes': [{'field': 'messages', 'value': value}]}]}
+
+def asana_payload(patients, rng, events_per_delivery):
+    """Entrega do webhook do Asana com eventos de tarefas das cirurgias sintéticas"""
+    events = []
+    for _ in range(events_per_delivery):
+        events.append({
+            'user': {'gid': '1100000000000001', 'resource_type': 'user'},
+            'created_at': f'{time.time():.6f}',
+            'action': 'changed',
+            'resource': {'gid': rng.choice(patients)['asana_task_id'], 'resource_type': 'task'},
+            'change': {'field': 'completed', 'action': 'changed'}
+        })
+    return {'events': events}
+
+def build_requests(scenario, patients, count, rng, status_ratio=0.2, events_per_delivery=5):
+    """Lista de (caminho, corpo, cabeçalhos) de uma rajada"""
+    built = []
+    for _ in range(count):
+        if scenario == 'whatsapp':
+            body = json.dumps(whatsapp_payload(patients, rng, status_ratio)).encode('utf-8')
+            built.append(('/api/whatsapp/webhook', body, {'Content-Type': 'application/json'}))
+        else:
+            body = json.dumps(asana_payload(patients, rng, events_per_delivery)).encode('utf-8')
+            signature = hmac.new(ASANA_HOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            built.append(('/api/asana/webhook', body, {'Content-Type': 'application/json', 'X-Hook-Signature': signature}))
+    return built
+
+class LoadGenerator:
+    """Envia rajadas com N requisições simultâneas (uma sessão HTTP por thread)"""
+
+    def __init__(self, base_url, concurrency, timeout=60):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def _send(self, item):
+        path, body, headers = item
+        started = time.perf_counter()
+        try:
+            response = self._session().post(self.base_url + path, data=body, headers=headers, timeout=self.timeout)
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    def run(self, bursts, pause=0.0):
+        latencies, statuses = [], {}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for index, burst in enumerate(bursts):
+                if index and pause:
+                    time.sleep(pause)
+                for seconds, status in executor.map(self._send, burst):
+                    latencies.append(seconds)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+        elapsed = time.perf_counter() - started
+        busy = elapsed - pause * max(len(bursts) - 1, 0)
+        errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'statuses': statuses,
+            'duration_s': round(elapsed, 3),
+            'requests_per_s': round(len(latencies) / busy, 1) if busy > 0 else None,
+            **percentiles(latencies)
+        }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_ready(base_url, timeout=30):
+    """Esperar o app responder (qualquer status HTTP serve)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + '/api/whatsapp/webhook', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f'App não respondeu em {timeout}s')
+
+def start_app_thread(app):
+    """App no servidor multi-thread do werkzeug, numa thread deste processo"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='benchmark-app', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server.shutdown
+
+def start_gunicorn(workers, environment):
+    """App em `workers` processos do gunicorn, com o gunicorn.conf.py do projeto"""
+    directory = app_directory()
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', '4',
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'main:app']
+    if os.path.exists(os.path.join(directory, 'gunicorn.conf.py')):
+        command[3:3] = ['--config', os.path.join(directory, 'gunicorn.conf.py')]
+    process = subprocess.Popen(command, cwd=directory, env={**os.environ, **environment})
+
+    def stop():
+        process.terminate()
+        process.wait(timeout=30)
+    return f'http://127.0.0.1:{port}', stop, process.pid
+
+def run(scenarios, bursts=5, burst_size=200, concurrency=16, pause=0.0, latency_ms=50.0, jitter_ms=20.0,
+        patients=2000, gunicorn_workers=0, database_url=None, overrides=None, seed=0):
+    workdir = tempfile.mkdtemp(prefix='benchmark-webhooks-')
+    stubs = start_stubs(latency_ms, jitter_ms, seed)
+    try:
+        extra = dict(overrides or {})
+        if database_url:
+            extra['DATABASE_URL'] = database_url
+        environment = configure_environment(workdir, stub_environment(stubs), extra)
+        app = load_app()
+        seeded = seed_surgeries(app, patients, seed=seed)
+
+        if gunicorn_workers:
+            base_url, stop, pid = start_gunicorn(gunicorn_workers, environment)
+        else:
+            base_url, stop = start_app_thread(app)
+            pid = os.getpid()
+
+        results = {
+            'config': {
+                'bursts': bursts, 'burst_size': burst_size, 'concurrency': concurrency, 'pause_s': pause,
+                'latency_ms': latency_ms, 'jitter_ms': jitter_ms, 'patients': patients,
+                'server': f'gunicorn x{gunicorn_workers}' if gunicorn_workers else 'werkzeug (thread)',
+                'overrides': extra
+            },
+            'scenarios': {}
+        }
+        try:
+            wait_ready(base_url)
+            # Handshake do webhook do Asana: a partir daqui as entregas precisam de X-Hook-Signature
+            requests.post(base_url + '/api/asana/webhook', headers={'X-Hook-Secret': ASANA_HOOK_SECRET}, timeout=10)
+
+            generator = LoadGenerator(base_url, concurrency)
+            rng = random.Random(seed)
+            for scenario in scenarios:
+                payloads = [build_requests(scenario, seeded, burst_size, rng) for _ in range(bursts)]
+                calls_before = {name: stub.stats() for name, stub in stubs.items()}
+                with MemorySampler(pid, include_children=bool(gunicorn_workers)) as sampler:
+                    result = generator.run(payloads, pause=pause)
+                result['memory'] = sampler.summary()
+                result['stub_calls'] = {}
+                for name, stub in stubs.items():
+                    calls = {route: count - calls_before[name].get(route, 0) for route, count in stub.stats().items()}
+                    calls = {route: count for route, count in calls.items() if count}
+                    if calls:
+                        result['stub_calls'][name] = calls
+                results['scenarios'][scenario] = result
+        finally:
+            stop()
+        return results
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def parse_env(values):
+    overrides = {}
+    for value in values or []:
+        key, _, setting = value.partition('=')
+        overrides[key] = setting
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', nargs='+', choices=['whatsapp', 'asana'], default=['whatsapp', 'asana'])
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--burst-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pause', type=float, default=0.0, help='Segundos entre rajadas')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Latência injetada nos stubs')
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--patients', type=int, default=2000, help='Cirurgias sintéticas no banco')
+    parser.add_argument('--gunicorn', type=int, default=0, metavar='WORKERS')
+    parser.add_argument('--database-url')
+    parser.add_argument('--env', action='append', metavar='CHAVE=VALOR',
+                        help='Configuração extra do app (ex.: WHATSAPP_INGESTION_MODE=queue)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    result = run(args.scenario, bursts=args.bursts, burst_size=args.burst_size, concurrency=args.concurrency,
+                 pause=args.pause, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, patients=args.patients,
+                 gunicorn_workers=args.gunicorn, database_url=args.database_url, overrides=parse_env(args.env),
+                 seed=args.seed)
+    print(json.dumps(result, indent=2))
+
+    if args.json_path:
+        write_json(args.json_path, result)
+
+if __name__ == '__main__':
+    main()
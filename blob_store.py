@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+import time
+from flask import current_app
+
+CHUNK_SIZE = 64 * 1024
+
+class BlobTooLarge(Exception):
+    """Conteúdo maior que o limite informado na gravação"""
+
+class BlobStore:
+    """Armazenamento de arquivos endereçado por conteúdo
+
+    Cada arquivo fica em `<root>/<sha[:2]>/<sha[2:4]>/<sha><ext>`: conteúdos iguais
+    ocupam um único arquivo, não importa quantos Documents o referenciem. A extensão
+    faz parte do nome porque o OCR escolhe o método pela extensão.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.temp_dir = os.path.join(self.root, 'tmp')
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or current_app.config
+        root = config.get('BLOB_STORE_ROOT') or os.path.join(config.get('UPLOAD_FOLDER', 'uploads'), 'blobs')
+        return cls(root)
+
+    def relative_path(self, sha256, extension=''):
+        return os.path.join(sha256[:2], sha256[2:4], sha256 + (extension or '').lower())
+
+    def path_for(self, sha256, extension=''):
+        return os.path.join(self.root, self.relative_path(sha256, extension))
+
+    def write_chunks(self, chunks, extension='', max_bytes=None):
+        """Gravar o conteúdo de um iterável de bytes; retorna (sha256, tamanho, caminho)
+
+        O hash e o tamanho são calculados durante a cópia para um arquivo temporário,
+        que então é renomeado para o caminho definitivo (ou descartado, se o blob já existe).
+        """
+        os.makedirs(self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise BlobTooLarge(f'mais de {max_bytes} bytes')
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha256 = digest.hexdigest()
+            return sha256, size, self._commit(temp_path, sha256, extension)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def write_file(self, source_path, extension=None, move=False):
+        """Gravar um arquivo existente no disco; com `move`, o original é removido"""
+        if extension is None:
+            extension = os.path.splitext(source_path)[1]
+        with open(source_path, 'rb') as f:
+            sha256, size, path = self.write_chunks(iter(lambda: f.read(CHUNK_SIZE), b''), extension)
+        if move and os.path.abspath(source_path) != path:
+            os.remove(source_path)
+        return sha256, size, path
+
+    def _commit(self, temp_path, sha256, extension):
+        path = self.path_for(sha256, extension)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            # Renovar o mtime: o GC não remove um blob recém-reaproveitado
+            os.utime(path)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)  # Atômico: leitores nunca veem um blob pela metade
+        return path
+
+    def iter_blobs(self):
+        """Percorrer (sha256, caminho) de todos os blobs gravados"""
+        for directory, subdirs, files in os.walk(self.root):
+            if os.path.abspath(directory) == self.temp_dir:
+                subdirs[:] = []
+                continue
+            for name in files:
+                sha256 = os.path.splitext(name)[0]
+                if len(sha256) == 64:
+                    yield sha256, os.path.join(directory, name)
+
+    def collect_garbage(self, referenced, grace_seconds=3600):
+        """Remover blobs sem nenhuma referência, gravados há mais de `grace_seconds`
+
+        `referenced` é o conjunto de hashes usados por Documents. A carência evita
+        apagar um blob gravado enquanto o Document que o referencia ainda não foi commitado.
+        """
+        cutoff = time.time() - grace_seconds
+        removed, freed = 0, 0
+        for sha256, path in list(self.iter_blobs()):
+            if sha256 in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+            freed += stat.st_size
+
+        if os.path.isdir(self.temp_dir):
+            for name in os.listdir(self.temp_dir):
+                path = os.path.join(self.temp_dir, name)
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)  # Gravação interrompida
+        return removed, freed
+
+    def usage(self):
+        """Quantidade de blobs e bytes ocupados"""
+        count, total = 0, 0
+        for _, path in self.iter_blobs():
+            count += 1
+            total += os.path.getsize(path)
+        return count, total
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from src.services.metrics import record_cache
+
+_MISSING = object()
+
+class TTLCache:
+    """Cache LRU em memória, limitado por tamanho, com expiração por TTL e contadores de acerto"""
+
+    def __init__(self, maxsize=1024, ttl=3600, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name  # Com nome, acertos e falhas também vão para a métrica cache_requests_total
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Obter valor da chave, ou `default` se ausente/expirado"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] <= time.monotonic():
+                del self._data[key]
+                entry = _MISSING
+
+            if entry is _MISSING:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+
+        if self.name:
+            record_cache(self.name, entry is not _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Gravar valor, removendo as entradas menos usadas se passar do limite"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Contadores do cache (para diagnóstico e métricas)"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
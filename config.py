@@ -9,8 +9,103 @@ class Config:
     WHATSAPP_API_TOKEN = os.environ.get('WHATSAPP_API_TOKEN')
     ASANA_API_URL = os.environ.get('ASANA_API_URL')
     ASANA_API_TOKEN = os.environ.get('ASANA_API_TOKEN')
+    ASANA_PROJECT_ID = os.environ.get('ASANA_PROJECT_ID')
+    ASANA_BATCH_SIZE = int(os.environ.get('ASANA_BATCH_SIZE', 10))  # Ações por chamada à Batch API (máximo 10)
+    ASANA_SYNC_CONCURRENCY = int(os.environ.get('ASANA_SYNC_CONCURRENCY', 4))  # Lotes em andamento ao mesmo tempo
+    ASANA_SYNC_LOCK_SECONDS = int(os.environ.get('ASANA_SYNC_LOCK_SECONDS', 600))  # Prazo da trava de sincronização, renovado a cada página
+    ASANA_EVENT_RETENTION_DAYS = int(os.environ.get('ASANA_EVENT_RETENTION_DAYS', 7))  # Eventos do webhook lembrados para deduplicação
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY') # Para ChatGPT ou LLM
+    OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE') or 'https://api.openai.com/v1'
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL') or 'gpt-3.5-turbo'
+    AI_CACHE_MAXSIZE = int(os.environ.get('AI_CACHE_MAXSIZE', 2048))  # Respostas de intenção/extração em cache
+    AI_CACHE_TTL_SECONDS = int(os.environ.get('AI_CACHE_TTL_SECONDS', 3600))
+    INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get('INTENT_CONFIDENCE_THRESHOLD', 0.6))  # Abaixo disso, consulta o LLM
+    # Relatórios: grupos agregados por chamada ao LLM e chamadas simultâneas no map-reduce
+    REPORT_CHUNK_GROUPS = int(os.environ.get('REPORT_CHUNK_GROUPS', 60))
+    REPORT_SUMMARY_CONCURRENCY = int(os.environ.get('REPORT_SUMMARY_CONCURRENCY', 4))
     OCR_API_URL = os.environ.get('OCR_API_URL') # Para Tesseract OCR ou Google Vision
+    OCR_API_KEY = os.environ.get('OCR_API_KEY')
+    OCR_PROVIDER = os.environ.get('OCR_PROVIDER') or 'tesseract'  # tesseract (local) ou remote (OCR_API_URL)
+    # OCR de PDFs: páginas processadas em paralelo num pool de processos
+    OCR_PDF_PROCESSES = int(os.environ.get('OCR_PDF_PROCESSES', 0))  # 0 = número de CPUs
+    OCR_PAGE_TIMEOUT = int(os.environ.get('OCR_PAGE_TIMEOUT', 60))  # Segundos por página
+    OCR_PDF_MAX_PAGES = int(os.environ.get('OCR_PDF_MAX_PAGES', 20))
+    OCR_PDF_DPI = int(os.environ.get('OCR_PDF_DPI', 200))
+    # Pré-processamento de fotos antes do Tesseract (lido pelo OCRService via variáveis de ambiente)
+    OCR_PREPROCESS = os.environ.get('OCR_PREPROCESS', '0')
+    OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+    OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION', 2480))
+    OCR_BINARIZE = os.environ.get('OCR_BINARIZE') or 'adaptive'  # adaptive, otsu ou none
+    OCR_DESKEW = os.environ.get('OCR_DESKEW', '0')
+    OCR_AUTO_ROTATE = os.environ.get('OCR_AUTO_ROTATE', '0')
+    OCR_MAX_CONCURRENT_JOBS = int(os.environ.get('OCR_MAX_CONCURRENT_JOBS', 2))  # OCRs de documentos simultâneos por processo
+    OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # Texto total mantido no cache de OCR
+    OCR_CACHE_EVICT_INTERVAL = int(os.environ.get('OCR_CACHE_EVICT_INTERVAL', 300))  # Segundos entre verificações do limite por processo
     N8N_WEBHOOK_URL = os.environ.get('N8N_WEBHOOK_URL')
-
-
+    # Ingestão de mensagens do WhatsApp: 'sync' (processa na requisição), 'queue' (fila persistente)
+    # ou 'async' (responde na hora e processa no event loop do worker, sem persistir)
+    WHATSAPP_INGESTION_MODE = os.environ.get('WHATSAPP_INGESTION_MODE') or 'sync'
+    ASYNC_MAX_CONCURRENCY = int(os.environ.get('ASYNC_MAX_CONCURRENCY', 200))  # Mensagens em andamento por worker
+    ASYNC_SYNC_THREADS = int(os.environ.get('ASYNC_SYNC_THREADS', 8))  # Threads para banco/sessão do modo 'async'
+    ASYNC_DRAIN_SECONDS = int(os.environ.get('ASYNC_DRAIN_SECONDS', 10))  # Espera pelas mensagens em andamento ao encerrar o worker
+    # Envio de mensagens: 'sync' (posta na requisição) ou 'queue' (fila de saída + dispatcher)
+    WHATSAPP_OUTBOUND_MODE = os.environ.get('WHATSAPP_OUTBOUND_MODE') or 'sync'
+    WHATSAPP_SEND_RATE = float(os.environ.get('WHATSAPP_SEND_RATE', 20))  # Mensagens por segundo por dispatcher
+    WHATSAPP_SEND_BURST = int(os.environ.get('WHATSAPP_SEND_BURST', 20))
+    WHATSAPP_DISPATCH_WORKERS = int(os.environ.get('WHATSAPP_DISPATCH_WORKERS', 8))  # Envios simultâneos
+    WHATSAPP_DISPATCHER_EMBEDDED = os.environ.get('WHATSAPP_DISPATCHER_EMBEDDED', '0').lower() in ('1', 'true', 'yes')
+    WHATSAPP_SEND_MAX_ATTEMPTS = int(os.environ.get('WHATSAPP_SEND_MAX_ATTEMPTS', 5))
+    # Sessões de conversa do WhatsApp: 'memory' (por processo), 'database' (tabela compartilhada) ou 'redis'
+    CONVERSATION_BACKEND = os.environ.get('CONVERSATION_BACKEND') or 'memory'
+    CONVERSATION_TTL_SECONDS = int(os.environ.get('CONVERSATION_TTL_SECONDS', 1800))  # Inatividade até a sessão expirar
+    CONVERSATION_MAX_TURNS = int(os.environ.get('CONVERSATION_MAX_TURNS', 10))  # Mensagens enviadas ao LLM como histórico
+    CONVERSATION_CACHE_MAXSIZE = int(os.environ.get('CONVERSATION_CACHE_MAXSIZE', 10000))  # Sessões no LRU do processo
+    CONVERSATION_LOCAL_TTL_SECONDS = int(os.environ.get('CONVERSATION_LOCAL_TTL_SECONDS', 0))  # Cópia local com backend compartilhado
+    REDIS_URL = os.environ.get('REDIS_URL')
+    # Mídias recebidas: baixadas pelos workers da fila para o blob store
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
+    # Arquivos dos documentos, endereçados pelo SHA-256 (padrão: UPLOAD_FOLDER/blobs)
+    BLOB_STORE_ROOT = os.environ.get('BLOB_STORE_ROOT') or os.path.join(UPLOAD_FOLDER, 'blobs')
+    # Com nginx na frente: location interna apontando para BLOB_STORE_ROOT (ex.: /_blobs/)
+    BLOB_ACCEL_REDIRECT_PREFIX = os.environ.get('BLOB_ACCEL_REDIRECT_PREFIX')
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0').lower() in ('1', 'true', 'yes')  # Apache/lighttpd
+    BLOB_CACHE_MAX_AGE = int(os.environ.get('BLOB_CACHE_MAX_AGE', 86400))
+    BLOB_GC_GRACE_SECONDS = int(os.environ.get('BLOB_GC_GRACE_SECONDS', 3600))  # Idade mínima de um blob sem referência para ser removido
+    WHATSAPP_MEDIA_MAX_BYTES = int(os.environ.get('WHATSAPP_MEDIA_MAX_BYTES', 25 * 1024 * 1024))
+    WHATSAPP_MEDIA_MAX_DOWNLOADS = int(os.environ.get('WHATSAPP_MEDIA_MAX_DOWNLOADS', 4))  # Downloads simultâneos por processo
+    WHATSAPP_BULK_MAX_MESSAGES = int(os.environ.get('WHATSAPP_BULK_MAX_MESSAGES', 10000))  # Por chamada de /whatsapp/send-bulk
+    # Frontend (pasta static): 'manifest' indexa os arquivos na inicialização; 'disk' lê do disco a cada requisição
+    STATIC_SERVING = os.environ.get('STATIC_SERVING', 'manifest').lower()
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))  # Arquivos sem hash no nome (o index.html é sempre revalidado)
+    STATIC_IMMUTABLE_PATTERN = os.environ.get('STATIC_IMMUTABLE_PATTERN')  # Regex dos nomes com hash (cache de 1 ano); padrão: Vite e CRA
+    STATIC_MEMORY_MAX_BYTES = int(os.environ.get('STATIC_MEMORY_MAX_BYTES', 1024 * 1024))  # Maiores são lidos do disco
+    # Busca textual: buscas com mais resultados que isso ranqueiam só os mais recentes
+    SEARCH_RANK_WINDOW = int(os.environ.get('SEARCH_RANK_WINDOW', 2000))
+    # Métricas do Prometheus em /metrics (com METRICS_TOKEN, exige Authorization: Bearer <token>)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Fila de jobs em segundo plano
+    QUEUE_WORKERS = int(os.environ.get('QUEUE_WORKERS', 4))  # Threads por processo `flask queue-worker`
+    QUEUE_EMBEDDED_WORKERS = int(os.environ.get('QUEUE_EMBEDDED_WORKERS', 0))  # Threads dentro de cada worker web
+    QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', 5))
+    QUEUE_RETRY_BASE_SECONDS = float(os.environ.get('QUEUE_RETRY_BASE_SECONDS', 2))
+    QUEUE_RETRY_MAX_SECONDS = float(os.environ.get('QUEUE_RETRY_MAX_SECONDS', 300))
+    QUEUE_LEASE_SECONDS = int(os.environ.get('QUEUE_LEASE_SECONDS', 120))  # Renovado a cada 1/3 enquanto o job roda
+    QUEUE_POLL_INTERVAL = float(os.environ.get('QUEUE_POLL_INTERVAL', 1))
+    QUEUE_RETENTION_DAYS = int(os.environ.get('QUEUE_RETENTION_DAYS', 7))  # Jobs concluídos/falhos apagados pelos workers (0 = nunca)
+    QUEUE_PURGE_INTERVAL = int(os.environ.get('QUEUE_PURGE_INTERVAL', 3600))  # Segundos entre limpezas por pool de workers
+    # Mídias recebidas pelo WhatsApp: 'queue' (download e OCR nos workers da fila) ou 'sync' (download na
+    # requisição; o OCR vai para a fila e roda em threads do próprio processo, até OCR_MAX_CONCURRENT_JOBS).
+    # Padrão: 'queue' só quando há workers da fila (embutidos ou no modo de ingestão 'queue')
+    WHATSAPP_MEDIA_MODE = os.environ.get('WHATSAPP_MEDIA_MODE') or (
+        'queue' if QUEUE_EMBEDDED_WORKERS > 0 or WHATSAPP_INGESTION_MODE == 'queue' else 'sync')
+    # Cliente HTTP compartilhado das integrações (WhatsApp, Asana, OCR)
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 20))  # Conexões keep-alive por host
+    HTTP_MAX_CONCURRENCY_PER_HOST = int(os.environ.get('HTTP_MAX_CONCURRENCY_PER_HOST', 10))
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.5))
+    HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', 10))  # Espera máxima entre tentativas, inclusive por Retry-After
+    HTTP_BREAKER_FAILURES = int(os.environ.get('HTTP_BREAKER_FAILURES', 5))
+    HTTP_BREAKER_RESET_SECONDS = float(os.environ.get('HTTP_BREAKER_RESET_SECONDS', 30))
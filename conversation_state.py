@@ -0,0 +1,21 @@
+from datetime import datetime
+from src.models.user import db
+
+class ConversationState(db.Model):
+    """Sessão de conversa do WhatsApp compartilhada entre os workers (backend 'database')"""
+    __tablename__ = 'conversation_states'
+
+    phone = db.Column(db.String(20), primary_key=True)  # Telefone normalizado
+    data = db.Column(db.JSON, nullable=False)  # Sessão serializada (ver session_store.new_session)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Gravação condicional (ver SessionStore.save)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'phone': self.phone,
+            'data': self.data,
+            'version': self.version,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
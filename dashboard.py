@@ -0,0 +1,13 @@
+from flask import Blueprint, request, jsonify
+from src.models.dashboard_counter import DashboardCounter
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Resumo do dashboard a partir dos contadores pré-agregados"""
+    try:
+        months = min(max(request.args.get('months', 6, type=int), 0), 60)
+        return jsonify(DashboardCounter.dashboard(months=months)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,219 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.surgery import Surgery
+
+# Campos da cirurgia que alteram algum contador do dashboard
+COUNTED_FIELDS = ('status', 'surgery_type', 'surgery_date', 'reimbursement_amount')
+
+class DashboardCounter(db.Model):
+    """Contadores pré-agregados do dashboard, mantidos na mesma transação das cirurgias
+
+    Cada linha é um (dimensão, chave): ('total', ''), ('status', 'approved'),
+    ('type', 'Catarata'), ('month', '2024-03'). Ler o dashboard custa o número de
+    chaves distintas, não o número de cirurgias.
+    """
+    __tablename__ = 'dashboard_counters'
+    __table_args__ = (
+        db.UniqueConstraint('dimension', 'key', name='uq_dashboard_counters_dimension_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)  # total, status, type, month
+    key = db.Column(db.String(100), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    reimbursement_total = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'dimension': self.dimension,
+            'key': self.key,
+            'count': self.count,
+            'reimbursement_total': self.reimbursement_total,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def dashboard(cls, months=6):
+        """Dados no formato do Dashboard.jsx, lidos só da tabela de contadores"""
+        rows = {dimension: {} for dimension in ('total', 'status', 'type', 'month')}
+        for counter in cls.query.filter(cls.count > 0).all():
+            rows.setdefault(counter.dimension, {})[counter.key] = counter
+
+        total = rows['total'].get('')
+        by_status = rows['status']
+
+        def status_count(status):
+            return by_status[status].count if status in by_status else 0
+
+        return {
+            'summary': {
+                'total_surgeries': total.count if total else 0,
+                'pending_surgeries': status_count('pending'),
+                'approved_surgeries': status_count('approved'),
+                'rejected_surgeries': status_count('rejected'),
+                'total_reimbursement': round(total.reimbursement_total, 2) if total else 0.0
+            },
+            'monthly_surgeries': [
+                {'month': month, 'count': rows['month'][month].count}
+                for month in sorted(rows['month'])[-months:]
+            ] if months > 0 else [],
+            'surgeries_by_type': [
+                {'type': counter.key, 'count': counter.count}
+                for counter in sorted(rows['type'].values(), key=lambda c: (-c.count, c.key))
+            ],
+            'surgeries_by_status': [
+                {'status': counter.key, 'count': counter.count}
+                for counter in sorted(by_status.values(), key=lambda c: (-c.count, c.key))
+            ]
+        }
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcular todos os contadores a partir da tabela de cirurgias (corrige desvios)"""
+        session = db.session
+        if session.get_bind().dialect.name == 'postgresql':
+            # Bloqueia escritas em cirurgias até o commit, para a recontagem não perder alterações
+            session.execute(db.text('LOCK TABLE surgeries IN SHARE MODE'))
+
+        deltas = defaultdict(lambda: [0, 0.0])
+        amount = func.coalesce(func.sum(Surgery.reimbursement_amount), 0.0)
+        groupings = {
+            'total': [],
+            'status': [Surgery.status],
+            'type': [Surgery.surgery_type],
+            'month': [func.extract('year', Surgery.surgery_date), func.extract('month', Surgery.surgery_date)]
+        }
+        for dimension, columns in groupings.items():
+            query = select(*columns, func.count(Surgery.id), amount)
+            if columns:
+                query = query.group_by(*columns)
+            for row in session.execute(query):
+                *values, count, total = row
+                if dimension == 'total':
+                    key = ''
+                elif dimension == 'month':
+                    key = f'{int(values[0]):04d}-{int(values[1]):02d}' if values[0] is not None else None
+                else:
+                    key = values[0]
+                if key is not None and count:
+                    deltas[(dimension, key)] = [count, float(total)]
+
+        session.execute(delete(cls))
+        if deltas:
+            now = datetime.utcnow()
+            session.execute(cls.__table__.insert(), [
+                {'dimension': dimension, 'key': key, 'count': count, 'reimbursement_total': total, 'updated_at': now}
+                for (dimension, key), (count, total) in deltas.items()
+            ])
+        session.commit()
+        return len(deltas)
+
+def counter_keys(status, surgery_type, surgery_date):
+    """Chaves (dimensão, chave) em que uma cirurgia é contada"""
+    keys = [('total', '')]
+    if status:
+        keys.append(('status', status))
+    if surgery_type:
+        keys.append(('type', surgery_type))
+    if surgery_date:
+        keys.append(('month', surgery_date.strftime('%Y-%m')))
+    return keys
+
+def _add_contribution(deltas, values, sign):
+    status, surgery_type, surgery_date, amount = values
+    for key in counter_keys(status, surgery_type, surgery_date):
+        deltas[key][0] += sign
+        deltas[key][1] += sign * (amount or 0.0)
+
+def _old_values(surgery):
+    """Valores de COUNTED_FIELDS antes das alterações pendentes"""
+    state = inspect(surgery)
+    values = []
+    for field in COUNTED_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.added:
+            values.append(None)  # Não havia valor carregado (não acontece com active_history)
+        else:
+            values.append(getattr(surgery, field))
+    return tuple(values)
+
+def _current_values(surgery):
+    return tuple(getattr(surgery, field) for field in COUNTED_FIELDS)
+
+def _apply_deltas(connection, deltas):
+    """Somar os deltas nos contadores com upsert, na conexão (transação) do flush"""
+    table = DashboardCounter.__table__
+    now = datetime.utcnow()
+    dialect = connection.dialect.name
+
+    for (dimension, key), (count, amount) in deltas.items():
+        if count == 0 and abs(amount) < 1e-9:
+            continue
+        if dialect in ('postgresql', 'sqlite'):
+            insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+            statement = insert.values(
+                dimension=dimension, key=key, count=count, reimbursement_total=amount, updated_at=now
+            ).on_conflict_do_update(
+                index_elements=['dimension', 'key'],
+                set_={
+                    'count': table.c.count + insert.excluded.count,
+                    'reimbursement_total': table.c.reimbursement_total + insert.excluded.reimbursement_total,
+                    'updated_at': now
+                }
+            )
+            connection.execute(statement)
+            continue
+
+        result = connection.execute(
+            update(table)
+            .where(table.c.dimension == dimension, table.c.key == key)
+            .values(count=table.c.count + count,
+                    reimbursement_total=table.c.reimbursement_total + amount,
+                    updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                dimension=dimension, key=key, count=count, reimbursement_total=amount, updated_at=now))
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+# active_history: ao alterar um campo contado, o valor antigo é carregado mesmo se
+# estiver expirado (ex.: após um commit), para o delta poder ser descontado da chave certa
+for _field in COUNTED_FIELDS:
+    event.listen(getattr(Surgery, _field), 'set', _load_old_value, active_history=True)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_surgery_changes(session, flush_context, instances):
+    """Descontar cirurgias removidas e os valores antigos das alteradas"""
+    # Substitui (não acumula) o que sobrou de um flush que falhou antes do after_flush
+    deltas = session.info['dashboard_deltas'] = defaultdict(lambda: [0, 0.0])
+    for obj in session.deleted:
+        if isinstance(obj, Surgery) and inspect(obj).persistent:
+            _add_contribution(deltas, _old_values(obj), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Surgery) and obj not in session.deleted and session.is_modified(obj):
+            old = _old_values(obj)
+            new = _current_values(obj)
+            if old != new:
+                _add_contribution(deltas, old, -1)
+                _add_contribution(deltas, new, 1)
+
+@event.listens_for(Session, 'after_flush')
+def _apply_surgery_changes(session, flush_context):
+    """Contar cirurgias novas (defaults já aplicados) e gravar os deltas na mesma transação"""
+    deltas = session.info.pop('dashboard_deltas', None) or defaultdict(lambda: [0, 0.0])
+    for obj in session.new:
+        if isinstance(obj, Surgery):
+            _add_contribution(deltas, _current_values(obj), 1)
+
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
@@ -1,14 +1,16 @@
 from datetime import datetime
+from sqlalchemy import func
 from src.models.user import db
 
 class Document(db.Model):
     __tablename__ = 'documents'
     
     id = db.Column(db.Integer, primary_key=True)
-    surgery_id = db.Column(db.Integer, db.ForeignKey('surgeries.id'), nullable=False)
+    surgery_id = db.Column(db.Integer, db.ForeignKey('surgeries.id'), nullable=False, index=True)
     document_type = db.Column(db.String(50), nullable=False)  # guide, cnh, report, medical_record, etc.
     file_name = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 do blob no BlobStore
     file_size = db.Column(db.Integer, nullable=False)
     mime_type = db.Column(db.String(100), nullable=False)
     ocr_text = db.Column(db.Text, nullable=True)  # Texto extraído via OCR
@@ -25,6 +27,7 @@ class Document(db.Model):
             'document_type': self.document_type,
             'file_name': self.file_name,
             'file_path': self.file_path,
+            'content_hash': self.content_hash,
             'file_size': self.file_size,
             'mime_type': self.mime_type,
             'ocr_text': self.ocr_text,
@@ -34,4 +37,35 @@ class Document(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
-
+    
+    @classmethod
+    def blob_references(cls, content_hash):
+        """Quantos documentos apontam para o blob (contagem de referências)"""
+        return db.session.query(func.count(cls.id)).filter(cls.content_hash == content_hash).scalar()
+    
+    @classmethod
+    def referenced_hashes(cls):
+        """Hashes de todos os blobs referenciados por algum documento"""
+        return {row[0] for row in db.session.query(cls.content_hash).filter(cls.content_hash.isnot(None)).distinct()}
+    
+    @staticmethod
+    def empty_summary():
+        return {'count': 0, 'types': {}}
+    
+    @classmethod
+    def summaries_for(cls, surgery_ids):
+        """Contagem de documentos por tipo para várias cirurgias numa única consulta (sem ocr_text)"""
+        summaries = {}
+        if not surgery_ids:
+            return summaries
+        
+        rows = db.session.query(cls.surgery_id, cls.document_type, func.count(cls.id)) \
+            .filter(cls.surgery_id.in_(surgery_ids)) \
+            .group_by(cls.surgery_id, cls.document_type) \
+            .all()
+        
+        for surgery_id, document_type, count in rows:
+            summary = summaries.setdefault(surgery_id, cls.empty_summary())
+            summary['count'] += count
+            summary['types'][document_type] = count
+        return summaries
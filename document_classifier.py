@@ -0,0 +1,164 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Regras por tipo de documento: palavras-chave (minúsculas, sem acento) com peso, a
+# pontuação mínima para o tipo ser aceito e, opcionalmente, termos dos quais ao menos um
+# precisa aparecer ('required'). A ordem define o desempate, como no antigo if/elif.
+# Novos tipos entram aqui: todas as palavras vão para o mesmo autômato, sem novas passadas no texto.
+DOCUMENT_RULES = {
+    'guide': {
+        'min_score': 2.0,
+        # Como no antigo if/elif: sem "guia", um laudo que cita cirurgia e procedimento não é guia
+        'required': ['guia', 'guia de solicitacao', 'guia de internacao', 'guia sp/sadt'],
+        'keywords': {
+            'guia': 1.0, 'guia de solicitacao': 1.5, 'guia de internacao': 1.5, 'guia sp/sadt': 1.5,
+            'cirurgia': 1.0, 'cirurgico': 0.5, 'procedimento': 1.0, 'procedimentos': 1.0,
+            'solicitacao de internacao': 1.5, 'senha de autorizacao': 1.0, 'registro ans': 1.0, 'tiss': 1.0
+        }
+    },
+    'cnh': {
+        'min_score': 1.0,
+        'keywords': {
+            'carteira nacional de habilitacao': 3.0, 'cnh': 1.0, 'habilitacao': 1.0, 'detran': 1.0,
+            'permissao para dirigir': 1.5, 'renach': 1.5, 'cat hab': 1.0
+        }
+    },
+    'medical_report': {
+        'min_score': 1.0,
+        'keywords': {
+            'relatorio medico': 2.0, 'laudo': 1.0, 'laudo medico': 1.5, 'impressao diagnostica': 1.0,
+            'diagnostico': 0.5, 'conclusao': 0.5, 'cid': 0.5, 'cid-10': 0.5, 'crm': 0.3
+        }
+    },
+    'insurance_card': {
+        'min_score': 1.0,
+        'keywords': {
+            'carteirinha': 2.0, 'plano de saude': 1.0, 'carteira do beneficiario': 2.0,
+            'cartao do beneficiario': 2.0, 'beneficiario': 0.5, 'operadora': 0.5, 'acomodacao': 0.5,
+            'validade': 0.3, 'cns': 0.5
+        }
+    },
+    'medical_record': {
+        'min_score': 1.0,
+        'keywords': {
+            'prontuario': 2.0, 'anamnese': 1.0, 'historico clinico': 1.0, 'evolucao': 0.5, 'prescricao': 0.5
+        }
+    },
+}
+
+# Um mesmo termo repetido em todas as páginas não deve dominar a pontuação
+MAX_HITS_PER_KEYWORD = 3
+
+def _fold_table():
+    """Tabela byte a byte (latin-1): letras viram minúsculas sem acento, dígitos ficam e o resto vira espaço"""
+    table = bytearray(b' ' * 256)
+    for byte in range(256):
+        base = unicodedata.normalize('NFKD', chr(byte).lower()).encode('ascii', 'ignore')
+        if len(base) == 1 and base.isalnum():
+            table[byte] = base[0]
+    return bytes(table)
+
+FOLD_TABLE = _fold_table()
+
+def fold_text(text):
+    """Minúsculas, sem acentos e com pontuação/quebras de linha como espaço
+
+    Um único `bytes.translate` sobre o texto em latin-1 (caracteres fora dele
+    também viram espaço): bem mais barato que normalizar o texto inteiro de OCR.
+    """
+    return text.encode('latin-1', 'replace').translate(FOLD_TABLE).decode('ascii')
+
+def _trie_pattern(words):
+    """Montar um regex em forma de trie: prefixos comuns são testados uma única vez"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Palavra termina aqui mas também continua: o sufixo é opcional (guloso = maior termo)
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+class DocumentClassifier:
+    """Classificador de documentos orientado a tabela
+
+    Todas as palavras-chave de todos os tipos são compiladas num único autômato
+    (regex em trie, executado em C). O texto é percorrido uma vez, cada tipo é
+    pontuado pela soma ponderada dos acertos e o resultado vem com uma confiança.
+    O autômato é tentado no início de cada palavra (após um espaço do texto
+    normalizado) dentro de um lookahead, então termos que começam em palavras
+    diferentes contam mesmo quando se sobrepõem ("guia de solicitação de
+    internação" conta 'guia de solicitacao' e 'solicitacao de internacao'); entre
+    termos que começam na mesma palavra, só o mais longo conta.
+    """
+
+    def __init__(self, rules=DOCUMENT_RULES):
+        self.rules = rules
+        self.priority = {doc_type: index for index, doc_type in enumerate(rules)}
+
+        # Palavra-chave normalizada como o texto ('cid-10' -> 'cid 10') -> [(tipo, peso)]:
+        # o mesmo termo pode pontuar para vários tipos
+        self.keyword_weights = {}
+        for doc_type, rule in rules.items():
+            for keyword, weight in rule['keywords'].items():
+                self.keyword_weights.setdefault(fold_text(keyword), []).append((doc_type, weight))
+        self.required = {doc_type: {fold_text(keyword) for keyword in rule.get('required', ())}
+                         for doc_type, rule in rules.items()}
+
+        # O espaço literal no início deixa o regex saltar direto para os começos de palavra
+        self.pattern = re.compile(' (?=(' + _trie_pattern(self.keyword_weights) + ') )')
+
+    def _hits(self, text):
+        return Counter(self.pattern.findall(' ' + fold_text(text or '') + ' '))
+
+    def _scores(self, hits):
+        scores = dict.fromkeys(self.rules, 0.0)
+        for keyword, count in hits.items():
+            for doc_type, weight in self.keyword_weights[keyword]:
+                scores[doc_type] += weight * min(count, MAX_HITS_PER_KEYWORD)
+        return scores
+
+    def scores(self, text):
+        """Pontuação de cada tipo de documento para o texto"""
+        return self._scores(self._hits(text))
+
+    def classify(self, text):
+        """Retornar (tipo, confiança); 'other' quando nenhum tipo atinge a pontuação mínima"""
+        hits = self._hits(text)
+        scores = self._scores(hits)
+        candidates = [
+            doc_type for doc_type, score in scores.items()
+            if score >= self.rules[doc_type]['min_score']
+            and not (self.required[doc_type] and self.required[doc_type].isdisjoint(hits))
+        ]
+        if not candidates:
+            return 'other', 0.0
+
+        best = max(candidates, key=lambda doc_type: (scores[doc_type], -self.priority[doc_type]))
+        return best, scores[best] / sum(scores.values())
+
+    def classify_many(self, texts):
+        """Classificar uma lista de textos de OCR (reprocessamentos em lote)"""
+        return [self.classify(text) for text in texts]
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_document_classifier():
+    """Obter o classificador compartilhado do processo (autômato compilado uma vez)"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = DocumentClassifier()
+    return _classifier
@@ -0,0 +1,71 @@
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import Blueprint, Response, current_app, jsonify, request, send_file
+from src.models.user import db
+from src.models.document import Document
+from src.services.blob_store import BlobStore
+
+document_file_bp = Blueprint('document_file', __name__)
+
+def _accel_response(document, store, download):
+    """Resposta vazia com X-Accel-Redirect: o nginx lê o arquivo do disco (sendfile, Range)"""
+    prefix = current_app.config['BLOB_ACCEL_REDIRECT_PREFIX'].rstrip('/')
+    relative = os.path.relpath(document.file_path, store.root).replace(os.sep, '/')
+    response = Response(status=200, mimetype=document.mime_type)
+    response.headers['X-Accel-Redirect'] = f'{prefix}/{relative}'
+    response.headers['Content-Disposition'] = _content_disposition(document.file_name, download)
+    return response
+
+def _content_disposition(file_name, download):
+    """Mesmo formato do send_file: nome ASCII + filename* em UTF-8"""
+    kind = 'attachment' if download else 'inline'
+    ascii_name = unicodedata.normalize('NFKD', file_name).encode('ascii', 'ignore').decode('ascii')
+    ascii_name = ascii_name.replace('"', '').replace('\\', '') or 'documento'
+    if ascii_name == file_name:
+        return f'{kind}; filename="{ascii_name}"'
+    return f"{kind}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+@document_file_bp.route('/documents/<int:document_id>/file', methods=['GET', 'HEAD'])
+def get_document_file(document_id):
+    """Servir o arquivo do documento sem carregá-lo na memória do Python
+
+    Blobs são imutáveis, então o SHA-256 é a ETag (If-None-Match responde 304).
+    Com BLOB_ACCEL_REDIRECT_PREFIX, o envio fica a cargo do nginx; senão o
+    send_file usa o wsgi.file_wrapper do servidor (sendfile no gunicorn) e
+    responde pedidos Range com 206.
+    """
+    try:
+        document = db.session.get(Document, document_id)
+        if document is None:
+            return jsonify({'error': 'Documento não encontrado'}), 404
+        if not os.path.isfile(document.file_path):
+            return jsonify({'error': 'Arquivo do documento não encontrado'}), 404
+
+        config = current_app.config
+        download = request.args.get('download', '0').lower() in ('1', 'true', 'yes')
+        store = BlobStore.from_config(config)
+
+        if document.content_hash and config.get('BLOB_ACCEL_REDIRECT_PREFIX') \
+                and os.path.abspath(document.file_path).startswith(store.root + os.sep):
+            response = _accel_response(document, store, download)
+            response.set_etag(document.content_hash)
+            response.cache_control.private = True
+            response.cache_control.max_age = config.get('BLOB_CACHE_MAX_AGE', 86400)
+            return response.make_conditional(request)
+
+        response = send_file(
+            document.file_path,
+            mimetype=document.mime_type,
+            as_attachment=download,
+            download_name=document.file_name,
+            conditional=True,
+            # Documentos antigos (fora do blob store) usam a ETag padrão: mtime + tamanho
+            etag=document.content_hash or True,
+            max_age=config.get('BLOB_CACHE_MAX_AGE', 86400)
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+
+# Métricas do Prometheus somadas entre os workers: cada processo grava no diretório
+# e o /metrics lê todos os arquivos (ver src/services/metrics.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus_multiproc'))
+
+# App importado uma vez no master: workers nascem por fork, já com os módulos carregados
+# (boot e reciclagem mais rápidos, memória compartilhada). Recursos por processo são
+# recriados no filho pelos handlers de src/services/lifecycle.py.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+def on_starting(server):
+    """Apagar os arquivos de métricas de execuções anteriores"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    """Descartar os valores 'live' do worker que saiu (contadores e histogramas continuam somados)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_worker_init(worker):
+    """Iniciar os workers embutidos da fila e do dispatcher no processo do worker, depois do fork"""
+    from main import app, start_background_workers
+    start_background_workers(app)
+
+def worker_exit(server, worker):
+    """Terminar as mensagens em andamento no modo de ingestão 'async' antes de o worker sair"""
+    from src.services.async_runner import stop_async_runner
+    stop_async_runner()
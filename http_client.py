@@ -0,0 +1,346 @@
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from flask import current_app
+from src.services.lifecycle import after_fork
+from src.services.metrics import observe_integration
+
+# Status HTTP que indicam falha transitória do servidor remoto
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+
+class CircuitOpenError(Exception):
+    """Circuito aberto: o host vem falhando e as chamadas estão suspensas temporariamente"""
+
+class CircuitBreaker:
+    """Circuit breaker simples (closed -> open -> half-open) baseado em falhas consecutivas"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Verificar se uma chamada pode ser feita agora"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                # Apenas uma chamada de teste enquanto o circuito está meio aberto
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Liberar a chamada de teste que terminou sem resposta nem falha do host (ex.: erro local, cancelamento)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+class IntegrationClient:
+    """Cliente HTTP compartilhado de uma integração externa
+
+    Mantém conexões keep-alive por host, limita chamadas simultâneas por host,
+    aplica timeouts, refaz chamadas em 429/5xx com backoff e jitter e abre o
+    circuito quando o host falha repetidamente.
+    """
+
+    def __init__(self, name, base_url='', headers=None, connect_timeout=5.0, read_timeout=30.0,
+                 pool_maxsize=20, max_concurrency=10, max_retries=3, backoff_base=0.5,
+                 backoff_max=10.0, breaker_failures=5, breaker_reset=30.0):
+        self.name = name
+        self.base_url = (base_url or '').rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+
+        self.session = self._create_session(headers or {}, pool_maxsize)
+
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _create_session(self, headers, pool_maxsize):
+        # requests só é importado quando a primeira integração é usada, não no boot do worker
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.headers.update(headers)
+        # Retentativas são feitas aqui (com jitter); o adapter só cuida do pool
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _new_semaphore(self):
+        return threading.BoundedSemaphore(self.max_concurrency)
+
+    def _host_state(self, url):
+        """Semáforo e circuit breaker do host da URL"""
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = (
+                    self._new_semaphore(),
+                    CircuitBreaker(self.breaker_failures, self.breaker_reset)
+                )
+            return self._hosts[host]
+
+    def _url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        if not path:
+            return self.base_url
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _backoff(self, attempt, response=None):
+        """Tempo de espera antes da próxima tentativa (Retry-After tem prioridade)
+
+        Retorna None quando o Retry-After passa de backoff_max: a resposta volta
+        para o chamador (ex.: a fila reagenda o job) em vez de prender a thread.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    delay = max(0.0, float(retry_after))
+                except ValueError:
+                    delay = None
+                if delay is not None:
+                    return delay if delay <= self.backoff_max else None
+        # Full jitter: evita que vários workers tentem de novo ao mesmo tempo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, path='', retry=None, max_retries=None, **kwargs):
+        """Fazer uma requisição com pool, timeout, retentativas e circuit breaker
+
+        Por padrão, erros 5xx só são refeitos em métodos idempotentes; 429 e falhas
+        de conexão são sempre refeitos. Use `retry=True/False` para forçar e
+        `max_retries=0` quando o chamador agenda as próprias retentativas.
+        """
+        import requests
+
+        method = method.upper()
+        url = self._url(path)
+        semaphore, breaker = self._host_state(url)
+        kwargs.setdefault('timeout', self.timeout)
+        retry_server_errors = method in IDEMPOTENT_METHODS if retry is None else retry
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f'{self.name}: circuito aberto para {urlsplit(url).netloc}')
+
+            started = time.perf_counter()
+            try:
+                with semaphore:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                observe_integration(self.name, method, type(e).__name__, time.perf_counter() - started)
+                breaker.record_failure()
+                if attempt >= max_retries or retry is False:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Sem isso, uma chamada de teste que falha por outro motivo deixaria o circuito aberto para sempre
+                breaker.release()
+                raise
+
+            # Inclui a espera pelo semáforo do host: é a latência que o chamador sente
+            observe_integration(self.name, method, response.status_code, time.perf_counter() - started)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            retryable = response.status_code == 429 or (
+                response.status_code in RETRY_STATUSES and retry_server_errors
+            )
+            delay = self._backoff(attempt, response) if retryable and attempt < max_retries else None
+            if delay is not None:
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            return response
+
+    def get(self, path='', **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path='', **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path='', **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+class AsyncIntegrationClient(IntegrationClient):
+    """Versão assíncrona (httpx) do IntegrationClient, para o loop do AsyncRunner
+
+    Mesmos timeouts, retentativas e circuit breaker; o limite por host é um
+    asyncio.Semaphore, então só pode ser usado no event loop em que foi criado.
+    `get`/`post`/`put` retornam corrotinas.
+    """
+
+    def _create_session(self, headers, pool_maxsize):
+        import httpx
+
+        # Sem limite de conexões no pool: quem limita é o semáforo por host
+        return httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_maxsize)
+        )
+
+    def _new_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def request(self, method, path='', retry=None, max_retries=None, **kwargs):
+        """Mesma política do IntegrationClient.request, esperando com asyncio.sleep"""
+        import httpx
+
+        method = method.upper()
+        url = self._url(path)
+        semaphore, breaker = self._host_state(url)
+        retry_server_errors = method in IDEMPOTENT_METHODS if retry is None else retry
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f'{self.name}: circuito aberto para {urlsplit(url).netloc}')
+
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    response = await self.session.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                observe_integration(self.name, method, type(e).__name__, time.perf_counter() - started)
+                breaker.record_failure()
+                if attempt >= max_retries or retry is False:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Inclui o cancelamento da tarefa (asyncio.CancelledError)
+                breaker.release()
+                raise
+
+            observe_integration(self.name, method, response.status_code, time.perf_counter() - started)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            retryable = response.status_code == 429 or (
+                response.status_code in RETRY_STATUSES and retry_server_errors
+            )
+            delay = self._backoff(attempt, response) if retryable and attempt < max_retries else None
+            if delay is not None:
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            return response
+
+    async def close(self):
+        await self.session.aclose()
+
+def _client_settings(name, config):
+    """Montar URL base e cabeçalhos de cada integração a partir do Config"""
+    if name == 'whatsapp':
+        return config.get('WHATSAPP_API_URL'), {
+            'Authorization': f"Bearer {config.get('WHATSAPP_API_TOKEN')}",
+            'Content-Type': 'application/json'
+        }
+    if name == 'asana':
+        return config.get('ASANA_API_URL') or 'https://app.asana.com/api/1.0', {
+            'Authorization': f"Bearer {config.get('ASANA_API_TOKEN')}",
+            'Content-Type': 'application/json'
+        }
+    if name == 'ocr':
+        return config.get('OCR_API_URL'), {'apikey': config.get('OCR_API_KEY') or ''}
+    raise ValueError(f'Integração desconhecida: {name}')
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(name):
+    """Obter o cliente compartilhado (um por processo) de uma integração"""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = build_client(name, current_app.config)
+        return _clients[name]
+
+def build_client(name, config, client_class=IntegrationClient):
+    """Criar um cliente da integração com as configurações HTTP_* do Config"""
+    base_url, headers = _client_settings(name, config)
+    return client_class(
+        name,
+        base_url=base_url,
+        headers=headers,
+        connect_timeout=config.get('HTTP_CONNECT_TIMEOUT', 5.0),
+        read_timeout=config.get('HTTP_READ_TIMEOUT', 30.0),
+        pool_maxsize=config.get('HTTP_POOL_MAXSIZE', 20),
+        max_concurrency=config.get('HTTP_MAX_CONCURRENCY_PER_HOST', 10),
+        max_retries=config.get('HTTP_MAX_RETRIES', 3),
+        backoff_base=config.get('HTTP_BACKOFF_BASE', 0.5),
+        backoff_max=config.get('HTTP_BACKOFF_MAX', 10.0),
+        breaker_failures=config.get('HTTP_BREAKER_FAILURES', 5),
+        breaker_reset=config.get('HTTP_BREAKER_RESET_SECONDS', 30.0)
+    )
+
+def reset_clients():
+    """Fechar e descartar todos os clientes (ex.: em testes)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+@after_fork
+def _discard_inherited_clients():
+    """No filho, esquecer os clientes do processo pai sem fechar as conexões, que ainda são do pai"""
+    global _clients, _clients_lock
+    _clients = {}
+    _clients_lock = threading.Lock()
@@ -0,0 +1,173 @@
+import numpy as np
+from PIL import Image, ImageOps
+
+# Tag EXIF de orientação; os valores 5 a 8 giram a imagem em 90 graus
+EXIF_ORIENTATION = 0x0112
+
+def _enabled(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+class ImagePreprocessor:
+    """Pré-processamento de fotos antes do Tesseract
+
+    Etapas (todas opcionais): orientação EXIF/OSD, redução para a resolução que o
+    Tesseract precisa, escala de cinza, binarização (adaptativa ou Otsu) e
+    correção de inclinação. Operações por pixel são vetorizadas com NumPy.
+    """
+
+    def __init__(self, target_dpi=300, max_dimension=2480, binarize='adaptive', window=41,
+                 threshold=0.15, deskew=False, max_skew=10.0, auto_rotate=False):
+        self.target_dpi = target_dpi
+        self.max_dimension = max_dimension  # Lado maior de uma página A4 a 300 DPI
+        self.binarize = binarize  # adaptive, otsu ou none
+        self.window = window
+        self.threshold = threshold
+        self.deskew = deskew
+        self.max_skew = max_skew
+        self.auto_rotate = auto_rotate
+
+    @classmethod
+    def from_config(cls, config):
+        """Criar a partir das chaves OCR_* (None se o pré-processamento estiver desligado)"""
+        if not _enabled(config.get('OCR_PREPROCESS', '0')):
+            return None
+        return cls(
+            target_dpi=int(config.get('OCR_TARGET_DPI', 300)),
+            max_dimension=int(config.get('OCR_MAX_DIMENSION', 2480)),
+            binarize=config.get('OCR_BINARIZE') or 'adaptive',
+            deskew=_enabled(config.get('OCR_DESKEW', '0')),
+            auto_rotate=_enabled(config.get('OCR_AUTO_ROTATE', '0'))
+        )
+
+    def fingerprint(self):
+        """Representação estável da configuração (entra na chave do cache de OCR)"""
+        return (f'pre:{self.target_dpi}:{self.max_dimension}:{self.binarize}:{self.window}:'
+                f'{self.threshold}:{int(self.deskew)}:{self.max_skew}:{int(self.auto_rotate)}')
+
+    def process(self, image):
+        """Aplicar o pipeline e retornar uma imagem pronta para o Tesseract"""
+        # Tamanho final calculado uma única vez: depois do draft() o info['dpi'] ainda é o
+        # original e um novo cálculo reduziria a imagem já reduzida
+        size = self.target_size(image)
+        rotated = image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8)
+        if size != image.size and image.format == 'JPEG':
+            # draft() faz o decodificador JPEG reduzir a imagem já na leitura (bem mais rápido)
+            image.draft('RGB', size)
+
+        # Fotos de celular guardam a orientação no EXIF em vez de girar os pixels
+        image = ImageOps.exif_transpose(image)
+        if rotated:
+            size = size[::-1]
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        gray = image.convert('L')
+
+        if self.auto_rotate:
+            gray = self._rotate_upright(gray)
+
+        pixels = np.asarray(gray, dtype=np.float32)
+
+        if self.deskew:
+            angle = self.estimate_skew(pixels)
+            if abs(angle) >= 0.2:
+                gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+                pixels = np.asarray(gray, dtype=np.float32)
+
+        if self.binarize == 'adaptive':
+            pixels = adaptive_threshold(pixels, self.window, self.threshold)
+        elif self.binarize == 'otsu':
+            pixels = otsu_threshold(pixels)
+        else:
+            return gray
+
+        return Image.fromarray(pixels)
+
+    def target_size(self, image):
+        """Tamanho para o DPI alvo / dimensão máxima (a imagem nunca é ampliada)"""
+        scale = 1.0
+        dpi = image.info.get('dpi')
+        if dpi and dpi[0] and dpi[0] > self.target_dpi:
+            scale = self.target_dpi / float(dpi[0])
+
+        longest = max(image.size)
+        if longest * scale > self.max_dimension:
+            scale = self.max_dimension / float(longest)
+
+        if scale >= 1.0:
+            return image.size
+        return max(1, int(image.width * scale)), max(1, int(image.height * scale))
+
+    def _rotate_upright(self, gray):
+        """Corrigir rotações de 90/180/270 graus usando o OSD do Tesseract"""
+        try:
+            import pytesseract
+            osd = pytesseract.image_to_osd(gray, output_type=pytesseract.Output.DICT)
+            rotate = int(osd.get('rotate', 0))
+            if rotate:
+                return gray.rotate(-rotate, expand=True, fillcolor=255)
+        except Exception as e:
+            print(f"OSD error: {str(e)}")
+        return gray
+
+    def estimate_skew(self, pixels, step=0.5):
+        """Estimar o ângulo (graus) que corrige a inclinação, pelo perfil de projeção horizontal
+
+        O ângulo correto deixa as linhas de texto alinhadas, maximizando a variância
+        da soma de pixels escuros por linha. Usa uma cópia reduzida da imagem.
+        """
+        small = Image.fromarray(pixels.astype(np.uint8))
+        factor = max(1, max(small.size) // 800)
+        if factor > 1:
+            small = small.reduce(factor)
+
+        ink = (np.asarray(small, dtype=np.float32) < otsu_level(np.asarray(small))).astype(np.uint8) * 255
+        ink_image = Image.fromarray(ink)
+
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-self.max_skew, self.max_skew + step, step):
+            rotated = np.asarray(ink_image.rotate(float(angle), resample=Image.NEAREST, expand=False), dtype=np.float32)
+            profile = rotated.sum(axis=1)
+            score = float(np.var(profile))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        return best_angle
+
+def adaptive_threshold(pixels, window=41, threshold=0.15):
+    """Binarização adaptativa de Bradley-Roth usando imagem integral (O(1) por pixel)"""
+    height, width = pixels.shape
+    half = window // 2
+
+    integral = np.zeros((height + 1, width + 1), dtype=np.float64)
+    integral[1:, 1:] = pixels.cumsum(axis=0).cumsum(axis=1)
+
+    rows = np.arange(height)
+    cols = np.arange(width)
+    y0 = np.clip(rows - half, 0, height)[:, None]
+    y1 = np.clip(rows + half + 1, 0, height)[:, None]
+    x0 = np.clip(cols - half, 0, width)[None, :]
+    x1 = np.clip(cols + half + 1, 0, width)[None, :]
+
+    area = (y1 - y0) * (x1 - x0)
+    window_sum = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+    # Pixel é fundo (branco) se for mais claro que a média local com uma margem
+    return np.where(pixels * area > window_sum * (1.0 - threshold), 255, 0).astype(np.uint8)
+
+def otsu_level(pixels):
+    """Nível de Otsu: limiar global que maximiza a variância entre classes"""
+    histogram = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+
+    weight_bg = np.cumsum(histogram)
+    weight_fg = total - weight_bg
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_bg = cumulative_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_fg, 1)
+
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+def otsu_threshold(pixels):
+    """Binarização global de Otsu"""
+    return np.where(pixels > otsu_level(pixels), 255, 0).astype(np.uint8)
@@ -0,0 +1,211 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+# Mesmas categorias do prompt de AIService.classify_intent
+INTENTS = ('status_inquiry', 'document_submission', 'general_question', 'complaint', 'greeting')
+
+# Padrões por intenção (texto já em minúsculas e sem acentos) e o peso de cada acerto
+INTENT_PATTERNS = {
+    'greeting': (0.6, [
+        r'oi+', r'ola', r'bom dia', r'boa tarde', r'boa noite', r'e ai', r'opa', r'hey',
+        r'tudo bem', r'tudo bom', r'obrigad[oa]', r'valeu'
+    ]),
+    'status_inquiry': (1.0, [
+        r'status', r'andamento', r'situacao', r'como (?:esta|anda|ta) (?:o|meu|a|minha)',
+        r'(?:ja )?foi aprovad[oa]', r'previsao', r'quando (?:vou|vai|sera|eu vou) (?:receber|sair|cair)',
+        r'ja saiu', r'novidades?', r'alguma (?:novidade|atualizacao|resposta)', r'em que pe'
+    ]),
+    'document_submission': (1.0, [
+        r'segue(?:m)?', r'enviando', r'estou (?:enviando|mandando)', r'em anexo', r'anexad[oa]s?',
+        r'mandei', r'acabei de (?:enviar|mandar)', r'(?:vou|irei) (?:enviar|mandar)', r'foto d[aoe]',
+        r'aqui (?:esta|vai|estao)'
+    ]),
+    'complaint': (1.0, [
+        r'reclama\w*', r'absurdo', r'demora(?:ndo|do|da)?', r'ninguem (?:responde|retorna|me responde)',
+        r'insatisfeit[oa]', r'pessim[oa]', r'horrivel', r'descaso', r'procon', r'indignad[oa]',
+        r'sem resposta', r'falta de respeito', r'cansad[oa] de esperar', r'nao aguento'
+    ]),
+    'general_question': (0.8, [
+        r'como (?:funciona|faco|peco|solicito|envio)', r'quais (?:documentos|sao)', r'qual (?:o )?prazo',
+        r'quanto tempo', r'preciso (?:de|enviar)', r'posso', r'o que e', r'duvida', r'voces (?:fazem|atendem)'
+    ])
+}
+
+# Palavras que podem acompanhar um cumprimento sem mudar o sentido da mensagem
+GREETING_FILLERS = [r'muito', r'pessoal', r'gente', r'e (?:com )?voce', r'a todos', r'de novo']
+
+# Amostras rotuladas para treinar o modelo de n-gramas (bag-of-words + n-gramas de caracteres)
+TRAINING_SAMPLES = [
+    ('oi', 'greeting'), ('olá', 'greeting'), ('oii', 'greeting'), ('bom dia', 'greeting'),
+    ('boa tarde!', 'greeting'), ('boa noite', 'greeting'), ('olá, tudo bem?', 'greeting'),
+    ('oi, bom dia', 'greeting'), ('e aí', 'greeting'), ('opa', 'greeting'), ('obrigada!', 'greeting'),
+    ('muito obrigado', 'greeting'), ('valeu', 'greeting'), ('oi tudo bom', 'greeting'),
+
+    ('qual o status?', 'status_inquiry'), ('qual o status do meu reembolso?', 'status_inquiry'),
+    ('como está meu processo?', 'status_inquiry'), ('andamento do reembolso', 'status_inquiry'),
+    ('meu reembolso já foi aprovado?', 'status_inquiry'), ('alguma novidade sobre minha cirurgia?', 'status_inquiry'),
+    ('quando vou receber o reembolso?', 'status_inquiry'), ('qual a situação do meu pedido', 'status_inquiry'),
+    ('já saiu o pagamento?', 'status_inquiry'), ('status da cirurgia', 'status_inquiry'),
+    ('gostaria de saber como anda o meu reembolso', 'status_inquiry'), ('tem previsão de pagamento?', 'status_inquiry'),
+    ('em que pé está meu processo', 'status_inquiry'), ('reembolso', 'status_inquiry'), ('cirurgia', 'status_inquiry'),
+
+    ('segue a guia médica', 'document_submission'), ('estou enviando os documentos', 'document_submission'),
+    ('segue em anexo o laudo', 'document_submission'), ('mandei a foto da carteirinha', 'document_submission'),
+    ('aqui está minha CNH', 'document_submission'), ('acabei de enviar o relatório médico', 'document_submission'),
+    ('vou mandar a nota fiscal agora', 'document_submission'), ('seguem os documentos solicitados', 'document_submission'),
+    ('foto do RG', 'document_submission'), ('enviando o comprovante de pagamento', 'document_submission'),
+    ('aqui vai o laudo da cirurgia', 'document_submission'), ('anexei a guia', 'document_submission'),
+
+    ('como funciona o reembolso?', 'general_question'), ('quais documentos preciso enviar?', 'general_question'),
+    ('qual o prazo para o reembolso?', 'general_question'), ('quanto tempo demora em média?', 'general_question'),
+    ('vocês atendem plano Bradesco?', 'general_question'), ('posso enviar o documento por foto?', 'general_question'),
+    ('o que é a guia médica?', 'general_question'), ('tenho uma dúvida sobre o processo', 'general_question'),
+    ('como faço para pedir reembolso?', 'general_question'), ('preciso de relatório médico?', 'general_question'),
+    ('qual o valor da taxa de vocês?', 'general_question'), ('vocês fazem reembolso de exames?', 'general_question'),
+
+    ('isso é um absurdo', 'complaint'), ('está demorando demais', 'complaint'),
+    ('ninguém me responde', 'complaint'), ('estou muito insatisfeito com o atendimento', 'complaint'),
+    ('péssimo serviço', 'complaint'), ('vou reclamar no procon', 'complaint'),
+    ('já faz meses e nada', 'complaint'), ('que descaso com o paciente', 'complaint'),
+    ('estou cansada de esperar', 'complaint'), ('quero fazer uma reclamação', 'complaint'),
+    ('o valor veio errado', 'complaint'), ('sem resposta até agora, horrível', 'complaint'),
+]
+
+def normalize_text(text):
+    """Minúsculas, sem acentos e com espaços normalizados"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _features(text):
+    """Palavras, bigramas de palavras e n-gramas de caracteres (3 e 4) do texto normalizado"""
+    words = re.findall(r'\w+', text)
+    features = [f'w:{word}' for word in words]
+    features += [f'b:{a}_{b}' for a, b in zip(words, words[1:])]
+    padded = f' {" ".join(words)} '
+    for n in (3, 4):
+        features += [f'c:{padded[i:i + n]}' for i in range(len(padded) - n + 1)]
+    return features
+
+class IntentClassifier:
+    """Classificador local de intenção: padrões compilados + Naive Bayes multinomial
+
+    Roda no próprio processo em microssegundos; mensagens com confiança abaixo
+    do limiar devem ser encaminhadas para AIService.classify_intent.
+    """
+
+    def __init__(self, samples=TRAINING_SAMPLES, patterns=INTENT_PATTERNS, threshold=0.6, alpha=0.5, max_evidence=6):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.max_evidence = max_evidence
+        self.weights = {intent: weight for intent, (weight, _) in patterns.items()}
+        # Um único regex com um grupo nomeado por intenção: uma passada sobre o texto
+        self.pattern = re.compile('|'.join(
+            rf"(?P<{intent}>\b(?:{'|'.join(intent_patterns)})\b)"
+            for intent, (_, intent_patterns) in patterns.items()
+        ))
+        # Mensagem inteira só de cumprimentos (e pontuação): só ela dispensa o LLM
+        greetings = patterns['greeting'][1] + GREETING_FILLERS
+        self.greeting_only = re.compile(rf"\W*(?:(?:{'|'.join(greetings)})\b\W*)+")
+        self._train(samples)
+
+    def _train(self, samples):
+        class_counts = Counter()
+        feature_counts = defaultdict(Counter)
+        vocabulary = set()
+
+        for text, intent in samples:
+            class_counts[intent] += 1
+            features = _features(normalize_text(text))
+            feature_counts[intent].update(features)
+            vocabulary.update(features)
+
+        total = sum(class_counts.values())
+        self.log_priors = {intent: math.log((class_counts[intent] + 1) / (total + len(INTENTS))) for intent in INTENTS}
+
+        self.log_likelihoods = {}
+        self.log_unseen = {}
+        for intent in INTENTS:
+            denominator = sum(feature_counts[intent].values()) + self.alpha * len(vocabulary)
+            self.log_unseen[intent] = math.log(self.alpha / denominator)
+            for feature, count in feature_counts[intent].items():
+                self.log_likelihoods.setdefault(feature, {})[intent] = math.log((count + self.alpha) / denominator)
+
+    def _model_probabilities(self, text):
+        features = _features(text)
+        sums = {intent: 0.0 for intent in INTENTS}
+        known = 0
+        for feature in features:
+            likelihoods = self.log_likelihoods.get(feature)
+            if likelihoods is None:
+                continue  # Fora do vocabulário: não traz evidência
+            known += 1
+            for intent in INTENTS:
+                sums[intent] += likelihoods.get(intent, self.log_unseen[intent])
+
+        # Os n-gramas se sobrepõem e não são independentes: limitar a evidência
+        # total evita probabilidades saturadas em 1.0 para textos longos
+        scale = min(1.0, self.max_evidence / known) if known else 1.0
+        scores = {intent: self.log_priors[intent] + total * scale for intent, total in sums.items()}
+
+        top = max(scores.values())
+        exp_scores = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp_scores.values())
+
+        # Textos com muitas palavras desconhecidas puxam a distribuição para a uniforme
+        coverage = known / len(features) if features else 0.0
+        return {
+            intent: coverage * value / total + (1 - coverage) / len(INTENTS)
+            for intent, value in exp_scores.items()
+        }
+
+    def _pattern_scores(self, text):
+        hits = Counter()
+        for match in self.pattern.finditer(text):
+            hits[match.lastgroup] += self.weights[match.lastgroup]
+        return hits
+
+    def scores(self, text):
+        """Probabilidade de cada intenção para a mensagem"""
+        text = normalize_text(text)
+        probabilities = self._model_probabilities(text)
+
+        hits = self._pattern_scores(text)
+        if hits:
+            total_hits = sum(hits.values())
+            probabilities = {
+                intent: 0.4 * probability + 0.6 * hits.get(intent, 0) / total_hits
+                for intent, probability in probabilities.items()
+            }
+        return probabilities
+
+    def classify(self, text):
+        """Retornar (intenção, confiança) para a mensagem"""
+        if not text or not text.strip():
+            return 'greeting', 0.0
+        probabilities = self.scores(text)
+        intent = max(probabilities, key=probabilities.get)
+        if intent == 'greeting' and not self.is_greeting(text):
+            # Cumprimento no início de uma pergunta ("bom dia, quero cancelar"): vale o resto da mensagem
+            del probabilities['greeting']
+            intent = max(probabilities, key=probabilities.get)
+        return intent, probabilities[intent]
+
+    def is_greeting(self, text):
+        """A mensagem é só um cumprimento, sem pedido ou pergunta junto"""
+        return bool(self.greeting_only.fullmatch(normalize_text(text or '')))
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_intent_classifier():
+    """Obter o classificador compartilhado do processo (treinado no primeiro uso)"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = IntentClassifier()
+    return _classifier
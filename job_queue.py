@@ -0,0 +1,365 @@
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.queue_job import QueueJob
+from src.models.lease_lock import LeaseLock
+from src.services.metrics import observe_job, record_error
+
+# Handlers registrados por fila: nome da fila -> função que recebe o payload
+_handlers = {}
+
+def register_handler(queue, handler):
+    """Registrar a função que processa os jobs de uma fila"""
+    _handlers[queue] = handler
+
+def enqueue_many(queue, items, max_attempts=None, available_at=None):
+    """Enfileirar jobs ignorando chaves de deduplicação já existentes
+
+    `items` é uma lista de tuplas (dedup_key, payload); `available_at` adia a
+    primeira execução. Retorna quantos jobs novos foram gravados.
+    """
+    if not items:
+        return 0
+
+    max_attempts = max_attempts or current_app.config.get('QUEUE_MAX_ATTEMPTS', 5)
+    schedule = {'available_at': available_at} if available_at else {}
+
+    keys = [key for key, _ in items if key]
+    existing = set()
+    if keys:
+        existing = {row[0] for row in db.session.query(QueueJob.dedup_key).filter(QueueJob.dedup_key.in_(keys))}
+
+    pending = []
+    seen = set()
+    for key, payload in items:
+        if key and (key in existing or key in seen):
+            continue
+        seen.add(key)
+        pending.append((key, payload))
+
+    if not pending:
+        return 0
+
+    try:
+        db.session.add_all([
+            QueueJob(queue=queue, dedup_key=key, payload=payload, max_attempts=max_attempts, **schedule)
+            for key, payload in pending
+        ])
+        db.session.commit()
+        return len(pending)
+    except IntegrityError:
+        # Outra requisição gravou a mesma chave entre a consulta e o insert (reentrega do webhook)
+        db.session.rollback()
+
+    created = 0
+    for key, payload in pending:
+        try:
+            db.session.add(QueueJob(queue=queue, dedup_key=key, payload=payload, max_attempts=max_attempts, **schedule))
+            db.session.commit()
+            created += 1
+        except IntegrityError:
+            db.session.rollback()
+    return created
+
+def retry_delay(attempts):
+    """Calcular o atraso da próxima tentativa (backoff exponencial com jitter)"""
+    base = current_app.config.get('QUEUE_RETRY_BASE_SECONDS', 2.0)
+    cap = current_app.config.get('QUEUE_RETRY_MAX_SECONDS', 300.0)
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _claimable(now):
+    return and_(
+        QueueJob.attempts < QueueJob.max_attempts,
+        or_(
+            and_(QueueJob.status == 'pending', QueueJob.available_at <= now),
+            # Lease expirado: o worker que reservou o job morreu ou travou
+            and_(QueueJob.status == 'processing', QueueJob.locked_until < now)
+        )
+    )
+
+def claim_jobs(queues, limit=1):
+    """Reservar até `limit` jobs disponíveis para este worker"""
+    now = datetime.utcnow()
+    lease = timedelta(seconds=current_app.config.get('QUEUE_LEASE_SECONDS', 120))
+
+    # Jobs que esgotaram as tentativas enquanto estavam reservados não voltam para a fila
+    db.session.execute(
+        update(QueueJob)
+        .where(QueueJob.status == 'processing',
+               QueueJob.locked_until < now,
+               QueueJob.attempts >= QueueJob.max_attempts)
+        .values(status='failed', locked_until=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+    candidate_ids = [
+        row[0] for row in db.session.query(QueueJob.id)
+        .filter(QueueJob.queue.in_(queues), _claimable(now))
+        .order_by(QueueJob.available_at, QueueJob.id)
+        .limit(limit * 4)
+    ]
+
+    claimed = []
+    for job_id in candidate_ids:
+        if len(claimed) >= limit:
+            break
+        # UPDATE condicional: só um worker consegue reservar cada job
+        result = db.session.execute(
+            update(QueueJob)
+            .where(QueueJob.id == job_id, _claimable(now))
+            .values(status='processing',
+                    locked_until=now + lease,
+                    attempts=QueueJob.attempts + 1,
+                    updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return QueueJob.query.filter(QueueJob.id.in_(claimed)).order_by(QueueJob.id).all()
+
+def _finish(job, lease_until=None, **values):
+    """Atualizar o job somente se o lease ainda pertence a este worker"""
+    values['updated_at'] = datetime.utcnow()
+    db.session.execute(
+        update(QueueJob)
+        .where(QueueJob.id == job.id, QueueJob.locked_until == (lease_until or job.locked_until))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def complete_job(job, lease_until=None):
+    """Marcar job como concluído (`lease_until`: prazo atual do lease, se foi renovado)"""
+    _finish(job, lease_until, status='done', locked_until=None, last_error=None)
+
+def fail_job(job, error, lease_until=None):
+    """Registrar falha do job e reagendar com backoff, ou desistir após o limite de tentativas"""
+    if job.attempts >= job.max_attempts:
+        _finish(job, lease_until, status='failed', locked_until=None, last_error=str(error)[:2000])
+    else:
+        _finish(job, lease_until,
+                status='pending',
+                locked_until=None,
+                available_at=datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts)),
+                last_error=str(error)[:2000])
+
+def purge_finished_jobs(older_than, batch_size=1000):
+    """Apagar jobs concluídos/falhos sem atualização há mais de `older_than`; retorna quantos saíram
+
+    Em lotes, para não travar a tabela. A chave de deduplicação do job apagado
+    fica livre: a retenção precisa ser maior que a janela de reentrega das origens.
+    """
+    cutoff = datetime.utcnow() - older_than
+    removed = 0
+    while True:
+        ids = [
+            row[0] for row in db.session.query(QueueJob.id)
+            .filter(QueueJob.status.in_(('done', 'failed')), QueueJob.updated_at < cutoff)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        removed += db.session.execute(
+            delete(QueueJob).where(QueueJob.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    return removed
+
+def process_available_jobs(queues=None, limit=1):
+    """Processar os jobs disponíveis; retorna quantos foram processados"""
+    queues = list(queues or _handlers.keys())
+    if not queues:
+        return 0
+
+    jobs = claim_jobs(queues, limit=limit)
+
+    for job in jobs:
+        handler = _handlers.get(job.queue)
+        started = time.perf_counter()
+        keeper = LeaseKeeper(job, db.engine, current_app.config.get('QUEUE_LEASE_SECONDS', 120))
+        keeper.start()
+        try:
+            if handler is None:
+                raise RuntimeError(f'Nenhum handler registrado para a fila {job.queue}')
+            handler(job.payload)
+        except Exception as e:
+            keeper.stop()
+            db.session.rollback()
+            print(f"Queue job {job.id} error: {str(e)}")
+            observe_job(job.queue, 'error', time.perf_counter() - started)
+            fail_job(job, e, keeper.locked_until)
+        else:
+            keeper.stop()
+            observe_job(job.queue, 'done', time.perf_counter() - started)
+            complete_job(job, keeper.locked_until)
+
+    return len(jobs)
+
+class LeaseKeeper:
+    """Renovar o lease de um job enquanto o handler roda (jobs mais longos que QUEUE_LEASE_SECONDS)
+
+    Sem renovação, o lease expira no meio do job e outro worker o reserva de
+    novo. A thread usa conexões próprias do engine, fora da sessão do handler.
+    """
+
+    def __init__(self, job, engine, lease_seconds):
+        self.job_id = job.id
+        self.locked_until = job.locked_until
+        self.engine = engine
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'lease-keeper-{job.id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            locked_until = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            try:
+                with self.engine.begin() as connection:
+                    renewed = connection.execute(
+                        update(QueueJob.__table__)
+                        .where(QueueJob.__table__.c.id == self.job_id,
+                               QueueJob.__table__.c.locked_until == self.locked_until)
+                        .values(locked_until=locked_until)
+                    ).rowcount == 1
+            except Exception as e:
+                print(f"Queue lease renewal error: {str(e)}")
+                record_error('job_queue', 'renew_lease')
+                continue
+            if not renewed:
+                print(f"Queue job {self.job_id} lost its lease")
+                record_error('job_queue', 'lease_lost')
+                return
+            self.locked_until = locked_until
+
+def acquire_lock(name, seconds):
+    """Adquirir a trava `name` por `seconds`; retorna o token do dono ou None se outro a detém"""
+    table = LeaseLock.__table__
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    values = {'owner': token, 'locked_until': now + timedelta(seconds=seconds), 'updated_at': now}
+    with db.engine.begin() as connection:
+        # Trava expirada (dono morreu) pode ser assumida
+        if connection.execute(
+            update(table).where(table.c.name == name, table.c.locked_until < now).values(**values)
+        ).rowcount == 1:
+            return token
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(table.insert().values(name=name, **values))
+        return token
+    except IntegrityError:
+        return None
+
+def renew_lock(name, token, seconds):
+    """Estender a trava; False se ela não pertence mais a `token`"""
+    table = LeaseLock.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(table).where(table.c.name == name, table.c.owner == token)
+            .values(locked_until=now + timedelta(seconds=seconds), updated_at=now)
+        ).rowcount == 1
+
+def release_lock(name, token):
+    """Liberar a trava, se ainda pertence a `token`"""
+    table = LeaseLock.__table__
+    with db.engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.name == name, table.c.owner == token))
+
+class QueueWorkerPool:
+    """Pool de threads que drena a fila de jobs dentro do contexto da aplicação"""
+
+    def __init__(self, app, queues=None, concurrency=None):
+        self.app = app
+        self.queues = queues
+        self.concurrency = concurrency or app.config.get('QUEUE_WORKERS', 4)
+        self.poll_interval = app.config.get('QUEUE_POLL_INTERVAL', 1.0)
+        self.retention_days = app.config.get('QUEUE_RETENTION_DAYS', 7)
+        self.purge_interval = app.config.get('QUEUE_PURGE_INTERVAL', 3600)
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Iniciar as threads do pool"""
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f'queue-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Sinalizar parada e aguardar as threads terminarem o job atual"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        """Executar o pool até receber KeyboardInterrupt (uso via CLI)"""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _purge_due(self):
+        """Uma limpeza a cada QUEUE_PURGE_INTERVAL por pool, feita pela thread que chegar primeiro"""
+        if self.retention_days <= 0:
+            return False
+        now = time.monotonic()
+        with self._purge_lock:
+            if now < self._next_purge:
+                return False
+            self._next_purge = now + self.purge_interval
+            return True
+
+    def _purge(self):
+        try:
+            removed = purge_finished_jobs(timedelta(days=self.retention_days))
+            if removed:
+                print(f"Queue purge: {removed} jobs finalizados removidos")
+        except Exception as e:
+            print(f"Queue purge error: {str(e)}")
+            record_error('job_queue', 'purge')
+            db.session.rollback()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                if self._purge_due():
+                    self._purge()
+                try:
+                    processed = process_available_jobs(self.queues)
+                except Exception as e:
+                    print(f"Queue worker error: {str(e)}")
+                    record_error('job_queue', 'worker')
+                    db.session.rollback()
+                    processed = 0
+                finally:
+                    db.session.remove()
+
+            if not processed:
+                self._stop.wait(self.poll_interval)
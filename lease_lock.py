@@ -0,0 +1,14 @@
+from datetime import datetime
+from src.models.user import db
+
+class LeaseLock(db.Model):
+    """Trava com prazo entre processos (ex.: uma única sincronização com o Asana por vez)
+
+    O dono renova o prazo enquanto trabalha; se morrer, a trava expira e outro processo assume.
+    """
+    __tablename__ = 'lease_locks'
+
+    name = db.Column(db.String(100), primary_key=True)  # asana_sync
+    owner = db.Column(db.String(64), nullable=False)  # Token aleatório de quem adquiriu
+    locked_until = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
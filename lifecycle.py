@@ -0,0 +1,28 @@
+import os
+import threading
+
+# Funções que recriam recursos por processo (pools HTTP, clientes de IA, conexões do banco)
+_after_fork_handlers = []
+_after_fork_lock = threading.Lock()
+
+def after_fork(function):
+    """Registrar `function` para rodar no processo filho logo após um fork (pode ser usado como decorador)
+
+    Com `gunicorn --preload`, o app é importado no master e os workers nascem por
+    fork: conexões, pools e locks criados antes do fork não podem ser compartilhados.
+    """
+    with _after_fork_lock:
+        _after_fork_handlers.append(function)
+    return function
+
+def run_after_fork_handlers():
+    """Reinicializar os recursos por processo no filho"""
+    for function in list(_after_fork_handlers):
+        try:
+            function()
+        except Exception as e:
+            print(f"After fork handler error: {str(e)}")
+
+# Vale para qualquer fork feito pelo Python (gunicorn, multiprocessing); subprocess não passa por aqui
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=run_after_fork_handlers)
@@ -1,11 +1,24 @@
-from flask import Flask, send_from_directory
+import click
+import functools
+import os
+import threading
+from datetime import timedelta
+from flask import Flask, current_app, request, send_from_directory
 from flask_cors import CORS
 
 # Importações de modelos
 from src.models.user import db
-from src.models.surgery import Surgery
+from src.models.surgery import Surgery, normalize_phone
 from src.models.document import Document
 from src.models.report import Report
+from src.models.queue_job import QueueJob
+from src.models.ocr_cache_entry import OCRCacheEntry
+from src.models.dashboard_counter import DashboardCounter
+from src.models.asana_webhook_event import AsanaWebhookEvent
+from src.models.webhook_secret import WebhookSecret
+from src.models.lease_lock import LeaseLock
+from src.models.outbound_message import OutboundMessage
+from src.models.conversation_state import ConversationState
 
 # Importações de blueprints (rotas)
 from src.routes.user import user_bp
@@ -13,37 +26,303 @@ from src.routes.surgery import surgery_bp
 from src.routes.document import document_bp
 from src.routes.report import report_bp
 from src.routes.whatsapp import whatsapp_bp
-from src.routes.asana import asana_bp
+from src.routes.asana import SyncAlreadyRunning, asana_bp, sync_missing_tasks
+from src.routes.dashboard import dashboard_bp
+from src.routes.document_file import document_file_bp
+from src.routes.search import search_bp
+
+from src.services.job_queue import QueueWorkerPool, purge_finished_jobs
+from src.services import ocr_cache
+from src.services.ocr_service import OCRService
+from src.services.ai_service import get_ai_service
+from src.services.report_builder import ReportBuilder
+from src.services.whatsapp_dispatcher import WhatsAppDispatcher
+from src.services.blob_store import BlobStore
+from src.services.session_store import get_session_store
+from src.services.search_index import ensure_search_index, reindex
+from src.services.lifecycle import after_fork
+from src.services.static_assets import StaticManifest, precompress
+from src.services import metrics
 
 from config import Config
-import os
+from sqlalchemy import inspect, text
+
+def create_app(config=None):
+    """Criar e configurar o app Flask
+
+    Não acessa o banco nem cria clientes externos: o schema é criado por
+    `flask init-db` e os recursos de cada processo nascem no primeiro uso, o que
+    permite importar o app no master do gunicorn (--preload) antes do fork.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config.from_object(config or Config)
+
+    # Habilitar CORS para permitir acesso do frontend
+    CORS(app, origins="*")
+
+    # Latência por rota, consultas SQL por requisição e a rota /metrics
+    metrics.init_app(app)
+
+    # Registrar blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(surgery_bp, url_prefix='/api')
+    app.register_blueprint(document_bp, url_prefix='/api')
+    app.register_blueprint(report_bp, url_prefix='/api')
+    app.register_blueprint(whatsapp_bp, url_prefix='/api')
+    app.register_blueprint(asana_bp, url_prefix='/api')
+    app.register_blueprint(dashboard_bp, url_prefix='/api')
+    app.register_blueprint(document_file_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+
+    # Configurar banco de dados (conexões só são abertas na primeira consulta)
+    db.init_app(app)
+    after_fork(functools.partial(dispose_engines, app))
+
+    # Workers embutidos: o gunicorn os inicia depois do fork (gunicorn.conf.py);
+    # em outros servidores, na primeira requisição de cada processo
+    if app.config['QUEUE_EMBEDDED_WORKERS'] > 0 or app.config['WHATSAPP_DISPATCHER_EMBEDDED']:
+        app.before_request(functools.partial(start_background_workers, app))
+
+    # Frontend: índice da pasta static montado uma vez (com --preload, no master)
+    if app.config['STATIC_SERVING'] == 'manifest':
+        app.extensions['static_manifest'] = StaticManifest.build(
+            app.static_folder, max_age=app.config['STATIC_MAX_AGE'],
+            immutable_pattern=app.config['STATIC_IMMUTABLE_PATTERN'],
+            memory_max_bytes=app.config['STATIC_MEMORY_MAX_BYTES'])
+
+    register_commands(app)
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+    return app
+
+def init_database(app):
+    """Criar as tabelas e o índice de busca que ainda não existem"""
+    with app.app_context():
+        db.create_all()
+        ensure_search_index(db.engine)
+
+def dispose_engines(app):
+    """Descartar, no processo filho, as conexões do pool herdadas do pai (sem fechá-las)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+_background_lock = threading.Lock()
+
+def start_background_workers(app):
+    """Iniciar os workers embutidos da fila e do dispatcher, uma vez por processo"""
+    pid = os.getpid()
+    if app.extensions.get('background_workers_pid') == pid:
+        return
+    with _background_lock:
+        if app.extensions.get('background_workers_pid') == pid:
+            return
+        app.extensions['background_workers_pid'] = pid
+
+        # Workers da fila dentro do processo web (opcional; em produção prefira `flask queue-worker`)
+        if app.config['QUEUE_EMBEDDED_WORKERS'] > 0:
+            QueueWorkerPool(app, concurrency=app.config['QUEUE_EMBEDDED_WORKERS']).start()
+
+        # Dispatcher de mensagens de saída dentro do processo web (opcional; o limite de taxa é por processo)
+        if app.config['WHATSAPP_DISPATCHER_EMBEDDED']:
+            WhatsAppDispatcher(app).start()
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config.from_object(Config)
+def register_commands(app):
+    """Comandos `flask ...` de manutenção"""
 
-# Habilitar CORS para permitir acesso do frontend
-CORS(app, origins="*")
+    @app.cli.command('init-db')
+    def init_db():
+        """Criar as tabelas e o índice de busca (rodar no deploy, antes de subir os workers)"""
+        init_database(app)
+        click.echo('Banco de dados inicializado')
 
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(surgery_bp, url_prefix='/api')
-app.register_blueprint(document_bp, url_prefix='/api')
-app.register_blueprint(report_bp, url_prefix='/api')
-app.register_blueprint(whatsapp_bp, url_prefix='/api')
-app.register_blueprint(asana_bp, url_prefix='/api')
+    @app.cli.command('queue-worker')
+    @click.option('--concurrency', type=int, default=None, help='Número de threads (padrão: QUEUE_WORKERS)')
+    @click.option('--queue', 'queues', multiple=True, help='Filas a processar (padrão: todas)')
+    def queue_worker(concurrency, queues):
+        """Processar a fila de jobs em segundo plano"""
+        QueueWorkerPool(app, queues=list(queues) or None, concurrency=concurrency).run_forever()
 
-# Configurar banco de dados
-db.init_app(app)
-with app.app_context():
-    db.create_all()
+    @app.cli.command('queue-purge')
+    @click.option('--days', type=int, default=None, help='Idade mínima em dias (padrão: QUEUE_RETENTION_DAYS)')
+    def queue_purge(days):
+        """Apagar jobs concluídos/falhos antigos da fila"""
+        days = app.config['QUEUE_RETENTION_DAYS'] if days is None else days
+        removed = purge_finished_jobs(timedelta(days=days))
+        click.echo(f'{removed} jobs removidos da fila')
+
+    @app.cli.command('whatsapp-dispatcher')
+    @click.option('--rate', type=float, default=None, help='Mensagens por segundo (padrão: WHATSAPP_SEND_RATE)')
+    @click.option('--workers', type=int, default=None, help='Envios simultâneos (padrão: WHATSAPP_DISPATCH_WORKERS)')
+    def whatsapp_dispatcher(rate, workers):
+        """Enviar as mensagens da fila de saída do WhatsApp"""
+        WhatsAppDispatcher(app, rate=rate, workers=workers).run_forever()
+
+    @app.cli.command('ocr-cache-invalidate')
+    @click.option('--all', 'remove_all', is_flag=True, help='Apagar todo o cache, inclusive da configuração atual')
+    def ocr_cache_invalidate(remove_all):
+        """Apagar resultados de OCR em cache gerados com outra configuração"""
+        keep = None if remove_all else OCRService().cache_fingerprint()
+        removed = ocr_cache.invalidate(keep_config_key=keep)
+        click.echo(f'{removed} entradas removidas do cache de OCR')
+
+    @app.cli.command('backfill-phones')
+    @click.option('--batch-size', type=int, default=1000, help='Cirurgias atualizadas por transação')
+    def backfill_phones(batch_size):
+        """Criar a coluna/índices de telefone normalizado e preencher cirurgias existentes"""
+        # db.create_all() não altera tabelas que já existem
+        columns = {column['name'] for column in inspect(db.engine).get_columns(Surgery.__tablename__)}
+        if 'patient_phone_normalized' not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(text('ALTER TABLE surgeries ADD COLUMN patient_phone_normalized VARCHAR(20)'))
+        for index in Surgery.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+        updated = 0
+        last_id = 0
+        while True:
+            surgeries = Surgery.query.filter(Surgery.id > last_id).order_by(Surgery.id).limit(batch_size).all()
+            if not surgeries:
+                break
+            for surgery in surgeries:
+                normalized = normalize_phone(surgery.patient_phone)
+                if surgery.patient_phone_normalized != normalized:
+                    surgery.patient_phone_normalized = normalized
+                    updated += 1
+            last_id = surgeries[-1].id
+            db.session.commit()
+        click.echo(f'{updated} cirurgias com telefone normalizado')
+
+    @app.cli.command('dashboard-rebuild')
+    def dashboard_rebuild():
+        """Recalcular os contadores do dashboard a partir das cirurgias"""
+        keys = DashboardCounter.rebuild()
+        click.echo(f'{keys} contadores do dashboard recalculados')
+
+    @app.cli.command('report-generate')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Início do período (inclusivo)')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Fim do período (exclusivo)')
+    @click.option('--type', 'report_type', default='monthly', help='Tipo do relatório (monthly, weekly, ...)')
+    @click.option('--force', is_flag=True, help='Recalcular todos os dias, mesmo sem alterações')
+    def report_generate(start, end, report_type, force):
+        """Gerar (ou atualizar só os dias alterados) o relatório do período"""
+        title = f"Relatório de cirurgias {start:%d/%m/%Y} a {end:%d/%m/%Y}"
+        report, status = ReportBuilder.from_config(get_ai_service(), app.config).get_or_build(
+            report_type, title, period_start=start, period_end=end, force=force)
+        db.session.commit()
+        if status == 'cached':
+            click.echo(f'Relatório {report.id} sem alterações desde a última geração')
+            return
+        usage = report.data['llm_usage']
+        click.echo(f"Relatório {report.id} {status} ({usage['calls']} chamadas ao LLM, {usage['total_tokens']} tokens)")
+
+    @app.cli.command('asana-sync')
+    @click.option('--limit', type=int, default=None, help='Máximo de cirurgias nesta execução')
+    @click.option('--concurrency', type=int, default=None, help='Lotes simultâneos (padrão: ASANA_SYNC_CONCURRENCY)')
+    def asana_sync(limit, concurrency):
+        """Criar tarefas no Asana para as cirurgias que ainda não têm (retomável)"""
+        try:
+            result = sync_missing_tasks(limit=limit, concurrency=concurrency)
+        except SyncAlreadyRunning as e:
+            raise click.ClickException(str(e))
+        for surgery_id, error in sorted(result['errors'].items()):
+            click.echo(f'Cirurgia {surgery_id}: {error}')
+        click.echo(f"{result['created']} tarefas criadas, {result['failed']} falhas, {result['remaining']} cirurgias sem tarefa")
+        if result.get('retry_after') is not None:
+            click.echo(f"Limite de requisições do Asana atingido: sincronização reagendada para daqui a {result['retry_after']:g}s")
+
+    @app.cli.command('asana-webhook-reset')
+    def asana_webhook_reset():
+        """Apagar o segredo do webhook do Asana (antes de registrar um novo webhook)"""
+        removed = WebhookSecret.query.filter_by(provider='asana').delete()
+        db.session.commit()
+        click.echo('Segredo do webhook do Asana removido' if removed else 'Nenhum segredo registrado')
+
+    @app.cli.command('blobs-migrate')
+    @click.option('--batch-size', type=int, default=200, help='Documentos migrados por transação')
+    @click.option('--remove-originals', is_flag=True, help='Apagar os arquivos antigos depois de copiados')
+    def blobs_migrate(batch_size, remove_originals):
+        """Criar a coluna content_hash e copiar os arquivos dos documentos antigos para o blob store"""
+        # db.create_all() não altera tabelas que já existem
+        columns = {column['name'] for column in inspect(db.engine).get_columns(Document.__tablename__)}
+        if 'content_hash' not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(text('ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)'))
+        for index in Document.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+        store = BlobStore.from_config(app.config)
+        migrated, missing = 0, 0
+        last_id = 0
+        while True:
+            documents = Document.query.filter(Document.id > last_id, Document.content_hash.is_(None)) \
+                .order_by(Document.id).limit(batch_size).all()
+            if not documents:
+                break
+            originals = set()
+            for document in documents:
+                if not os.path.isfile(document.file_path):
+                    missing += 1
+                    continue
+                sha256, size, path = store.write_file(document.file_path)
+                originals.add(document.file_path)
+                document.file_path, document.file_size, document.content_hash = path, size, sha256
+                migrated += 1
+            last_id = documents[-1].id
+            db.session.commit()
+
+            if remove_originals:
+                for original in originals:
+                    # Outro documento ainda não migrado pode apontar para o mesmo arquivo
+                    if not Document.query.filter_by(file_path=original).first():
+                        os.remove(original)
+        click.echo(f'{migrated} documentos migrados para o blob store, {missing} com arquivo ausente')
+
+    @app.cli.command('blobs-gc')
+    @click.option('--grace-seconds', type=int, default=None, help='Idade mínima do blob (padrão: BLOB_GC_GRACE_SECONDS)')
+    def blobs_gc(grace_seconds):
+        """Remover do disco os blobs que nenhum documento referencia"""
+        if grace_seconds is None:
+            grace_seconds = app.config['BLOB_GC_GRACE_SECONDS']
+        store = BlobStore.from_config(app.config)
+        removed, freed = store.collect_garbage(Document.referenced_hashes(), grace_seconds)
+        count, total = store.usage()
+        click.echo(f'{removed} blobs removidos ({freed} bytes); {count} blobs ocupam {total} bytes')
+
+    @app.cli.command('search-reindex')
+    @click.option('--batch-size', type=int, default=500, help='Linhas lidas por consulta')
+    def search_reindex(batch_size):
+        """Reconstruir o índice de busca textual (cirurgias e OCR dos documentos)"""
+        surgeries, documents = reindex(batch_size=batch_size)
+        click.echo(f'{surgeries} cirurgias e {documents} documentos indexados')
+
+    @app.cli.command('conversations-purge')
+    def conversations_purge():
+        """Apagar as sessões de conversa expiradas (backend 'database')"""
+        removed = get_session_store().purge_expired()
+        click.echo(f'{removed} sessões de conversa expiradas removidas')
+
+    @app.cli.command('static-precompress')
+    @click.option('--min-size', type=int, default=1024, help='Arquivos menores que isso (bytes) não são comprimidos')
+    @click.option('--force', is_flag=True, help='Regerar também as variantes já atualizadas')
+    def static_precompress(min_size, force):
+        """Gerar as variantes .gz/.br da pasta static (rodar após o build do frontend)"""
+        written = precompress(app.static_folder, min_size=min_size, force=force)
+        click.echo(f'{written} variantes comprimidas geradas em {app.static_folder}')
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
         return "Static folder not configured", 404
 
+    manifest = current_app.extensions.get('static_manifest')
+    if manifest is not None:
+        # Sem acesso ao disco: caminho desconhecido cai no index.html da SPA
+        asset = manifest.get(path) or manifest.index
+        if asset is None:
+            return "index.html not found", 404
+        return manifest.response(asset, request)
+
     if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
         return send_from_directory(static_folder_path, path)
     else:
@@ -53,5 +332,9 @@ def serve(path):
         else:
             return "index.html not found", 404
 
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    init_database(app)
+    start_background_workers(app)
+    app.run(host='0.0.0.0', port=5000, debug=True)
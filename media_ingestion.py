@@ -0,0 +1,191 @@
+import mimetypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from src.models.user import db
+from src.models.surgery import Surgery
+from src.models.document import Document
+from src.services.blob_store import BlobStore, BlobTooLarge
+from src.services.http_client import get_client
+from src.services.job_queue import enqueue_many, process_available_jobs, register_handler
+from src.services.lifecycle import after_fork
+from src.services.metrics import record_error
+from src.services.ocr_service import OCRService, UnsupportedFileType
+
+# Tipos aceitos pelo OCR -> extensão do arquivo gravado
+MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+    'application/pdf': '.pdf',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+class MediaTooLarge(Exception):
+    """Mídia maior que WHATSAPP_MEDIA_MAX_BYTES"""
+
+# Limites por processo: downloads simultâneos (rede/disco) e OCRs simultâneos (CPU/memória)
+_limits = {}
+_limits_lock = threading.Lock()
+
+def _limit(name, size):
+    with _limits_lock:
+        if name not in _limits:
+            _limits[name] = threading.BoundedSemaphore(max(1, size))
+        return _limits[name]
+
+def media_extension(mime_type, filename=None):
+    """Extensão do arquivo a partir do mime type (ou do nome original)"""
+    mime_type = (mime_type or '').split(';')[0].strip().lower()
+    if mime_type in MIME_EXTENSIONS:
+        return MIME_EXTENSIONS[mime_type]
+    if filename and os.path.splitext(filename)[1]:
+        return os.path.splitext(filename)[1].lower()
+    return mimetypes.guess_extension(mime_type) or ''
+
+def download_media(media_id, store, max_bytes):
+    """Baixar a mídia do WhatsApp para o blob store em blocos
+
+    O SHA-256 e o tamanho são calculados durante a cópia, sem manter o arquivo em
+    memória; reenvios do mesmo arquivo reaproveitam o blob que já está em disco.
+    Retorna um dict com path, sha256, size e mime_type.
+    """
+    client = get_client('whatsapp')
+    response = client.get(f'/{media_id}')
+    if response.status_code != 200:
+        raise RuntimeError(f'Falha ao obter a mídia {media_id}: HTTP {response.status_code}')
+    media = response.json()
+    if media.get('file_size') and int(media['file_size']) > max_bytes:
+        raise MediaTooLarge(f"{media['file_size']} bytes")
+
+    mime_type = media.get('mime_type') or 'application/octet-stream'
+    download = client.get(media['url'], stream=True)
+    try:
+        if download.status_code != 200:
+            raise RuntimeError(f'Falha ao baixar a mídia {media_id}: HTTP {download.status_code}')
+        sha256, size, path = store.write_chunks(
+            download.iter_content(chunk_size=CHUNK_SIZE), media_extension(mime_type), max_bytes)
+    except BlobTooLarge as e:
+        raise MediaTooLarge(str(e))
+    finally:
+        download.close()
+
+    # Um blob com hash divergente fica sem referência e é removido pelo `flask blobs-gc`
+    if media.get('sha256') and media['sha256'] != sha256:
+        raise RuntimeError(f'Hash da mídia {media_id} não confere')
+    return {'path': path, 'sha256': sha256, 'size': size, 'mime_type': mime_type}
+
+def ingest_media(phone_number, media):
+    """Baixar a mídia, criar o Document na cirurgia mais recente do paciente e enfileirar o OCR
+
+    O OCR nunca roda aqui: vai sempre para a fila document_ocr. O mesmo arquivo
+    reenviado para a mesma cirurgia (ou uma retentativa do job) reaproveita o
+    Document; o Document novo e o job de OCR são gravados no mesmo commit.
+    Retorna o Document ou None se o telefone não tem cirurgia cadastrada.
+    """
+    surgery = Surgery.latest_for_phone(phone_number)
+    if surgery is None:
+        print(f"Media {media['id']}: nenhuma cirurgia para o telefone {phone_number}")
+        return None
+
+    config = current_app.config
+    with _limit('download', config.get('WHATSAPP_MEDIA_MAX_DOWNLOADS', 4)):
+        stored = download_media(media['id'], BlobStore.from_config(config),
+                                config.get('WHATSAPP_MEDIA_MAX_BYTES', 25 * 1024 * 1024))
+
+    document = Document.query.filter_by(surgery_id=surgery.id, content_hash=stored['sha256']).first()
+    if document is None:
+        document = Document(
+            surgery_id=surgery.id,
+            document_type='other',  # Definido pela classificação do OCR
+            file_name=media.get('filename') or os.path.basename(stored['path']),
+            file_path=stored['path'],
+            content_hash=stored['sha256'],
+            file_size=stored['size'],
+            mime_type=stored['mime_type'],
+            is_processed=False
+        )
+        db.session.add(document)
+        db.session.flush()
+
+    if not document.is_processed:
+        enqueue_many('document_ocr', [(f'document_ocr:{document.id}', {'document_id': document.id})])
+    db.session.commit()
+    return document
+
+def process_document_ocr(document):
+    """Fazer o OCR do Document e gravar o resultado (tipo de arquivo sem OCR não gera nova tentativa)"""
+    with _limit('ocr', current_app.config.get('OCR_MAX_CONCURRENT_JOBS', 2)):
+        try:
+            OCRService().process_document(document)
+        except UnsupportedFileType as e:
+            print(f"Document {document.id}: tipo de arquivo sem suporte a OCR ({str(e)})")
+            document.is_processed = True
+            document.validation_notes = 'Tipo de arquivo não suportado para OCR'
+    db.session.commit()
+
+# Modo 'sync' sem workers da fila: os jobs de OCR rodam em threads do próprio processo, fora da requisição
+_ocr_executor = None
+_ocr_pending = 0
+_ocr_lock = threading.Lock()
+
+def start_background_ocr(app):
+    """Drenar a fila document_ocr numa thread do processo (até OCR_MAX_CONCURRENT_JOBS threads)
+
+    No máximo uma drenagem fica esperando vaga no executor; ela já vai encontrar
+    os jobs gravados antes de começar, então pedidos extras são descartados.
+    Retentativas agendadas rodam na próxima drenagem.
+    """
+    global _ocr_executor, _ocr_pending
+    with _ocr_lock:
+        if _ocr_pending:
+            return
+        if _ocr_executor is None:
+            _ocr_executor = ThreadPoolExecutor(max_workers=max(1, app.config.get('OCR_MAX_CONCURRENT_JOBS', 2)),
+                                               thread_name_prefix='background-ocr')
+        _ocr_pending += 1
+        _ocr_executor.submit(_drain_ocr_jobs, app)
+
+def _drain_ocr_jobs(app):
+    global _ocr_pending
+    with _ocr_lock:
+        _ocr_pending -= 1
+    with app.app_context():
+        try:
+            while process_available_jobs(['document_ocr']):
+                pass
+        except Exception as e:
+            print(f"Background OCR error: {str(e)}")
+            record_error('media_ingestion', 'background_ocr')
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+@after_fork
+def _discard_inherited_executor():
+    """As threads do executor não existem no filho"""
+    global _ocr_executor, _ocr_pending, _ocr_lock
+    _ocr_executor = None
+    _ocr_pending = 0
+    _ocr_lock = threading.Lock()
+
+def handle_media_job(payload):
+    """Ingerir a mídia recebida pelo WhatsApp (falhas transitórias geram nova tentativa)"""
+    try:
+        ingest_media(payload['phone_number'], payload['media'])
+    except MediaTooLarge as e:
+        # Não adianta tentar de novo
+        print(f"Media {payload['media'].get('id')} too large: {str(e)}")
+
+def handle_ocr_job(payload):
+    """Fazer o OCR de um Document já gravado em disco"""
+    document = db.session.get(Document, payload['document_id'])
+    if document is None or document.is_processed:
+        return
+    process_document_ocr(document)
+
+register_handler('whatsapp_media', handle_media_job)
+register_handler('document_ocr', handle_ocr_job)
@@ -0,0 +1,115 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Com PROMETHEUS_MULTIPROC_DIR (definido no gunicorn.conf.py), cada processo grava os valores
+# em arquivos nesse diretório e o /metrics de qualquer worker soma todos os processos
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Duração das requisições HTTP',
+    ['blueprint', 'endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Consultas SQL executadas por requisição',
+    ['blueprint', 'endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+)
+INTEGRATION_LATENCY = Histogram(
+    'integration_request_duration_seconds', 'Duração de cada chamada a integrações externas (por tentativa)',
+    ['integration', 'method', 'outcome'],  # outcome: status HTTP, 'ok' ou nome da exceção
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+OCR_PAGE_SECONDS = Histogram(
+    'ocr_page_duration_seconds', 'Tempo de OCR por página',
+    ['method'],  # image, pdf, remote
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+QUEUE_JOB_SECONDS = Histogram(
+    'queue_job_duration_seconds', 'Duração de cada job da fila em segundo plano',
+    ['queue', 'outcome'],  # outcome: done ou error
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Consultas aos caches (taxa de acerto = hit / total)',
+    ['cache', 'result']
+)
+ERRORS = Counter('app_errors_total', 'Erros tratados (os mesmos que são impressos no log)', ['component', 'operation'])
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def record_error(component, operation):
+    ERRORS.labels(component, operation).inc()
+
+def observe_integration(integration, method, outcome, seconds):
+    INTEGRATION_LATENCY.labels(integration, method, str(outcome)).observe(seconds)
+
+@contextmanager
+def integration_timer(integration, method):
+    """Medir uma chamada a um SDK externo (ex.: OpenAI); a exceção, se houver, vira o outcome"""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        observe_integration(integration, method, outcome, time.perf_counter() - started)
+
+def observe_job(queue, outcome, seconds):
+    QUEUE_JOB_SECONDS.labels(queue, outcome).observe(seconds)
+
+def observe_ocr_page(method, seconds):
+    OCR_PAGE_SECONDS.labels(method).observe(seconds)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # Só as consultas da thread da requisição; workers da fila e dispatchers não têm request context
+    if has_request_context():
+        g._metrics_queries = g.get('_metrics_queries', 0) + 1
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_queries = 0
+
+def _record_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    blueprint = request.blueprint or 'app'
+    # Regra da rota (ex.: /api/documents/<int:document_id>/file), não a URL: cardinalidade limitada
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_LATENCY.labels(blueprint, endpoint, request.method, str(response.status_code)) \
+        .observe(time.perf_counter() - started)
+    REQUEST_DB_QUERIES.labels(blueprint, endpoint).observe(g.pop('_metrics_queries', 0))
+    return response
+
+def metrics_view():
+    """Métricas no formato texto do Prometheus"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized', status=401)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(app):
+    """Registrar a medição das requisições e a rota /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+from src.models.ocr_cache_entry import OCRCacheEntry
+from src.services.metrics import record_cache
+
+# O limite de tamanho exige somar a tabela inteira: aplicado no máximo uma vez por intervalo por processo
+_next_evict = 0.0
+_evict_lock = threading.Lock()
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Calcular o SHA-256 do arquivo lendo em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _insert_ignore(values):
+    """INSERT que ignora conflito na chave (content_hash, config_key)
+
+    Dois workers podem processar o mesmo arquivo ao mesmo tempo; um IntegrityError
+    aqui desfaria também as alterações pendentes do Document na mesma sessão.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(OCRCacheEntry).values(**values).on_conflict_do_nothing(
+            index_elements=['content_hash', 'config_key'])
+    if dialect == 'sqlite':
+        return sqlite.insert(OCRCacheEntry).values(**values).on_conflict_do_nothing(
+            index_elements=['content_hash', 'config_key'])
+    return None
+
+def lookup(content_hash, config_key):
+    """Buscar resultado em cache; retorna (ocr_text, document_type) ou None"""
+    entry = db.session.execute(
+        select(OCRCacheEntry.id, OCRCacheEntry.ocr_text, OCRCacheEntry.document_type)
+        .where(OCRCacheEntry.content_hash == content_hash, OCRCacheEntry.config_key == config_key)
+    ).first()
+    record_cache('ocr', entry is not None)
+    if entry is None:
+        return None
+
+    db.session.execute(
+        update(OCRCacheEntry)
+        .where(OCRCacheEntry.id == entry.id)
+        .values(hits=OCRCacheEntry.hits + 1, last_used_at=datetime.utcnow())
+    )
+    return entry.ocr_text, entry.document_type
+
+def store(content_hash, config_key, ocr_text, document_type, file_size):
+    """Gravar resultado do OCR na sessão atual e aplicar o limite de tamanho do cache (a cada OCR_CACHE_EVICT_INTERVAL)"""
+    now = datetime.utcnow()
+    values = {
+        'content_hash': content_hash,
+        'config_key': config_key,
+        'ocr_text': ocr_text,
+        'document_type': document_type,
+        'file_size': file_size,
+        'text_size': len(ocr_text.encode('utf-8')),
+        'hits': 0,
+        'created_at': now,
+        'last_used_at': now
+    }
+
+    statement = _insert_ignore(values)
+    if statement is not None:
+        db.session.execute(statement)
+    elif lookup(content_hash, config_key) is None:
+        db.session.add(OCRCacheEntry(**values))
+        db.session.flush()
+
+    if _evict_due(current_app.config.get('OCR_CACHE_EVICT_INTERVAL', 300)):
+        evict(current_app.config.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+def _evict_due(interval):
+    global _next_evict
+    now = time.monotonic()
+    with _evict_lock:
+        if now < _next_evict:
+            return False
+        _next_evict = now + interval
+        return True
+
+def evict(max_bytes, batch_size=100):
+    """Remover as entradas menos usadas até o cache caber em `max_bytes`"""
+    total = db.session.execute(select(func.coalesce(func.sum(OCRCacheEntry.text_size), 0))).scalar()
+
+    while total > max_bytes:
+        oldest = db.session.execute(
+            select(OCRCacheEntry.id, OCRCacheEntry.text_size)
+            .order_by(OCRCacheEntry.last_used_at)
+            .limit(batch_size)
+        ).all()
+        if not oldest:
+            break
+
+        ids = []
+        for entry_id, text_size in oldest:
+            ids.append(entry_id)
+            total -= text_size
+            if total <= max_bytes:
+                break
+
+        db.session.execute(delete(OCRCacheEntry).where(OCRCacheEntry.id.in_(ids)))
+
+def invalidate(keep_config_key=None):
+    """Apagar entradas de outras configurações de OCR (ou todas, se nenhuma for mantida)"""
+    statement = delete(OCRCacheEntry)
+    if keep_config_key:
+        statement = statement.where(OCRCacheEntry.config_key != keep_config_key)
+    removed = db.session.execute(statement).rowcount
+    db.session.commit()
+    return removed
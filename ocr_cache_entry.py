@@ -0,0 +1,32 @@
+from datetime import datetime
+from src.models.user import db
+
+class OCRCacheEntry(db.Model):
+    __tablename__ = 'ocr_cache_entries'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'config_key', name='uq_ocr_cache_content_config'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 do arquivo
+    config_key = db.Column(db.String(64), nullable=False, index=True)  # Impressão digital da configuração do OCR
+    ocr_text = db.Column(db.Text, nullable=False)
+    document_type = db.Column(db.String(50), nullable=False)  # Resultado de classify_document
+    file_size = db.Column(db.Integer, nullable=False)
+    text_size = db.Column(db.Integer, nullable=False)  # Usado no limite de tamanho do cache
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content_hash': self.content_hash,
+            'config_key': self.config_key,
+            'document_type': self.document_type,
+            'file_size': self.file_size,
+            'text_size': self.text_size,
+            'hits': self.hits,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
@@ -1,66 +1,271 @@
+import hashlib
 import os
-import requests
-from PIL import Image
-import pytesseract
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from flask import current_app, has_app_context
+from src.services.http_client import get_client
+from src.services.lifecycle import after_fork
+from src.services.metrics import observe_ocr_page
+from src.services import ocr_cache
+from src.services.ocr_cache import file_sha256
+from src.services.document_classifier import get_document_classifier
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+
+# Incrementar quando a lógica de extração/classificação mudar, para invalidar o cache de OCR
+OCR_CACHE_VERSION = '5'
+
+class UnsupportedFileType(Exception):
+    """Extensão de arquivo sem suporte a OCR"""
+
+class IncompleteOCR(Exception):
+    """Páginas do PDF falharam; `text` tem o texto das páginas que deram certo"""
+
+    def __init__(self, text, failed_pages):
+        super().__init__(f"OCR incompleto: página(s) {', '.join(str(page) for page in failed_pages)} falharam")
+        self.text = text
+        self.failed_pages = failed_pages
+
+def ocr_settings():
+    """Config do app; fora de um contexto de aplicação (benchmarks, scripts), as variáveis de ambiente"""
+    return current_app.config if has_app_context() else os.environ
+
+def _init_pdf_worker():
+    """Cada processo roda um Tesseract por vez; evita disputa de threads OpenMP entre processos"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _ocr_pdf_page(pdf_path, page_number, tesseract_config, lang, dpi, timeout):
+    """Rasterizar e fazer OCR de uma única página do PDF (executado no pool de processos)
+
+    Retorna (texto, segundos); o tempo é registrado na métrica pelo processo que submeteu a página.
+    """
+    from pdf2image import convert_from_path
+    import pytesseract
+    
+    started = time.perf_counter()
+    pages = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number, timeout=timeout)
+    if not pages:
+        return '', time.perf_counter() - started
+    try:
+        text = pytesseract.image_to_string(pages[0], config=tesseract_config, lang=lang, timeout=timeout).strip()
+        return text, time.perf_counter() - started
+    finally:
+        pages[0].close()
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool(max_workers):
+    """Pool de processos compartilhado para OCR de páginas de PDF"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_pdf_worker)
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    """Encerrar o pool de processos (ex.: ao reciclar o worker)"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+@after_fork
+def _discard_inherited_pool():
+    """Os processos do pool pertencem ao processo pai; o filho cria o seu no primeiro PDF"""
+    global _pdf_pool, _pdf_pool_lock
+    _pdf_pool = None
+    _pdf_pool_lock = threading.Lock()
 
 class OCRService:
-    def __init__(self):
+    def __init__(self, pdf_processes=None, page_timeout=None, max_pages=None, pdf_dpi=None, preprocessor=None):
+        # NumPy/PIL só carregam quando um OCR é de fato criado (ex.: no worker da fila)
+        from src.services.image_preprocessing import ImagePreprocessor
+        
         self.tesseract_config = '--oem 3 --psm 6'
+        # Pré-processamento das fotos (None = imagem original vai direto para o Tesseract)
+        self.preprocessor = preprocessor if preprocessor is not None else ImagePreprocessor.from_config(ocr_settings())
+        self.lang = 'por'
+        settings = ocr_settings()
+        self.pdf_processes = pdf_processes or int(settings.get('OCR_PDF_PROCESSES', 0)) or os.cpu_count() or 1
+        self.page_timeout = page_timeout or int(settings.get('OCR_PAGE_TIMEOUT', 60))
+        self.max_pages = max_pages or int(settings.get('OCR_PDF_MAX_PAGES', 20))
+        self.pdf_dpi = pdf_dpi or int(settings.get('OCR_PDF_DPI', 200))
     
     def extract_text(self, file_path):
         """Extrair texto de uma imagem ou PDF usando OCR"""
         try:
-            file_extension = os.path.splitext(file_path)[1].lower()
-            
-            if file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                return self._extract_from_image(file_path)
-            elif file_extension == '.pdf':
-                return self._extract_from_pdf(file_path)
-            else:
-                return "Tipo de arquivo não suportado para OCR"
-        
+            return self._extract(file_path)
+        except IncompleteOCR as e:
+            return e.text
+        except UnsupportedFileType:
+            return "Tipo de arquivo não suportado para OCR"
         except Exception as e:
             return f"Erro ao processar OCR: {str(e)}"
     
+    def _extract(self, file_path):
+        """Extrair texto conforme a extensão (levanta exceção em caso de falha)"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        if self._provider() == 'remote' and file_extension in IMAGE_EXTENSIONS + ['.pdf']:
+            return self._extract_remote(file_path)
+        
+        if file_extension in IMAGE_EXTENSIONS:
+            return self._extract_from_image(file_path)
+        elif file_extension == '.pdf':
+            return self._extract_from_pdf(file_path)
+        else:
+            raise UnsupportedFileType(file_extension)
+    
+    def _provider(self):
+        return ocr_settings().get('OCR_PROVIDER', 'tesseract')
+    
+    def cache_fingerprint(self):
+        """Impressão digital da configuração do OCR: muda quando o resultado pode mudar"""
+        parts = [OCR_CACHE_VERSION, self._provider(), self.tesseract_config, self.lang, str(self.pdf_dpi), str(self.max_pages),
+                 self.preprocessor.fingerprint() if self.preprocessor else 'pre:none']
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+    
+    def process_document(self, document):
+        """Preencher ocr_text/is_processed do Document, reaproveitando o cache por conteúdo do arquivo
+
+        Retorna o tipo de documento classificado. O cache é gravado na sessão atual
+        (quem chama faz o commit); falhas de OCR não são gravadas. Um PDF com páginas
+        que falharam fica com o texto parcial e a falha em validation_notes, fora do
+        cache, para que um novo processamento tente de novo.
+        """
+        # Blobs já têm o SHA-256 gravado no Document: não é preciso reler o arquivo
+        content_hash = document.content_hash or file_sha256(document.file_path)
+        config_key = self.cache_fingerprint()
+        
+        cached = ocr_cache.lookup(content_hash, config_key)
+        if cached:
+            ocr_text, document_type = cached
+        else:
+            complete = True
+            try:
+                ocr_text = self._extract(document.file_path)
+            except IncompleteOCR as e:
+                print(f"Document {document.id}: {str(e)}")
+                ocr_text = e.text
+                document.validation_notes = str(e)
+                complete = False
+            document_type = self.classify_document(ocr_text)
+            if complete:
+                ocr_cache.store(content_hash, config_key, ocr_text, document_type, os.path.getsize(document.file_path))
+        
+        document.ocr_text = ocr_text
+        document.is_processed = True
+        if not document.document_type or document.document_type == 'other':
+            document.document_type = document_type
+        return document_type
+    
     def _extract_from_image(self, image_path):
         """Extrair texto de uma imagem"""
+        from PIL import Image
+        import pytesseract
+        
         try:
             image = Image.open(image_path)
-            text = pytesseract.image_to_string(image, config=self.tesseract_config, lang='por')
+            started = time.perf_counter()
+            if self.preprocessor:
+                image = self.preprocessor.process(image)
+            text = pytesseract.image_to_string(image, config=self.tesseract_config, lang=self.lang)
+            observe_ocr_page('image', time.perf_counter() - started)
             return text.strip()
         except Exception as e:
             raise Exception(f"Erro ao processar imagem: {str(e)}")
     
-    def _extract_from_pdf(self, pdf_path):
-        """Extrair texto de um PDF (primeira página)"""
+    def _extract_remote(self, file_path):
+        """Extrair texto usando a API de OCR externa (OCR_API_URL, formato OCR.space)"""
         try:
-            # Para PDFs, seria necessário converter para imagem primeiro
-            # Aqui é uma implementação simplificada
-            from pdf2image import convert_from_path
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            
+            # Conteúdo em memória para que as retentativas possam reenviar o arquivo
+            started = time.perf_counter()
+            response = get_client('ocr').post(
+                '',
+                files={'file': (os.path.basename(file_path), content)},
+                data={'language': 'por', 'OCREngine': '2'},
+                retry=True
+            )
+            result = response.json()
+            
+            if response.status_code != 200 or result.get('IsErroredOnProcessing'):
+                raise Exception(result.get('ErrorMessage') or response.text)
             
-            pages = convert_from_path(pdf_path, first_page=1, last_page=1)
+            pages = result.get('ParsedResults', [])
             if pages:
-                text = pytesseract.image_to_string(pages[0], config=self.tesseract_config, lang='por')
-                return text.strip()
+                per_page = (time.perf_counter() - started) / len(pages)
+                for _ in pages:
+                    observe_ocr_page('remote', per_page)
+            return '\n'.join(page.get('ParsedText', '') for page in pages).strip()
+        except Exception as e:
+            raise Exception(f"Erro na API de OCR: {str(e)}")
+    
+    def _extract_from_pdf(self, pdf_path):
+        """Extrair texto de um PDF, página a página, em paralelo no pool de processos
+
+        A mesma regra vale com e sem o pool: se alguma página falhar, levanta
+        IncompleteOCR com o texto das demais; se todas falharem, o PDF falha.
+        """
+        try:
+            from pdf2image import pdfinfo_from_path
+            
+            page_count = min(int(pdfinfo_from_path(pdf_path)['Pages']), self.max_pages)
+            if page_count < 1:
+                raise Exception("Não foi possível converter o PDF")
+            
+            args = (self.tesseract_config, self.lang, self.pdf_dpi, self.page_timeout)
+            
+            # PDF de uma página: não vale o custo de enviar para outro processo
+            if page_count == 1 or self.pdf_processes == 1:
+                futures = None
+                pages = [(page, partial(_ocr_pdf_page, pdf_path, page, *args)) for page in range(1, page_count + 1)]
             else:
-                return "Não foi possível converter o PDF"
+                # Cada processo rasteriza só a sua página: o documento nunca fica inteiro em memória
+                pool = get_pdf_pool(self.pdf_processes)
+                futures = [pool.submit(_ocr_pdf_page, pdf_path, page, *args) for page in range(1, page_count + 1)]
+                # Margem sobre o timeout interno: rasterização + OCR + fila do pool
+                pages = [(page, partial(future.result, timeout=self.page_timeout * 2))
+                         for page, future in enumerate(futures, start=1)]
+            
+            texts = []
+            failed_pages = []
+            for page, result in pages:
+                try:
+                    text, seconds = result()
+                    observe_ocr_page('pdf', seconds)
+                    texts.append(text)
+                except FutureTimeoutError:
+                    if futures is not None:
+                        futures[page - 1].cancel()
+                    print(f"OCR timeout on page {page} of {pdf_path}")
+                    failed_pages.append(page)
+                except Exception as e:
+                    print(f"OCR error on page {page} of {pdf_path}: {str(e)}")
+                    failed_pages.append(page)
+            
+            if len(failed_pages) == page_count:
+                raise Exception(f"Nenhuma das {page_count} página(s) pôde ser lida")
+            text = '\n\n'.join(text for text in texts if text).strip()
+            if failed_pages:
+                raise IncompleteOCR(text, failed_pages)
+            return text
+        except IncompleteOCR:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao processar PDF: {str(e)}")
     
     def classify_document(self, ocr_text):
         """Classificar o tipo de documento baseado no texto OCR"""
-        text_lower = ocr_text.lower()
-        
-        if 'guia' in text_lower and ('cirurgia' in text_lower or 'procedimento' in text_lower):
-            return 'guide'
-        elif 'carteira nacional de habilitação' in text_lower or 'cnh' in text_lower:
-            return 'cnh'
-        elif 'relatório médico' in text_lower or 'laudo' in text_lower:
-            return 'medical_report'
-        elif 'carteirinha' in text_lower or 'plano de saúde' in text_lower:
-            return 'insurance_card'
-        elif 'prontuário' in text_lower:
-            return 'medical_record'
-        else:
-            return 'other'
-
+        document_type, _ = get_document_classifier().classify(ocr_text)
+        return document_type
+    
+    def classify_documents(self, ocr_texts):
+        """Classificar vários textos de OCR de uma vez; retorna [(tipo, confiança)]"""
+        return get_document_classifier().classify_many(ocr_texts)
@@ -0,0 +1,46 @@
+from datetime import datetime
+from src.models.user import db
+
+# Ordem dos status de entrega: um status só substitui outro mais antigo nesta sequência
+DELIVERY_STATUS_ORDER = {'queued': 0, 'sending': 1, 'sent': 2, 'delivered': 3, 'read': 4}
+
+class OutboundMessage(db.Model):
+    __tablename__ = 'outbound_messages'
+    __table_args__ = (
+        db.Index('ix_outbound_messages_claim', 'status', 'available_at'),
+        # Ordem FIFO por destinatário: a mensagem mais antiga pendente do telefone sai primeiro
+        db.Index('ix_outbound_messages_phone', 'phone', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(20), nullable=False)  # Só dígitos, no formato aceito pela Cloud API
+    payload = db.Column(db.JSON, nullable=False)  # {'type': 'text', 'text': {...}} ou {'type': 'template', 'template': {...}}
+    campaign = db.Column(db.String(100), nullable=True, index=True)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, sending, sent, delivered, read, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Próxima tentativa
+    locked_until = db.Column(db.DateTime, nullable=True)  # Fim do lease do dispatcher que está enviando
+    wa_message_id = db.Column(db.String(128), nullable=True, unique=True)  # ID retornado pela Cloud API (wamid)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    read_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'phone': self.phone,
+            'payload': self.payload,
+            'campaign': self.campaign,
+            'status': self.status,
+            'attempts': self.attempts,
+            'wa_message_id': self.wa_message_id,
+            'last_error': self.last_error,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+            'read_at': self.read_at.isoformat() if self.read_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
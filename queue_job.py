@@ -0,0 +1,37 @@
+from datetime import datetime
+from src.models.user import db
+
+class QueueJob(db.Model):
+    __tablename__ = 'queue_jobs'
+    __table_args__ = (
+        db.Index('ix_queue_jobs_claim', 'queue', 'status', 'available_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False)  # whatsapp_inbound, etc.
+    dedup_key = db.Column(db.String(255), nullable=True, unique=True)  # Ex.: ID da mensagem do WhatsApp
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Próxima tentativa
+    locked_until = db.Column(db.DateTime, nullable=True)  # Fim do lease do worker que reservou o job
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'queue': self.queue,
+            'dedup_key': self.dedup_key,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'locked_until': self.locked_until.isoformat() if self.locked_until else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,302 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, false, func, literal_column, or_, select
+from src.models.user import db
+from src.models.surgery import Surgery
+from src.models.report import Report
+
+# Dimensões agregadas no relatório: chave em Report.data -> (rótulo no prompt, coluna)
+DIMENSIONS = {
+    'by_status': ('Status', 'status'),
+    'by_insurance': ('Convênio', 'insurance_company'),
+    'by_hospital': ('Hospital', 'hospital_name'),
+    'by_type': ('Tipo de cirurgia', 'surgery_type'),
+    'by_amount_bucket': ('Faixa de reembolso', None),
+}
+
+# Limites superiores (R$) das faixas de valor de reembolso; acima do último vai para a faixa aberta
+AMOUNT_BUCKETS = (1000, 5000, 10000, 25000, 50000)
+
+def amount_bucket(amount):
+    """Rótulo da faixa de reembolso de um valor"""
+    lower = 0
+    for upper in AMOUNT_BUCKETS:
+        if (amount or 0.0) < upper:
+            return f'{lower}-{upper}'
+        lower = upper
+    return f'{lower}+'
+
+def _amount_bucket_column():
+    # Constantes literais (sem parâmetros): o PostgreSQL exige a mesma expressão no SELECT e no GROUP BY
+    whens = []
+    lower = 0
+    for upper in AMOUNT_BUCKETS:
+        whens.append((func.coalesce(Surgery.reimbursement_amount, 0.0) < literal_column(str(upper)),
+                      literal_column(f"'{lower}-{upper}'")))
+        lower = upper
+    return case(*whens, else_=literal_column(f"'{lower}+'"))
+
+def _group(key, count, total):
+    return {'key': key if key is not None else 'não informado', 'count': int(count), 'reimbursement_total': round(float(total or 0.0), 2)}
+
+def _sort_groups(groups):
+    return sorted(groups, key=lambda g: (-g['count'], str(g['key'])))
+
+def _totals(count, total):
+    return {
+        'count': int(count),
+        'reimbursement_total': round(float(total or 0.0), 2),
+        'reimbursement_avg': round(float(total or 0.0) / count, 2) if count else 0.0
+    }
+
+def _period_filters(period_start, period_end, days=None):
+    filters = []
+    if period_start:
+        filters.append(Surgery.surgery_date >= period_start)
+    if period_end:
+        filters.append(Surgery.surgery_date < period_end)
+    if days is not None:
+        # Intervalos de datas (e não date(surgery_date) IN ...) para usar o índice de surgery_date
+        starts = [datetime.fromisoformat(day) for day in days]
+        filters.append(or_(*[and_(Surgery.surgery_date >= day, Surgery.surgery_date < day + timedelta(days=1))
+                             for day in starts]) if starts else false())
+    return filters
+
+def _day_key(value):
+    return value.isoformat()[:10] if hasattr(value, 'isoformat') else str(value)[:10]
+
+def day_fingerprints(period_start=None, period_end=None):
+    """Quantidade de cirurgias e maior updated_at de cada dia do período"""
+    day = func.date(Surgery.surgery_date)
+    rows = db.session.execute(
+        select(day, func.count(Surgery.id), func.max(Surgery.updated_at))
+        .where(*_period_filters(period_start, period_end))
+        .group_by(day)
+    )
+    return {_day_key(value): (int(count), latest) for value, count, latest in rows}
+
+def aggregate_days(period_start=None, period_end=None, days=None):
+    """Agregados de cada dia do período no banco (GROUP BY dia), sem carregar as linhas
+
+    `days` (lista de 'AAAA-MM-DD') restringe o cálculo a esses dias.
+    """
+    filters = _period_filters(period_start, period_end, days)
+    day = func.date(Surgery.surgery_date)
+    amount = func.coalesce(func.sum(Surgery.reimbursement_amount), 0.0)
+
+    result = {}
+    for value, count, total in db.session.execute(select(day, func.count(Surgery.id), amount).where(*filters).group_by(day)):
+        result[_day_key(value)] = dict({name: [] for name in DIMENSIONS}, totals=_totals(count, total))
+
+    for name, (label, column_name) in DIMENSIONS.items():
+        column = getattr(Surgery, column_name) if column_name else _amount_bucket_column()
+        rows = db.session.execute(
+            select(day, column, func.count(Surgery.id), amount).where(*filters).group_by(day, column))
+        for value, key, count, total in rows:
+            result[_day_key(value)][name].append(_group(key, count, total))
+
+    for aggregates in result.values():
+        for name in DIMENSIONS:
+            aggregates[name] = _sort_groups(aggregates[name])
+    return result
+
+def merge_aggregates(day_aggregates, period_start=None, period_end=None):
+    """Somar agregados diários nos agregados do período"""
+    count, total = 0, 0.0
+    groups = {name: {} for name in DIMENSIONS}
+    for aggregates in day_aggregates.values():
+        count += aggregates['totals']['count']
+        total += aggregates['totals']['reimbursement_total']
+        for name in DIMENSIONS:
+            for group in aggregates[name]:
+                entry = groups[name].setdefault(group['key'], [0, 0.0])
+                entry[0] += group['count']
+                entry[1] += group['reimbursement_total']
+
+    merged = {
+        'period_start': period_start.isoformat() if period_start else None,
+        'period_end': period_end.isoformat() if period_end else None,
+        'totals': _totals(count, total)
+    }
+    for name, entries in groups.items():
+        merged[name] = _sort_groups(_group(key, c, t) for key, (c, t) in entries.items())
+    return merged
+
+def aggregate_period(period_start=None, period_end=None):
+    """Agregar as cirurgias do período no banco, sem carregar as linhas"""
+    return merge_aggregates(aggregate_days(period_start, period_end), period_start, period_end)
+
+def aggregate_rows(surgeries):
+    """Mesma agregação de aggregate_period para uma lista de cirurgias (dicts de to_dict)"""
+    groups = {name: {} for name in DIMENSIONS}
+    count, total = 0, 0.0
+    for surgery in surgeries:
+        amount = surgery.get('reimbursement_amount') or 0.0
+        count += 1
+        total += amount
+        for name, (label, column_name) in DIMENSIONS.items():
+            key = surgery.get(column_name) if column_name else amount_bucket(amount)
+            entry = groups[name].setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += amount
+
+    aggregates = {'period_start': None, 'period_end': None, 'totals': _totals(count, total)}
+    for name, entries in groups.items():
+        aggregates[name] = _sort_groups(_group(key, c, t) for key, (c, t) in entries.items())
+    return aggregates
+
+def render_overview(aggregates):
+    """Totais do período em texto compacto (contexto de todas as chamadas ao LLM)"""
+    totals = aggregates['totals']
+    period = ''
+    if aggregates.get('period_start') or aggregates.get('period_end'):
+        period = f"Período: {aggregates.get('period_start') or '...'} a {aggregates.get('period_end') or '...'}\n"
+    return (f"{period}Total de cirurgias: {totals['count']}\n"
+            f"Reembolso total: R$ {totals['reimbursement_total']:.2f}\n"
+            f"Reembolso médio: R$ {totals['reimbursement_avg']:.2f}")
+
+def render_chunks(aggregates, max_groups):
+    """Dividir os grupos em blocos de texto com no máximo `max_groups` linhas cada
+
+    Uma linha por grupo ("chave: quantidade | valor"), sem repetir nomes de campos:
+    o tamanho do prompt depende do número de grupos, não do número de cirurgias.
+    """
+    chunks, lines, size = [], [], 0
+    for name, (label, column_name) in DIMENSIONS.items():
+        groups = aggregates.get(name) or []
+        for start in range(0, len(groups), max_groups):
+            part = groups[start:start + max_groups]
+            if size and size + len(part) > max_groups:
+                chunks.append('\n'.join(lines))
+                lines, size = [], 0
+            lines.append(f'{label} (quantidade | reembolso R$):')
+            lines.extend(f"- {group['key']}: {group['count']} | {group['reimbursement_total']:.2f}" for group in part)
+            size += len(part)
+    if lines:
+        chunks.append('\n'.join(lines))
+    return chunks
+
+class ReportBuilder:
+    """Geração de relatórios: agrega localmente e resume com o LLM em map-reduce
+
+    Até `max_groups` grupos cabem numa única chamada. Acima disso, cada bloco de
+    grupos é resumido separadamente (em paralelo) e os resumos parciais são
+    combinados, `merge_fanout` por vez, até sobrar um resumo só.
+    """
+
+    def __init__(self, ai_service, max_groups=60, concurrency=4, merge_fanout=8):
+        self.ai_service = ai_service
+        self.max_groups = max_groups
+        self.concurrency = concurrency
+        self.merge_fanout = merge_fanout
+
+    @classmethod
+    def from_config(cls, ai_service, config):
+        """Criar com os limites das chaves REPORT_* do config"""
+        return cls(
+            ai_service,
+            max_groups=config.get('REPORT_CHUNK_GROUPS', 60),
+            concurrency=config.get('REPORT_SUMMARY_CONCURRENCY', 4)
+        )
+
+    def summarize(self, aggregates):
+        """Resumo executivo dos agregados; retorna (texto, uso de tokens)"""
+        overview = render_overview(aggregates)
+        chunks = render_chunks(aggregates, self.max_groups)
+        usage = {'calls': 0, 'total_tokens': 0}
+
+        def track(result):
+            text, tokens = result
+            usage['calls'] += 1
+            usage['total_tokens'] += tokens or 0
+            return text
+
+        if len(chunks) <= 1:
+            summary = track(self.ai_service.summarize_report_chunk(overview, chunks[0] if chunks else '', final=True))
+            return summary, usage
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+            partials = [track(result) for result in executor.map(
+                lambda chunk: self.ai_service.summarize_report_chunk(overview, chunk, final=False), chunks)]
+
+            while len(partials) > 1:
+                batches = [partials[i:i + self.merge_fanout] for i in range(0, len(partials), self.merge_fanout)]
+                final = len(batches) == 1
+                partials = [track(result) for result in executor.map(
+                    lambda batch: self.ai_service.merge_report_summaries(overview, batch, final=final), batches)]
+
+        return partials[0], usage
+
+    def _fill(self, report, days, started, previous=None):
+        """Gravar agregados, dias e resumo no relatório (o LLM só é chamado se os agregados mudaram)"""
+        aggregates = merge_aggregates(days, report.period_start, report.period_end)
+        unchanged = previous is not None and all(previous.get(key) == value for key, value in aggregates.items())
+
+        if unchanged:
+            summary, usage = report.content, {'calls': 0, 'total_tokens': 0}
+        else:
+            try:
+                summary, usage = self.summarize(aggregates)
+            except Exception as e:
+                # Sem o LLM o relatório ainda é útil: os agregados vão em data e os totais no conteúdo
+                print(f"Report summary error: {str(e)}")
+                summary, usage = render_overview(aggregates), {'calls': 0, 'total_tokens': 0, 'error': str(e)}
+
+        aggregates['days'] = days
+        aggregates['refreshed_at'] = started.isoformat()
+        aggregates['llm_usage'] = dict(usage, seconds=round((datetime.utcnow() - started).total_seconds(), 3))
+        report.content = summary
+        report.data = aggregates  # Novo dict: o SQLAlchemy não detecta mutações dentro do JSON
+
+    def build(self, report_type, title, period_start=None, period_end=None, generated_by='system'):
+        """Criar um Report do período (adicionado à sessão; o chamador faz o commit)"""
+        started = datetime.utcnow()
+        report = Report(
+            report_type=report_type,
+            title=title,
+            generated_by=generated_by,
+            period_start=period_start,
+            period_end=period_end
+        )
+        self._fill(report, aggregate_days(period_start, period_end), started)
+        db.session.add(report)
+        return report
+
+    def get_or_build(self, report_type, title, period_start=None, period_end=None, generated_by='system', force=False):
+        """Reaproveitar o relatório do período; retorna (report, 'cached' | 'refreshed' | 'created')
+
+        Se nenhuma cirurgia do período foi alterada desde a última atualização do
+        relatório, ele é devolvido como está. Senão, só os dias alterados são
+        reagregados e combinados com os agregados diários guardados em Report.data.
+        """
+        report = Report.query.filter_by(report_type=report_type, period_start=period_start, period_end=period_end) \
+            .order_by(Report.id.desc()).first()
+        if report is None:
+            return self.build(report_type, title, period_start, period_end, generated_by), 'created'
+
+        started = datetime.utcnow()
+        if force or 'days' not in (report.data or {}):
+            self._fill(report, aggregate_days(period_start, period_end), started, previous=report.data)
+            return report, 'refreshed'
+
+        data = report.data
+        refreshed_at = datetime.fromisoformat(data['refreshed_at']) if data.get('refreshed_at') else report.created_at
+        days = dict(data.get('days') or {})
+
+        # Caminho rápido: uma consulta (índice em surgery_date, updated_at) decide se algo mudou
+        count, latest = db.session.execute(
+            select(func.count(Surgery.id), func.max(Surgery.updated_at)).where(*_period_filters(period_start, period_end))
+        ).one()
+        if count == data['totals']['count'] and (latest is None or latest <= refreshed_at):
+            return report, 'cached'
+
+        fingerprints = day_fingerprints(period_start, period_end)
+        changed = [day for day, (day_count, day_latest) in fingerprints.items()
+                   if day not in days or days[day]['totals']['count'] != day_count
+                   or (day_latest is not None and day_latest > refreshed_at)]
+        for day in days.keys() - fingerprints.keys():
+            del days[day]  # Dia sem cirurgias agora (removidas ou movidas para outra data)
+
+        days.update(aggregate_days(period_start, period_end, days=changed))
+        self._fill(report, dict(sorted(days.items())), started, previous=data)
+        return report, 'refreshed'
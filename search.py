@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from src.services.search_index import search
+
+search_bp = Blueprint('search', __name__)
+
+SEARCH_KINDS = ('surgery', 'document')
+MAX_SEARCH_PER_PAGE = 100
+
+@search_bp.route('/search', methods=['GET'])
+def search_records():
+    """Busca textual em cirurgias (paciente, CPF, médico, hospital, convênio) e no OCR dos documentos"""
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+
+        kind = request.args.get('type') or None
+        if kind is not None and kind not in SEARCH_KINDS:
+            return jsonify({'error': f"type deve ser um de: {', '.join(SEARCH_KINDS)}"}), 400
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_SEARCH_PER_PAGE)
+        return jsonify(search(query, kind=kind, page=page, per_page=per_page)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
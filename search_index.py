@@ -0,0 +1,322 @@
+import re
+import unicodedata
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, attributes
+from src.models.user import db
+from src.models.surgery import Surgery
+from src.models.document import Document
+
+# Campos indexados; alterar qualquer um deles reindexa a linha no mesmo flush
+SURGERY_FIELDS = ('patient_name', 'patient_cpf', 'doctor_name', 'hospital_name', 'insurance_company', 'surgery_type')
+DOCUMENT_FIELDS = ('ocr_text', 'file_name', 'document_type', 'surgery_id')
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+CPF_PATTERN = re.compile(r'(?<!\d)(\d{3})\.(\d{3})\.(\d{3})-(\d{2})(?!\d)')
+
+# Plurais e sufixos mais comuns em português (após remover acentos); o mais longo primeiro
+SUFFIXES = (
+    ('mente', ''), ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+    ('res', 'r'), ('zes', 'z'), ('ns', 'm'), ('s', ''),
+)
+
+# Palavras frequentes demais para ajudar a busca (o dicionário 'portuguese' do PostgreSQL já as ignora)
+STOPWORDS = frozenset('''
+    a ao aos as com da das de do dos e em na nas no nos o os ou para pela pelas pelo pelos por
+    que se sem sob sobre um uma umas uns
+'''.split())
+
+def fold(value):
+    """Minúsculas sem acentos; CPF formatado vira um único token de dígitos"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char)).lower()
+    return CPF_PATTERN.sub(r'\1\2\3\4', value)
+
+def stem(token):
+    """Radical simplificado (plural e advérbios em -mente) para o índice do SQLite
+
+    O PostgreSQL usa o stemmer Snowball do dicionário 'portuguese'; aqui basta
+    que o mesmo radical seja aplicado no texto indexado e na consulta.
+    """
+    if len(token) < 4 or token.isdigit():
+        return token
+    for suffix, replacement in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == 's' and token.endswith(('ss', 'us', 'is')):
+                return token  # análise, ônibus, lápis
+            return token[:-len(suffix)] + replacement
+    return token
+
+def tokenize(value):
+    return TOKEN_PATTERN.findall(fold(value))
+
+def surgery_fields(surgery):
+    return ' '.join(str(getattr(surgery, field) or '') for field in SURGERY_FIELDS)
+
+def document_fields(document):
+    return f'{document.file_name or ""} {document.document_type or ""}'
+
+class SQLiteSearchBackend:
+    """Tabela virtual FTS5; rowid = id da cirurgia ou DOCUMENT_ROWID_OFFSET + id do documento
+
+    Faixas de rowid separadas por tipo permitem filtrar o tipo e limitar a janela
+    de ranqueamento com restrições de rowid, que o FTS5 resolve sem varrer as ocorrências.
+    """
+    DOCUMENT_ROWID_OFFSET = 1 << 40
+    RANGES = {'surgery': (0, DOCUMENT_ROWID_OFFSET), 'document': (DOCUMENT_ROWID_OFFSET, 2 * DOCUMENT_ROWID_OFFSET)}
+
+    def ensure(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "surgery_id UNINDEXED, fields, content, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+        ))
+
+    def _rowid(self, kind, ref_id):
+        return self.RANGES[kind][0] + ref_id
+
+    @staticmethod
+    def _prepare(value):
+        return ' '.join(stem(token) for token in tokenize(value) if token not in STOPWORDS)
+
+    def upsert(self, connection, entries):
+        for kind, ref_id, surgery_id, fields, content in entries:
+            rowid = self._rowid(kind, ref_id)
+            connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': rowid})
+            connection.execute(
+                text('INSERT INTO search_index (rowid, surgery_id, fields, content) '
+                     'VALUES (:rowid, :surgery_id, :fields, :content)'),
+                {'rowid': rowid, 'surgery_id': surgery_id,
+                 'fields': self._prepare(fields), 'content': self._prepare(content)}
+            )
+
+    def delete(self, connection, keys):
+        for kind, ref_id in keys:
+            connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                               {'rowid': self._rowid(kind, ref_id)})
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def search(self, connection, tokens, kind, limit, offset, window):
+        # Todos os termos obrigatórios; o último também como prefixo (busca enquanto digita)
+        terms = [f'"{stem(token)}"' for token in tokens[:-1]]
+        terms.append(f'("{stem(tokens[-1])}" OR "{tokens[-1]}"*)')
+        query = ' AND '.join(terms)
+        matches = 'FROM search_index WHERE search_index MATCH :query AND rowid >= :low AND rowid < :high'
+
+        total, hits = 0, []
+        for hit_kind in ([kind] if kind else ['surgery', 'document']):
+            low, high = self.RANGES[hit_kind]
+            params = {'query': query, 'low': low, 'high': high, 'window': window, 'limit': offset + limit}
+            count = connection.execute(text(f'SELECT count(*) {matches}'), params).scalar()
+            total += count
+            if not count:
+                continue
+            if count > window >= offset + limit:
+                # Busca ampla: ranquear só as `window` ocorrências mais recentes, em vez de calcular o bm25 de todas
+                params['low'] = connection.execute(text(
+                    f'SELECT rowid {matches} ORDER BY rowid DESC LIMIT 1 OFFSET :window - 1'), params).scalar()
+            # bm25: menor é melhor; campos da cirurgia pesam mais que o texto do OCR
+            rows = connection.execute(text(
+                f'SELECT rowid, surgery_id, bm25(search_index, 0, 10.0, 1.0) AS rank {matches} '
+                'ORDER BY rank LIMIT :limit'), params).all()
+            hits.extend((hit_kind, row[0] - self.RANGES[hit_kind][0], row[1], -row[2]) for row in rows)
+
+        hits.sort(key=lambda hit: -hit[3])
+        return total, hits[offset:offset + limit]
+
+class PostgresSearchBackend:
+    """Tabela search_entries com tsvector ('portuguese') e índice GIN
+
+    O texto chega sem acentos (fold), então a extensão unaccent não é necessária.
+    """
+
+    VECTOR = ("setweight(to_tsvector('portuguese', :fields), 'A') || "
+              "setweight(to_tsvector('portuguese', :content), 'B')")
+
+    def ensure(self, connection):
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS search_entries ('
+            'kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, surgery_id INTEGER NOT NULL, '
+            'document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))'
+        ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_search_entries_document ON search_entries USING GIN (document)'))
+
+    def upsert(self, connection, entries):
+        for kind, ref_id, surgery_id, fields, content in entries:
+            connection.execute(
+                text('INSERT INTO search_entries (kind, ref_id, surgery_id, document) '
+                     f'VALUES (:kind, :ref_id, :surgery_id, {self.VECTOR}) '
+                     'ON CONFLICT (kind, ref_id) DO UPDATE '
+                     'SET surgery_id = EXCLUDED.surgery_id, document = EXCLUDED.document'),
+                {'kind': kind, 'ref_id': ref_id, 'surgery_id': surgery_id,
+                 'fields': fold(fields), 'content': fold(content)}
+            )
+
+    def delete(self, connection, keys):
+        for kind, ref_id in keys:
+            connection.execute(text('DELETE FROM search_entries WHERE kind = :kind AND ref_id = :ref_id'),
+                               {'kind': kind, 'ref_id': ref_id})
+
+    def clear(self, connection):
+        connection.execute(text('TRUNCATE search_entries'))
+
+    def search(self, connection, tokens, kind, limit, offset, window):
+        # Tokens já são [a-z0-9]+, seguros dentro do to_tsquery
+        query = ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+        params = {'query': query, 'kind': kind, 'limit': limit, 'offset': offset, 'window': window}
+        kind_filter = 'AND kind = :kind' if kind else ''
+        matches = f"FROM search_entries WHERE document @@ to_tsquery('portuguese', :query) {kind_filter}"
+
+        total = connection.execute(text(f'SELECT count(*) {matches}'), params).scalar()
+        # Busca ampla: ts_rank_cd só nas `window` ocorrências mais recentes
+        candidates = f'(SELECT * {matches} ORDER BY ref_id DESC LIMIT :window)' \
+            if total > window >= offset + limit else f'(SELECT * {matches})'
+        rows = connection.execute(text(
+            "SELECT kind, ref_id, surgery_id, ts_rank_cd(document, to_tsquery('portuguese', :query)) AS rank "
+            f'FROM {candidates} AS candidates ORDER BY rank DESC, ref_id DESC LIMIT :limit OFFSET :offset'),
+            params).all()
+        return total, [(row[0], row[1], row[2], float(row[3])) for row in rows]
+
+BACKENDS = {'sqlite': SQLiteSearchBackend(), 'postgresql': PostgresSearchBackend()}
+
+def backend_for(connection):
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        raise RuntimeError(f'Busca textual não suportada no banco {connection.dialect.name}')
+    return backend
+
+def ensure_search_index(engine):
+    """Criar a tabela do índice (db.create_all não cria tabelas virtuais nem colunas tsvector)"""
+    if engine.dialect.name not in BACKENDS:
+        return
+    with engine.begin() as connection:
+        backend_for(connection).ensure(connection)
+
+def surgery_entry(surgery):
+    return ('surgery', surgery.id, surgery.id, surgery_fields(surgery), '')
+
+def document_entry(document):
+    return ('document', document.id, document.surgery_id, document_fields(document), document.ocr_text or '')
+
+def reindex(batch_size=500):
+    """Reconstruir o índice inteiro a partir das cirurgias e documentos; retorna (cirurgias, documentos)"""
+    connection = db.session.connection()
+    backend = backend_for(connection)
+    backend.ensure(connection)
+    backend.clear(connection)
+    # Índice em documents.surgery_id (resumos por cirurgia dos resultados) em bancos já existentes
+    for index in Document.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+    counts = []
+    for model, entry in ((Surgery, surgery_entry), (Document, document_entry)):
+        indexed, last_id = 0, 0
+        while True:
+            rows = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            backend.upsert(connection, [entry(row) for row in rows])
+            indexed += len(rows)
+            last_id = rows[-1].id
+            db.session.expunge_all()  # ocr_text de lotes anteriores não fica na memória
+        counts.append(indexed)
+    db.session.commit()
+    return tuple(counts)
+
+def search(query, kind=None, page=1, per_page=20, window=None):
+    """Busca ranqueada e paginada em cirurgias e no texto do OCR dos documentos
+
+    Quando há mais de `window` resultados (SEARCH_RANK_WINDOW), as primeiras
+    páginas ranqueiam só os mais recentes; páginas além dessa janela usam todos.
+    """
+    tokens = tokenize(query)
+    tokens = ([token for token in tokens if token not in STOPWORDS] or tokens)[:12]
+    if not tokens:
+        return {'items': [], 'total': 0, 'page': page, 'per_page': per_page}
+
+    if window is None:
+        window = current_app.config.get('SEARCH_RANK_WINDOW', 2000)
+    connection = db.session.connection()
+    total, hits = backend_for(connection).search(connection, tokens, kind, per_page, (page - 1) * per_page, window)
+
+    surgery_ids = {surgery_id for _, _, surgery_id, _ in hits}
+    document_ids = [ref_id for hit_kind, ref_id, _, _ in hits if hit_kind == 'document']
+    surgeries = {s.id: s for s in Surgery.query.filter(Surgery.id.in_(surgery_ids))} if surgery_ids else {}
+    documents = {d.id: d for d in Document.query.filter(Document.id.in_(document_ids))} if document_ids else {}
+    summaries = Document.summaries_for(list(surgeries))
+
+    items = []
+    for hit_kind, ref_id, surgery_id, rank in hits:
+        surgery = surgeries.get(surgery_id)
+        if surgery is None:
+            continue
+        item = {
+            'type': hit_kind,
+            'rank': round(rank, 6),
+            'surgery': surgery.to_dict(include_documents=False,
+                                       document_summary=summaries.get(surgery_id, Document.empty_summary()))
+        }
+        if hit_kind == 'document':
+            document = documents.get(ref_id)
+            if document is None:
+                continue
+            item['document'] = {key: value for key, value in document.to_dict().items() if key != 'ocr_text'}
+            item['snippet'] = snippet(document.ocr_text, tokens)
+        items.append(item)
+    return {'items': items, 'total': total, 'page': page, 'per_page': per_page}
+
+def snippet(value, tokens, width=80):
+    """Trecho do texto em volta do primeiro termo encontrado"""
+    if not value:
+        return ''
+    folded = fold(value)
+    positions = [folded.find(token[:max(len(token) - 2, 3)]) for token in tokens]
+    positions = [position for position in positions if position >= 0]
+    start = max(min(positions) - width, 0) if positions else 0
+    end = start + 2 * width
+    # Cortar em palavras inteiras
+    if start > 0 and value.find(' ', start) != -1:
+        start = value.find(' ', start) + 1
+    if end < len(value) and value.rfind(' ', start, end) > start:
+        end = value.rfind(' ', start, end)
+    excerpt = ' '.join(value[start:end].split())
+    return ('…' if start > 0 else '') + excerpt + ('…' if end < len(value) else '')
+
+def _changed(obj, fields):
+    return any(attributes.get_history(obj, field).has_changes() for field in fields)
+
+@event.listens_for(Session, 'after_flush')
+def _index_changes(session, flush_context):
+    """Atualizar o índice das cirurgias/documentos gravados, na mesma transação do flush"""
+    upserts, deletes = [], []
+    for obj in session.new:
+        if isinstance(obj, Surgery):
+            upserts.append(surgery_entry(obj))
+        elif isinstance(obj, Document):
+            upserts.append(document_entry(obj))
+
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Surgery) and _changed(obj, SURGERY_FIELDS):
+            upserts.append(surgery_entry(obj))
+        elif isinstance(obj, Document) and _changed(obj, DOCUMENT_FIELDS):
+            upserts.append(document_entry(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, Surgery):
+            deletes.append(('surgery', obj.id))
+        elif isinstance(obj, Document):
+            deletes.append(('document', obj.id))
+
+    if not upserts and not deletes:
+        return
+    connection = session.connection()
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        return
+    backend.delete(connection, deletes)
+    backend.upsert(connection, upserts)
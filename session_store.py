@@ -0,0 +1,330 @@
+import copy
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+from src.models.conversation_state import ConversationState
+from src.models.surgery import Surgery, normalize_phone
+from src.services.cache import TTLCache
+from src.services.lifecycle import after_fork
+
+try:
+    import redis
+except ImportError:  # Opcional: só necessário com CONVERSATION_BACKEND=redis
+    redis = None
+
+# Tentativas de gravar um turno quando outra mensagem do mesmo telefone grava a sessão ao mesmo tempo
+SAVE_ATTEMPTS = 3
+
+CPF_PATTERN = re.compile(r'(?<!\d)(\d{3})\.?(\d{3})\.?(\d{3})-?(\d{2})(?!\d)')
+
+def extract_cpf(text):
+    """CPF citado na mensagem (só dígitos) ou None"""
+    match = CPF_PATTERN.search(text or '')
+    return ''.join(match.groups()) if match else None
+
+def format_cpf(cpf):
+    return f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+
+def new_session(phone):
+    """Sessão vazia: cirurgias resolvidas, última intenção, dados do paciente e últimas mensagens"""
+    return {
+        'phone': phone,
+        'surgery_ids': [],  # Cirurgias do paciente, da mais recente para a mais antiga
+        'last_intent': None,
+        'patient_info': {},
+        'turns': [],  # [{'role': 'user'|'assistant', 'content': ...}]
+        'updated_at': None,
+        'version': 0  # Incrementada a cada gravação (ver SessionStore.save)
+    }
+
+class MemorySessionBackend:
+    """Sessões no próprio processo (LRU com TTL); cada worker do gunicorn tem as suas"""
+    shared = False
+
+    def __init__(self, maxsize=10000, ttl=1800):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, name='conversation')
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        data = self.cache.get(key)
+        # Cópia: threads do mesmo processo não alteram a sessão umas das outras antes do save
+        return copy.deepcopy(data) if data is not None else None
+
+    def save(self, key, data, ttl, version):
+        with self.lock:
+            current = self.cache.get(key)
+            if current is not None and current.get('version', 0) != version:
+                return False
+            self.cache.set(key, copy.deepcopy(data), ttl)
+            return True
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def purge_expired(self):
+        return 0
+
+class DatabaseSessionBackend:
+    """Sessões na tabela conversation_states (SQLite ou PostgreSQL), compartilhadas entre workers
+
+    Usa uma conexão própria, fora da sessão do ORM, para não commitar o que a requisição tem pendente.
+    """
+    shared = True
+
+    def load(self, key):
+        table = ConversationState.__table__
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.data).where(table.c.phone == key, table.c.expires_at > datetime.utcnow())
+            ).first()
+        return row[0] if row else None
+
+    def save(self, key, data, ttl, version):
+        table = ConversationState.__table__
+        now = datetime.utcnow()
+        values = {'phone': key, 'data': data, 'version': data['version'],
+                  'expires_at': now + timedelta(seconds=ttl), 'updated_at': now}
+        # A linha existente só é sobrescrita se ainda está na versão lida (ou já expirou)
+        unchanged = or_(table.c.version == version, table.c.expires_at <= now)
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(**values)
+                return connection.execute(insert.on_conflict_do_update(
+                    index_elements=['phone'],
+                    set_={'data': insert.excluded.data, 'version': insert.excluded.version,
+                          'expires_at': insert.excluded.expires_at, 'updated_at': now},
+                    where=unchanged
+                )).rowcount == 1
+            if connection.execute(update(table).where(table.c.phone == key, unchanged).values(**values)).rowcount == 1:
+                return True
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def delete(self, key):
+        table = ConversationState.__table__
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.phone == key))
+
+    def purge_expired(self):
+        table = ConversationState.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+
+class RedisSessionBackend:
+    """Sessões no Redis (ou compatível: KeyDB, Valkey...), com expiração pelo próprio servidor"""
+    shared = True
+
+    def __init__(self, url, prefix='conversation:'):
+        if redis is None:
+            raise RuntimeError('CONVERSATION_BACKEND=redis requer o pacote redis (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    def save(self, key, data, ttl, version):
+        key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            try:
+                # WATCH: o SETEX é descartado se outra mensagem gravar a chave depois da leitura
+                pipe.watch(key)
+                raw = pipe.get(key)
+                if raw and json.loads(raw).get('version', 0) != version:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.setex(key, int(ttl), json.dumps(data))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def purge_expired(self):
+        return 0
+
+class SessionStore:
+    """Sessões de conversa do WhatsApp por telefone
+
+    Com um backend compartilhado, `local_ttl` > 0 mantém uma cópia no LRU do
+    processo por alguns segundos; mensagens do mesmo telefone atendidas por
+    workers diferentes nesse intervalo fazem mais releituras, por isso o padrão é 0.
+    As gravações são condicionais à versão lida (compare-and-set em todos os
+    backends): mensagens simultâneas do mesmo telefone não sobrescrevem os turnos
+    umas das outras.
+    """
+
+    def __init__(self, backend, ttl=1800, max_turns=10, local_maxsize=10000, local_ttl=0):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.local = None
+        if backend.shared and local_ttl > 0:
+            self.local = TTLCache(maxsize=local_maxsize, ttl=local_ttl, name='conversation_local')
+
+    @classmethod
+    def from_config(cls, config):
+        backend_name = config.get('CONVERSATION_BACKEND', 'memory')
+        ttl = config.get('CONVERSATION_TTL_SECONDS', 1800)
+        maxsize = config.get('CONVERSATION_CACHE_MAXSIZE', 10000)
+        if backend_name == 'database':
+            backend = DatabaseSessionBackend()
+        elif backend_name == 'redis':
+            backend = RedisSessionBackend(config.get('REDIS_URL') or 'redis://localhost:6379/0')
+        else:
+            backend = MemorySessionBackend(maxsize=maxsize, ttl=ttl)
+        return cls(backend, ttl=ttl, max_turns=config.get('CONVERSATION_MAX_TURNS', 10),
+                   local_maxsize=maxsize, local_ttl=config.get('CONVERSATION_LOCAL_TTL_SECONDS', 0))
+
+    @staticmethod
+    def key(phone):
+        return normalize_phone(phone) or re.sub(r'\D', '', phone or '')
+
+    def load(self, phone):
+        """Sessão do telefone (nova, se não existe ou expirou)"""
+        key = self.key(phone)
+        if self.local is not None:
+            data = self.local.get(key)
+            if data is not None:
+                return copy.deepcopy(data)
+        data = self.backend.load(key)
+        if data is None:
+            return new_session(phone)
+        if self.local is not None:
+            self.local.set(key, copy.deepcopy(data))
+        return data
+
+    def save(self, session):
+        """Gravar a sessão se ninguém a gravou desde a leitura; False em caso de conflito"""
+        version = session.get('version', 0)
+        session['turns'] = session['turns'][-self.max_turns:]
+        session['updated_at'] = time.time()
+        key = self.key(session['phone'])
+        if not self.backend.save(key, dict(session, version=version + 1), self.ttl, version):
+            if self.local is not None:
+                self.local.delete(key)
+            return False
+        session['version'] = version + 1
+        if self.local is not None:
+            self.local.set(key, copy.deepcopy(session))
+        return True
+
+    def record_turn(self, session, user_text, reply, intent=None, cpf=None):
+        """Acrescentar a pergunta e a resposta à janela de mensagens e gravar a sessão
+
+        Se outra mensagem do mesmo telefone gravou a sessão nesse meio tempo, o turno
+        (e o CPF, quando esta mensagem trouxe um novo) é reaplicado sobre a versão
+        mais recente. Retorna a sessão gravada.
+        """
+        phone = session['phone']
+        surgery_ids = session['surgery_ids']
+        for attempt in range(SAVE_ATTEMPTS):
+            if attempt:
+                session = self.backend.load(self.key(phone)) or new_session(phone)
+                if cpf:
+                    session['patient_info']['cpf'] = cpf
+                    session['surgery_ids'] = surgery_ids
+            session['turns'].append({'role': 'user', 'content': user_text})
+            session['turns'].append({'role': 'assistant', 'content': reply})
+            if intent:
+                session['last_intent'] = intent
+            if self.save(session):
+                return session
+        raise RuntimeError(f'Sessão de {phone} alterada por outras mensagens durante a gravação')
+
+    def reset(self, phone):
+        key = self.key(phone)
+        self.backend.delete(key)
+        if self.local is not None:
+            self.local.delete(key)
+
+    def purge_expired(self):
+        """Remover sessões expiradas (só o backend 'database' precisa)"""
+        return self.backend.purge_expired()
+
+def remember_cpf(session, text):
+    """Guardar o CPF citado na mensagem; retorna o CPF só quando ele mudou
+
+    Um CPF novo descarta as cirurgias já resolvidas.
+    """
+    cpf = extract_cpf(text)
+    if not cpf or session['patient_info'].get('cpf') == cpf:
+        return None
+    session['patient_info']['cpf'] = cpf
+    session['surgery_ids'] = []
+    return cpf
+
+def session_surgery(session, limit=10):
+    """Cirurgia mais recente do paciente da sessão
+
+    Só cirurgias cadastradas com o telefone de quem escreve: o CPF informado na
+    conversa apenas escolhe entre elas, nunca dá acesso a cirurgias de outro
+    número. O paciente só é resolvido quando a sessão ainda não tem cirurgias;
+    depois basta uma leitura por chave primária.
+    """
+    if session['surgery_ids']:
+        surgery = db.session.get(Surgery, session['surgery_ids'][0])
+        if surgery is not None:
+            return surgery
+
+    normalized = normalize_phone(session['phone'])
+    if not normalized:
+        return None
+    by_phone = Surgery.patient_phone_normalized == normalized
+    filters = [by_phone]
+    cpf = session['patient_info'].get('cpf')
+    if cpf:
+        filters.insert(0, and_(by_phone, Surgery.patient_cpf.in_((cpf, format_cpf(cpf)))))
+
+    # CPF informado tem prioridade entre as cirurgias do telefone; sem resultado, vale só o telefone
+    for condition in filters:
+        session['surgery_ids'] = [
+            row[0] for row in db.session.query(Surgery.id).filter(condition)
+            .order_by(Surgery.surgery_date.desc(), Surgery.id.desc()).limit(limit)
+        ]
+        if session['surgery_ids']:
+            return db.session.get(Surgery, session['surgery_ids'][0])
+    return None
+
+def surgery_context(surgery):
+    """Resumo da cirurgia enviado ao LLM como contexto da conversa"""
+    return (
+        f"Paciente: {surgery.patient_name}. Cirurgia: {surgery.surgery_type} em "
+        f"{surgery.surgery_date:%d/%m/%Y}, hospital {surgery.hospital_name}, convênio "
+        f"{surgery.insurance_company}. Status do reembolso: {surgery.status}."
+    )
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+def get_session_store():
+    """Obter o SessionStore compartilhado do processo"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore.from_config(current_app.config)
+    return _session_store
+
+@after_fork
+def _discard_inherited_store():
+    """Conexão do Redis e LRU local são por processo"""
+    global _session_store, _session_store_lock
+    _session_store = None
+    _session_store_lock = threading.Lock()
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from flask import Response
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # Opcional: sem ele, `flask static-precompress` gera só .gz
+    brotli = None
+
+# Variantes pré-comprimidas procuradas ao lado de cada arquivo, em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/wasm', 'application/manifest+json')
+# Nomes com hash de conteúdo (Vite: assets/index-BQh2Gyyx.js; CRA: main.1a2b3c4d.js) nunca mudam
+DEFAULT_IMMUTABLE_PATTERN = r'(^|/)assets/[^/]+-[A-Za-z0-9_-]{8,}\.\w+$|\.[0-9a-f]{8,}\.\w+$'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def is_compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+class AssetFile:
+    """Uma representação do arquivo (original ou variante comprimida)"""
+    __slots__ = ('path', 'size', 'etag', 'content')
+
+    def __init__(self, path, size, etag, content=None):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.content = content  # Bytes em memória (arquivos pequenos) ou None (lido do disco)
+
+class Asset:
+    __slots__ = ('content_type', 'cache_control', 'original', 'variants')
+
+    def __init__(self, content_type, cache_control, original, variants):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.original = original
+        self.variants = variants  # {'br': AssetFile, 'gzip': AssetFile}
+
+class StaticManifest:
+    """Índice em memória da pasta static, montado uma vez na inicialização
+
+    Guarda tipo, tamanho, ETag forte (SHA-256 do conteúdo) e as variantes .br/.gz
+    de cada arquivo, e o conteúdo dos arquivos pequenos: servir um asset não faz
+    stat, não comprime e, na maioria dos casos, nem abre arquivo. Mudanças na
+    pasta só aparecem ao reiniciar os workers.
+    """
+
+    def __init__(self, root, assets, index=None):
+        self.root = root
+        self.assets = assets
+        self.index = index
+
+    @classmethod
+    def build(cls, root, max_age=3600, immutable_pattern=None, memory_max_bytes=1024 * 1024):
+        immutable = re.compile(immutable_pattern or DEFAULT_IMMUTABLE_PATTERN)
+        assets = {}
+        if root and os.path.isdir(root):
+            for directory, _, files in os.walk(root):
+                names = set(files)
+                for name in files:
+                    if any(name.endswith(suffix) and name[:-len(suffix)] in names for _, suffix in ENCODINGS):
+                        continue  # Variante de outro arquivo
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, root).replace(os.sep, '/')
+                    assets[relative] = cls._asset(path, relative, names, immutable, max_age, memory_max_bytes)
+        return cls(root, assets, assets.get('index.html'))
+
+    @staticmethod
+    def _asset(path, relative, names, immutable, max_age, memory_max_bytes):
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        if relative == 'index.html':
+            cache_control = 'no-cache'  # Sempre revalidado (304 pelo ETag): aponta para os bundles novos
+        elif immutable.search(relative):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = f'public, max-age={max_age}'
+
+        original = _load(path, None, memory_max_bytes)
+        variants = {}
+        directory, name = os.path.split(path)
+        for encoding, suffix in ENCODINGS:
+            if name + suffix in names:
+                variant = _load(os.path.join(directory, name + suffix), encoding, memory_max_bytes)
+                # Variante maior que o original (ex.: imagem já comprimida) não compensa
+                if variant.size < original.size:
+                    variants[encoding] = variant
+        return Asset(content_type, cache_control, original, variants)
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def response(self, asset, request):
+        """Resposta do asset negociando Content-Encoding, com ETag forte e 304"""
+        selected, encoding = asset.original, None
+        for candidate, variant in asset.variants.items():
+            if request.accept_encodings[candidate] > 0 and (selected is asset.original or variant.size < selected.size):
+                selected, encoding = variant, candidate
+
+        headers = {'ETag': f'"{selected.etag}"', 'Cache-Control': asset.cache_control}
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+        if selected.etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(selected.size)
+        if selected.content is not None:
+            body = selected.content
+        else:
+            body = wrap_file(request.environ, open(selected.path, 'rb'))
+        return Response(body, headers=headers, content_type=asset.content_type, direct_passthrough=True)
+
+def _load(path, encoding, memory_max_bytes):
+    """Ler o arquivo uma vez: ETag pelo conteúdo e cópia em memória se for pequeno"""
+    digest = hashlib.sha256()
+    content = bytearray()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+            if size <= memory_max_bytes:
+                content += chunk
+    # ETags diferentes por codificação: caches intermediários não misturam as variantes
+    etag = digest.hexdigest()[:32] + (f'-{encoding}' if encoding else '')
+    return AssetFile(path, size, etag, bytes(content) if size <= memory_max_bytes else None)
+
+def precompress(root, min_size=1024, force=False):
+    """Gerar .gz (e .br, com o pacote brotli) para os arquivos compressíveis da pasta
+
+    Retorna o número de variantes escritas; variantes mais novas que o original são mantidas.
+    """
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            mimetype = mimetypes.guess_type(path)[0] or ''
+            if not is_compressible(mimetype) or os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            for suffix, compress in (('.gz', _gzip), ('.br', brotli.compress if brotli else None)):
+                target = path + suffix
+                if compress is None:
+                    continue
+                if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                with open(target + '.tmp', 'wb') as f:
+                    f.write(compress(data))
+                os.replace(target + '.tmp', target)
+                written += 1
+    return written
+
+def _gzip(data):
+    # mtime=0: o mesmo arquivo gera sempre os mesmos bytes (e o mesmo ETag) em todos os servidores
+    return gzip.compress(data, compresslevel=9, mtime=0)
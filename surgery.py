@@ -1,13 +1,58 @@
+import re
 from datetime import datetime
+from sqlalchemy.orm import selectinload, validates
 from src.models.user import db
+from src.models.document import Document
+
+MAX_PER_PAGE = 100
+
+def parse_fields(fields):
+    """Converter `?fields=a,b,c` em conjunto de campos (None = todos)"""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return {field.strip() for field in fields if field.strip()}
+
+def normalize_phone(phone):
+    """Normalizar telefone para a forma canônica usada nas buscas
+
+    Mantém só dígitos, adiciona o DDI 55 a números nacionais e remove o nono dígito
+    de celulares brasileiros: o WhatsApp envia muitos números no formato antigo
+    (55 + DDD + 8 dígitos), enquanto a equipe digita "(11) 98765-4321".
+    """
+    if not phone:
+        return None
+    
+    digits = re.sub(r'\D', '', phone)
+    if digits.startswith('00'):
+        digits = digits[2:]  # Prefixo internacional
+    if digits.startswith('0') and len(digits) in (11, 12):
+        digits = digits[1:]  # Prefixo de operadora/tronco: 0 + DDD + número
+    if len(digits) in (10, 11):
+        digits = '55' + digits
+    if len(digits) == 13 and digits.startswith('55') and digits[4] == '9':
+        digits = digits[:4] + digits[5:]
+    return digits or None
 
 class Surgery(db.Model):
     __tablename__ = 'surgeries'
+    __table_args__ = (
+        # Consulta mais frequente do bot: cirurgia mais recente de um telefone
+        db.Index('ix_surgeries_phone_date', 'patient_phone_normalized', 'surgery_date', 'id'),
+        # Paciente identificado pelo CPF informado na conversa do WhatsApp
+        db.Index('ix_surgeries_cpf_date', 'patient_cpf', 'surgery_date', 'id'),
+        db.Index('ix_surgeries_asana_task_id', 'asana_task_id'),
+        db.Index('ix_surgeries_status', 'status'),
+        # Verificação de relatórios em cache: maior updated_at de um período sem ler as linhas
+        db.Index('ix_surgeries_date_updated', 'surgery_date', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_name = db.Column(db.String(100), nullable=False)
     patient_cpf = db.Column(db.String(14), nullable=False)
     patient_phone = db.Column(db.String(20), nullable=False)
+    patient_phone_normalized = db.Column(db.String(20), nullable=True)  # Preenchido automaticamente a partir de patient_phone
     surgery_type = db.Column(db.String(100), nullable=False)
     surgery_date = db.Column(db.DateTime, nullable=False)
     doctor_name = db.Column(db.String(100), nullable=False)
@@ -22,8 +67,29 @@ class Surgery(db.Model):
     # Relacionamento com documentos
     documents = db.relationship('Document', backref='surgery', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
+    @validates('patient_phone')
+    def _normalize_patient_phone(self, key, value):
+        self.patient_phone_normalized = normalize_phone(value)
+        return value
+    
+    @classmethod
+    def latest_for_phone(cls, phone):
+        """Cirurgia mais recente do telefone (uma linha, pelo índice telefone + data)"""
+        normalized = normalize_phone(phone)
+        if not normalized:
+            return None
+        return cls.query.filter_by(patient_phone_normalized=normalized) \
+            .order_by(cls.surgery_date.desc(), cls.id.desc()) \
+            .first()
+    
+    def to_dict(self, fields=None, include_documents=True, document_summary=None):
+        """Serializar a cirurgia
+
+        Com include_documents=False, os documentos (e seu ocr_text) não são carregados:
+        a resposta traz apenas document_count/document_types, vindos de `document_summary`
+        quando a listagem já os agregou em lote.
+        """
+        data = {
             'id': self.id,
             'patient_name': self.patient_name,
             'patient_cpf': self.patient_cpf,
@@ -37,7 +103,53 @@ class Surgery(db.Model):
             'reimbursement_amount': self.reimbursement_amount,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'asana_task_id': self.asana_task_id,
-            'documents': [doc.to_dict() for doc in self.documents]
+            'asana_task_id': self.asana_task_id
+        }
+        
+        if include_documents:
+            data['documents'] = [doc.to_dict() for doc in self.documents]
+        else:
+            summary = document_summary or Document.summaries_for([self.id]).get(self.id) or Document.empty_summary()
+            data['document_count'] = summary['count']
+            data['document_types'] = summary['types']
+        
+        if fields:
+            data = {key: value for key, value in data.items() if key in fields or key == 'id'}
+        return data
+    
+    @classmethod
+    def list_page(cls, query=None, page=1, per_page=20, fields=None):
+        """Página de cirurgias para as listagens, com número fixo de consultas
+
+        Por padrão retorna a projeção resumida (sem documentos nem ocr_text). Incluir
+        `documents` em `fields` traz o payload completo, carregado com um único SELECT ... IN.
+        """
+        fields = parse_fields(fields)
+        include_documents = fields is not None and 'documents' in fields
+        page = max(int(page or 1), 1)
+        per_page = min(max(int(per_page or 20), 1), MAX_PER_PAGE)
+        
+        query = query if query is not None else cls.query
+        total = query.order_by(None).count()
+        
+        query = query.order_by(cls.surgery_date.desc(), cls.id.desc())
+        if include_documents:
+            query = query.options(selectinload(cls.documents))
+        surgeries = query.limit(per_page).offset((page - 1) * per_page).all()
+        
+        summaries = {} if include_documents else Document.summaries_for([surgery.id for surgery in surgeries])
+        
+        return {
+            'items': [
+                surgery.to_dict(
+                    fields=fields,
+                    include_documents=include_documents,
+                    document_summary=summaries.get(surgery.id, Document.empty_summary())
+                )
+                for surgery in surgeries
+            ],
+            'total': total,
+            'page': page,
+            'per_page': per_page
         }
 
@@ -0,0 +1,33 @@
+"""Fixtures comuns: app com banco SQLite temporário apontado para os stubs locais das APIs externas
+
+O `main` lê o Config das variáveis de ambiente na importação, por isso o app é
+criado uma vez por sessão de testes; ajustes por teste vão direto em `app.config`.
+"""
+import pytest
+
+from benchmarks.harness import configure_environment, load_app
+from benchmarks.stubs import start_stubs, stub_environment
+
+@pytest.fixture(scope='session')
+def stubs():
+    stubs = start_stubs()
+    yield stubs
+    for stub in stubs.values():
+        stub.stop()
+
+@pytest.fixture(scope='session')
+def app(stubs, tmp_path_factory):
+    configure_environment(str(tmp_path_factory.mktemp('app')), stub_environment(stubs), {'OCR_PROVIDER': 'remote'})
+    return load_app()
+
+@pytest.fixture
+def db_session(app):
+    """Contexto da aplicação com as tabelas esvaziadas ao final do teste"""
+    from src.models.user import db
+
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
@@ -0,0 +1,68 @@
+from src.services import cache as cache_module
+from src.services.ai_service import AIService, get_ai_service
+from src.services.cache import TTLCache
+
+def test_settings_come_from_app_config(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'OPENAI_MODEL', 'modelo-de-teste')
+    monkeypatch.setitem(app.config, 'AI_CACHE_MAXSIZE', 16)
+    monkeypatch.setitem(app.config, 'AI_CACHE_TTL_SECONDS', 60)
+    with app.app_context():
+        service = AIService()
+    assert service.model == 'modelo-de-teste'
+    assert service.cache.maxsize == 16
+    assert str(service.client.base_url).rstrip('/') == app.config['OPENAI_API_BASE'].rstrip('/')
+
+def intent_reply(monkeypatch, stubs, content):
+    monkeypatch.setattr(stubs['openai'], 'completion_text', lambda messages: content)
+
+def test_unknown_intent_is_not_cached(app, stubs, monkeypatch):
+    with app.app_context():
+        service = AIService()
+        intent_reply(monkeypatch, stubs, 'A intenção é: dúvida')
+        assert service.classify_intent('preciso de ajuda') == 'general_question'
+        assert len(service.cache) == 0
+
+        # A próxima mensagem igual consulta o LLM de novo e guarda a categoria válida
+        intent_reply(monkeypatch, stubs, 'Complaint.')
+        assert service.classify_intent('preciso de ajuda') == 'complaint'
+        calls = stubs['openai'].requests['POST /v1/chat/completions']
+        assert service.classify_intent('Preciso de ajuda!') == 'complaint'
+        assert stubs['openai'].requests['POST /v1/chat/completions'] == calls
+
+def test_extraction_is_cached_per_exact_text(app, stubs):
+    completions = stubs['openai'].requests
+    with app.app_context():
+        service = AIService()
+        calls = completions['POST /v1/chat/completions']
+        info = service.extract_patient_info('Meu nome é Ana')
+        info['nome'] = 'alterado'
+        assert service.extract_patient_info('Meu nome é Ana') == {'nome': None, 'cpf': None, 'telefone': None}
+        assert completions['POST /v1/chat/completions'] == calls + 1
+        # Maiúsculas importam na extração (nomes), ao contrário da intenção
+        service.extract_patient_info('MEU NOME É ANA')
+        assert completions['POST /v1/chat/completions'] == calls + 2
+
+def test_cache_key_changes_with_model(app, monkeypatch):
+    with app.app_context():
+        key = AIService()._cache_key('v1', 'Oi ', fold_case=True)
+        assert AIService()._cache_key('v1', 'oi', fold_case=True) == key
+        monkeypatch.setitem(app.config, 'OPENAI_MODEL', 'outro-modelo')
+        assert AIService()._cache_key('v1', 'oi', fold_case=True) != key
+
+def test_service_is_shared_by_the_process(app):
+    with app.app_context():
+        assert get_ai_service() is get_ai_service()
+
+def test_ttl_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1
+
+    now[0] += 11
+    assert cache.get('a') is None and len(cache) == 1
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+
+from src.services import http_client
+
+# Carregados só no primeiro uso: importar o app no master do gunicorn não deve trazê-los
+HEAVY_MODULES = ('openai', 'numpy', 'PIL', 'pytesseract', 'pdf2image', 'requests')
+
+def test_import_does_not_load_heavy_modules(app):
+    code = ('import json, sys, main; '
+            f'print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    assert json.loads(output.stdout.strip().splitlines()[-1]) == []
+
+def test_create_app_does_not_touch_the_database(app, tmp_path):
+    # Importados depois do fixture `app`: o Config lê as variáveis de ambiente na importação
+    import main
+    from config import Config
+
+    class UnreachableDatabase(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/missing/dir/app.db'
+
+    created = main.create_app(UnreachableDatabase)
+    assert '/api/search' in {rule.rule for rule in created.url_map.iter_rules()}
+    assert not (tmp_path / 'missing').exists()
+
+def test_child_process_drops_inherited_clients(app):
+    with app.app_context():
+        http_client.get_client('asana')
+    assert http_client._clients
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if http_client._clients == {} else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # O processo pai continua com o cliente (e as conexões) dele
+    assert 'asana' in http_client._clients
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.harness import seed_surgeries
+from src.models.surgery import Surgery
+from src.models.queue_job import QueueJob
+from src.routes.asana import ASANA_SYNC_LOCK, SyncAlreadyRunning, sync_missing_tasks
+from src.services.job_queue import acquire_lock, release_lock
+
+@pytest.fixture
+def unsynced(app, db_session):
+    seed_surgeries(app, 25)
+    Surgery.query.update({'asana_task_id': None})
+    db_session.commit()
+
+@pytest.fixture
+def rate_limited_batch(stubs, monkeypatch):
+    """A primeira chamada à Batch API responde 429 com Retry-After: 30"""
+    asana = stubs['asana']
+    handle = asana.handle
+    calls = []
+
+    def handle_with_limit(method, path, body, headers):
+        if path.endswith('/batch'):
+            calls.append(path)
+            if len(calls) == 1:
+                return 429, {'Retry-After': '30'}, {'errors': [{'message': 'Rate limit exceeded'}]}
+        return handle(method, path, body, headers)
+
+    monkeypatch.setattr(asana, 'handle', handle_with_limit)
+    return calls
+
+def test_sync_creates_tasks_in_batches(unsynced, stubs):
+    batches = stubs['asana'].requests['POST /batch']
+    result = sync_missing_tasks(batch_size=10, concurrency=2)
+    assert stubs['asana'].requests['POST /batch'] == batches + 3
+    assert result['created'] == 25
+    assert result['failed'] == 0
+    assert result['remaining'] == 0
+    assert Surgery.query.filter(Surgery.asana_task_id.is_(None)).count() == 0
+
+def test_long_retry_after_stops_run_and_reschedules(unsynced, rate_limited_batch):
+    started = datetime.utcnow()
+    result = sync_missing_tasks(batch_size=10, concurrency=1)
+
+    # O 429 não é refeito dentro da execução nem vira falha das cirurgias do lote
+    assert rate_limited_batch == ['/batch']
+    assert result['retry_after'] == 30
+    assert result['created'] == 0
+    assert result['failed'] == 0
+    assert result['errors'] == {}
+    assert result['remaining'] == 25
+
+    job = QueueJob.query.filter_by(queue='asana_sync').one()
+    assert job.status == 'pending'
+    assert started + timedelta(seconds=29) <= job.available_at <= datetime.utcnow() + timedelta(seconds=31)
+
+    # A execução agendada retoma todas as cirurgias sem tarefa
+    result = sync_missing_tasks(batch_size=10, concurrency=1)
+    assert result['created'] == 25
+    assert 'retry_after' not in result
+
+def test_only_one_sync_runs_at_a_time(unsynced):
+    token = acquire_lock(ASANA_SYNC_LOCK, 60)
+    try:
+        with pytest.raises(SyncAlreadyRunning):
+            sync_missing_tasks(batch_size=10)
+    finally:
+        release_lock(ASANA_SYNC_LOCK, token)
+    assert sync_missing_tasks(batch_size=10)['created'] == 25
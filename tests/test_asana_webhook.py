@@ -0,0 +1,79 @@
+import pytest
+
+from benchmarks.harness import seed_surgeries
+from src.models.surgery import Surgery
+from src.models.queue_job import QueueJob
+from src.routes.asana import status_from_task
+from src.services.job_queue import process_available_jobs
+
+def section(name):
+    return {'completed': False, 'memberships': [{'section': {'name': name}}]}
+
+@pytest.mark.parametrize('task, current, expected', [
+    (section('Em análise'), 'pending', 'in_analysis'),
+    (section('Aprovado'), 'in_analysis', 'approved'),
+    (section('Concluído'), 'approved', 'completed'),
+    ({'completed': True, 'memberships': []}, 'in_analysis', 'completed'),
+    # Final não é rebaixado: tarefa reaberta ou evento atrasado de uma seção anterior
+    ({'completed': False, 'memberships': []}, 'approved', 'approved'),
+    (section('Em análise'), 'completed', 'completed'),
+    (section('Rejeitado'), 'approved', 'approved'),
+    # Aprovar no app conclui a tarefa; o webhook dessa conclusão não muda o status
+    ({'completed': True, 'memberships': []}, 'approved', 'approved'),
+    (section('Pendente'), 'in_analysis', 'in_analysis'),
+    (section('Outra seção'), 'pending', 'pending'),
+])
+def test_status_from_task_only_moves_forward(task, current, expected):
+    assert status_from_task(task, current) == expected
+
+def task_event(gid, field='completed', created_at='2026-01-01T10:00:00.000Z'):
+    return {'action': 'changed', 'resource': {'gid': gid, 'resource_type': 'task'},
+            'change': {'field': field, 'action': 'changed'}, 'created_at': created_at}
+
+@pytest.fixture
+def patient(app, db_session):
+    patient = seed_surgeries(app, 1)[0]
+    Surgery.query.update({'status': 'in_analysis'})
+    db_session.commit()
+    return patient
+
+@pytest.fixture
+def approved_task(stubs, monkeypatch):
+    monkeypatch.setattr(stubs['asana'], 'task', lambda gid: {'gid': gid, **section('Aprovado')})
+    return stubs['asana']
+
+def post_events(app, events):
+    return app.test_client().post('/api/asana/webhook', json={'events': events})
+
+def test_webhook_acknowledges_before_reading_tasks(app, patient, approved_task, db_session):
+    batch_calls = approved_task.requests['POST /batch']
+    response = post_events(app, [task_event(patient['asana_task_id'])])
+    assert response.status_code == 200
+    assert response.get_json()['enqueued'] == 1
+    # Nada foi lido do Asana nem aplicado na requisição
+    assert approved_task.requests['POST /batch'] == batch_calls
+    assert Surgery.query.one().status == 'in_analysis'
+
+    assert process_available_jobs(['asana_webhook']) == 1
+    assert approved_task.requests['POST /batch'] == batch_calls + 1
+    db_session.expire_all()
+    assert Surgery.query.one().status == 'approved'
+    assert QueueJob.query.filter_by(queue='asana_webhook').one().status == 'done'
+
+def test_replayed_delivery_is_not_reapplied(app, patient, approved_task, db_session):
+    events = [task_event(patient['asana_task_id'])]
+    post_events(app, events)
+    process_available_jobs(['asana_webhook'])
+    assert post_events(app, events).get_json()['enqueued'] == 0
+
+def test_event_without_status_change_does_not_read_task(app, patient, approved_task, db_session):
+    batch_calls = approved_task.requests['POST /batch']
+    post_events(app, [task_event(patient['asana_task_id'], field='name')])
+    process_available_jobs(['asana_webhook'])
+    assert approved_task.requests['POST /batch'] == batch_calls
+    db_session.expire_all()
+    assert Surgery.query.one().status == 'in_analysis'
+
+def test_empty_delivery_enqueues_nothing(app, db_session):
+    assert post_events(app, []).get_json()['enqueued'] == 0
+    assert QueueJob.query.count() == 0
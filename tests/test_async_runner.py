@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from flask import current_app
+
+from src.services.ai_service import GREETING_RESPONSE
+from src.services.async_runner import AsyncRunner
+
+@pytest.fixture
+def runner(app):
+    runner = AsyncRunner(app, max_concurrency=10, sync_threads=2, drain_seconds=1)
+    yield runner
+    runner.stop()
+
+def test_same_key_runs_in_order_and_other_keys_in_parallel(runner):
+    events = []
+    lock = threading.Lock()
+
+    async def task(name, delay):
+        with lock:
+            events.append(f'{name}:start')
+        await asyncio.sleep(delay)
+        with lock:
+            events.append(f'{name}:end')
+        return name
+
+    futures = [runner.submit('a', task, 'a1', 0.2), runner.submit('a', task, 'a2', 0.0),
+               runner.submit('b', task, 'b1', 0.0)]
+    assert [future.result(5) for future in futures] == ['a1', 'a2', 'b1']
+    # a2 só começa depois que a1 termina; b1 não espera a chave 'a'
+    assert events.index('a2:start') > events.index('a1:end')
+    assert events.index('b1:end') < events.index('a1:end')
+
+def test_failure_does_not_block_the_next_task_of_the_key(runner):
+    async def fail():
+        raise ValueError('falhou')
+
+    async def succeed():
+        return 'ok'
+
+    first = runner.submit('a', fail)
+    second = runner.submit('a', succeed)
+    assert second.result(5) == 'ok'
+    with pytest.raises(ValueError):
+        first.result(5)
+
+def test_run_sync_has_its_own_app_context(runner, app):
+    async def call():
+        return await runner.run_sync(lambda: (current_app.name, threading.current_thread().name))
+
+    name, thread = runner.submit('a', call).result(5)
+    assert name == app.name and thread.startswith('async-sync')
+
+def test_async_webhook_replies_per_phone(app, db_session, stubs, monkeypatch):
+    monkeypatch.setitem(app.config, 'WHATSAPP_INGESTION_MODE', 'async')
+    whatsapp = stubs['whatsapp']
+    handle = whatsapp.handle
+    sent = []
+
+    def recording(method, path, body, headers):
+        if method == 'POST' and path.endswith('/messages'):
+            payload = json.loads(body)
+            sent.append((payload['to'], payload['text']['body']))
+        return handle(method, path, body, headers)
+
+    monkeypatch.setattr(whatsapp, 'handle', recording)
+    messages = [{'from': phone, 'id': f'wamid.{index}', 'type': 'text', 'text': {'body': 'oi'}}
+                for index, phone in enumerate(['5511911111111', '5511922222222', '5511911111111'])]
+    response = app.test_client().post('/api/whatsapp/webhook',
+                                      json={'entry': [{'changes': [{'value': {'messages': messages}}]}]})
+    assert response.status_code == 200
+
+    deadline = time.monotonic() + 5
+    while len(sent) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sorted(phone for phone, _ in sent) == ['5511911111111', '5511911111111', '5511922222222']
+    assert {body for _, body in sent} == {GREETING_RESPONSE}
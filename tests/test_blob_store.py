@@ -0,0 +1,80 @@
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from src.models.document import Document
+from src.models.surgery import Surgery
+from src.services.blob_store import BlobStore, BlobTooLarge
+
+CONTENT = b'%PDF-1.4 guia de solicitacao' * 100
+
+def test_same_content_is_stored_once(tmp_path):
+    store = BlobStore(tmp_path)
+    first = store.write_chunks([CONTENT[:100], CONTENT[100:]], '.PDF')
+    source = tmp_path / 'upload.pdf'
+    source.write_bytes(CONTENT)
+    second = store.write_file(str(source), move=True)
+
+    assert first == second
+    sha256, size, path = first
+    assert sha256 == hashlib.sha256(CONTENT).hexdigest() and size == len(CONTENT)
+    assert path.endswith(os.path.join(sha256[:2], sha256[2:4], sha256 + '.pdf'))
+    assert not source.exists()
+    assert store.usage() == (1, len(CONTENT))
+    assert os.listdir(store.temp_dir) == []
+
+def test_oversized_content_leaves_nothing_behind(tmp_path):
+    store = BlobStore(tmp_path)
+    with pytest.raises(BlobTooLarge):
+        store.write_chunks([b'x' * 10, b'x' * 10], max_bytes=15)
+    assert store.usage() == (0, 0)
+    assert os.listdir(store.temp_dir) == []
+
+def test_garbage_collection_keeps_referenced_and_recent_blobs(tmp_path):
+    store = BlobStore(tmp_path)
+    kept, _, _ = store.write_chunks([b'referenciado'])
+    orphan, _, orphan_path = store.write_chunks([b'sem referencia'])
+    recent, _, _ = store.write_chunks([b'recente'])
+    old = time.time() - 7200
+    for sha256, path in store.iter_blobs():
+        if sha256 != recent:
+            os.utime(path, (old, old))
+
+    assert store.collect_garbage({kept}, grace_seconds=3600) == (1, len(b'sem referencia'))
+    assert {sha256 for sha256, _ in store.iter_blobs()} == {kept, recent}
+    assert not os.path.exists(orphan_path)
+
+@pytest.fixture
+def document(app, db_session, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'BLOB_STORE_ROOT', str(tmp_path))
+    sha256, size, path = BlobStore(tmp_path).write_chunks([CONTENT], '.pdf')
+    surgery = Surgery(patient_name='A', patient_cpf='0', patient_phone='5511911111111', surgery_type='Catarata',
+                      surgery_date=datetime(2026, 3, 1), doctor_name='Dr. A', hospital_name='H', insurance_company='Plano')
+    surgery.documents = [Document(document_type='guide', file_name='guia de solicitação.pdf', file_path=path,
+                                  content_hash=sha256, file_size=size, mime_type='application/pdf')]
+    db_session.add(surgery)
+    db_session.commit()
+    return surgery.documents[0]
+
+def test_file_is_served_with_content_etag_and_ranges(app, document):
+    client = app.test_client()
+    url = f'/api/documents/{document.id}/file'
+    response = client.get(url)
+    assert response.status_code == 200 and response.data == CONTENT
+    assert response.headers['ETag'] == f'"{document.content_hash}"'
+    assert 'private' in response.headers['Cache-Control']
+
+    assert client.get(url, headers={'If-None-Match': f'"{document.content_hash}"'}).status_code == 304
+    partial = client.get(url, headers={'Range': 'bytes=0-3'})
+    assert partial.status_code == 206 and partial.data == b'%PDF'
+
+def test_accel_redirect_leaves_the_body_to_nginx(app, document, monkeypatch):
+    monkeypatch.setitem(app.config, 'BLOB_ACCEL_REDIRECT_PREFIX', '/_blobs/')
+    response = app.test_client().get(f'/api/documents/{document.id}/file?download=1')
+    sha256 = document.content_hash
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/_blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="guia de solicitacao.pdf"')
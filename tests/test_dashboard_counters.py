@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from src.models.dashboard_counter import DashboardCounter
+from src.models.surgery import Surgery
+
+def surgery(name, surgery_type='Catarata', date=datetime(2026, 3, 10), amount=100.0, **fields):
+    return Surgery(patient_name=name, patient_cpf='000.000.000-00', patient_phone='5511911111111',
+                   surgery_type=surgery_type, surgery_date=date, doctor_name='Dr. A', hospital_name='H',
+                   insurance_company='Plano', reimbursement_amount=amount, **fields)
+
+def counters():
+    return {(c.dimension, c.key): (c.count, c.reimbursement_total)
+            for c in DashboardCounter.query if c.count}
+
+def test_counters_follow_inserts_updates_and_deletes(db_session):
+    db_session.add_all([surgery('A'), surgery('B', 'Joelho', datetime(2026, 4, 1), 50.0)])
+    db_session.commit()
+    assert counters()[('status', 'pending')] == (2, 150.0)
+    assert counters()[('month', '2026-04')] == (1, 50.0)
+
+    # Alteração depois do commit (atributos expirados): o valor antigo é descontado da chave certa
+    first = Surgery.query.filter_by(patient_name='A').one()
+    first.status = 'approved'
+    first.reimbursement_amount = 80.0
+    db_session.commit()
+    db_session.delete(Surgery.query.filter_by(patient_name='B').one())
+    db_session.commit()
+
+    assert counters() == {
+        ('total', ''): (1, 80.0),
+        ('status', 'approved'): (1, 80.0),
+        ('type', 'Catarata'): (1, 80.0),
+        ('month', '2026-03'): (1, 80.0),
+    }
+
+def test_rolled_back_changes_do_not_count(db_session):
+    db_session.add(surgery('A'))
+    db_session.flush()
+    db_session.rollback()
+    assert counters() == {}
+
+def test_rebuild_matches_incremental_counters(db_session):
+    db_session.add_all([surgery('A', status='approved'), surgery('B', 'Joelho'), surgery('C', date=datetime(2026, 1, 5))])
+    db_session.commit()
+    incremental = counters()
+
+    DashboardCounter.query.update({'count': 0})
+    db_session.commit()
+    assert DashboardCounter.rebuild() == len(incremental)
+    assert counters() == incremental
+
+def test_dashboard_payload(db_session):
+    db_session.add_all([surgery('A', status='approved'), surgery('B'), surgery('C', 'Joelho', status='rejected')])
+    db_session.commit()
+    dashboard = DashboardCounter.dashboard(months=6)
+
+    assert dashboard['summary'] == {'total_surgeries': 3, 'pending_surgeries': 1, 'approved_surgeries': 1,
+                                    'rejected_surgeries': 1, 'total_reimbursement': 300.0}
+    assert dashboard['monthly_surgeries'] == [{'month': '2026-03', 'count': 3}]
+    assert dashboard['surgeries_by_type'] == [{'type': 'Catarata', 'count': 2}, {'type': 'Joelho', 'count': 1}]
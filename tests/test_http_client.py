@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+import requests
+
+from benchmarks.stubs import StubServer
+from src.services.http_client import AsyncIntegrationClient, CircuitBreaker, CircuitOpenError, IntegrationClient
+
+class ScriptedStub(StubServer):
+    """Responde na ordem de `responses` (status, cabeçalhos); depois, sempre 200"""
+    name = 'scripted'
+
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+
+    def handle(self, method, path, body, headers):
+        status, response_headers = self.responses.pop(0) if self.responses else (200, {})
+        return status, response_headers, {}
+
+@pytest.fixture
+def server():
+    stub = ScriptedStub().start()
+    yield stub
+    stub.stop()
+
+def client_for(server, **options):
+    options = {'backoff_base': 0.0, 'backoff_max': 1.0, **options}
+    return IntegrationClient('test', base_url=server.url, **options)
+
+def test_retries_server_errors_only_on_idempotent_methods(server):
+    client = client_for(server)
+    server.responses = [(503, {}), (502, {})]
+    assert client.get('/x').status_code == 200
+    assert server.requests['GET /x'] == 3
+
+    server.responses = [(503, {})]
+    assert client.post('/x').status_code == 503
+    assert server.requests['POST /x'] == 1
+
+def test_retry_after_within_cap_is_honored(server):
+    server.responses = [(429, {'Retry-After': '0'})]
+    assert client_for(server).post('/x').status_code == 200
+    assert server.requests['POST /x'] == 2
+
+def test_long_retry_after_returns_to_caller(server):
+    # Retry-After acima de backoff_max: a thread não fica presa, o chamador reagenda
+    server.responses = [(429, {'Retry-After': '120'})]
+    response = client_for(server).post('/x')
+    assert response.status_code == 429
+    assert server.requests['POST /x'] == 1
+
+def test_breaker_opens_after_consecutive_failures(server):
+    client = client_for(server, max_retries=0, breaker_failures=2, breaker_reset=60.0)
+    server.responses = [(500, {}), (500, {})]
+    client.get('/x')
+    client.get('/x')
+    with pytest.raises(CircuitOpenError):
+        client.get('/x')
+    assert server.requests['GET /x'] == 2
+
+def test_connection_errors_are_retried_then_raised():
+    client = IntegrationClient('test', base_url='http://127.0.0.1:9', max_retries=1,
+                               backoff_base=0.0, breaker_failures=10)
+    with pytest.raises(requests.ConnectionError):
+        client.get('/x')
+    _, breaker = client._host_state('http://127.0.0.1:9/x')
+    assert breaker.failures == 2
+
+def test_half_open_allows_a_single_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('src.services.http_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Chamada de teste sem resposta do host: outra pode tentar
+    breaker.release()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+def test_async_client_follows_the_same_policy(server):
+    server.responses = [(503, {}), (429, {'Retry-After': '120'})]
+
+    async def call():
+        client = AsyncIntegrationClient('test', base_url=server.url, backoff_base=0.0, backoff_max=1.0)
+        try:
+            return await client.get('/x')
+        finally:
+            await client.close()
+
+    assert asyncio.run(call()).status_code == 429
+    assert server.requests['GET /x'] == 2
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from PIL import Image
+
+from src.services.image_preprocessing import EXIF_ORIENTATION, ImagePreprocessor
+
+def jpeg(size, dpi, orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    Image.new('RGB', size, (230, 230, 230)).save(buffer, format='JPEG', dpi=(dpi, dpi), exif=exif.tobytes())
+    buffer.seek(0)
+    return Image.open(buffer)
+
+@pytest.mark.parametrize('binarize', ['none', 'otsu', 'adaptive'])
+def test_high_dpi_photo_is_reduced_once(binarize):
+    # 600 DPI -> 300 DPI: metade do tamanho, não um quarto (draft + novo cálculo com o DPI original)
+    image = ImagePreprocessor(binarize=binarize, max_dimension=4000).process(jpeg((4000, 3000), 600))
+    assert image.size == (2000, 1500)
+
+def test_rotated_photo_keeps_target_size():
+    image = ImagePreprocessor(binarize='none', max_dimension=4000).process(jpeg((4000, 3000), 600, orientation=6))
+    assert image.size == (1500, 2000)
+
+def test_max_dimension_caps_low_dpi_photo():
+    image = ImagePreprocessor(binarize='none').process(jpeg((4000, 3000), 72))
+    assert image.size == (2480, 1860)
+
+def test_small_image_is_not_enlarged():
+    image = ImagePreprocessor(binarize='none').process(jpeg((800, 600), 72))
+    assert image.size == (800, 600)
+
+def test_from_config_reads_ocr_keys():
+    assert ImagePreprocessor.from_config({'OCR_PREPROCESS': '0'}) is None
+    preprocessor = ImagePreprocessor.from_config({
+        'OCR_PREPROCESS': 'true', 'OCR_TARGET_DPI': 200, 'OCR_MAX_DIMENSION': 1600,
+        'OCR_BINARIZE': 'otsu', 'OCR_DESKEW': '1', 'OCR_AUTO_ROTATE': '0'
+    })
+    assert (preprocessor.target_dpi, preprocessor.max_dimension, preprocessor.binarize) == (200, 1600, 'otsu')
+    assert preprocessor.deskew and not preprocessor.auto_rotate
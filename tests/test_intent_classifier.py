@@ -0,0 +1,47 @@
+import pytest
+
+from src.services.intent_classifier import get_intent_classifier
+from src.routes.whatsapp import checked_intent
+
+GREETINGS = ['oi', 'olá', 'bom dia', 'boa tarde!', 'olá, tudo bem?', 'oi, bom dia', 'muito obrigado', 'Oi pessoal, tudo bem?']
+
+# Cumprimento no início de um pedido: a resposta fixa de cumprimento ignoraria o pedido
+MIXED = [
+    'bom dia! vocês trabalham com a Unimed?',
+    'boa tarde, quero cancelar',
+    'olá, quero cancelar meu pedido',
+    'oi, preciso falar com um atendente',
+    'bom dia, qual o status do meu reembolso?',
+]
+
+@pytest.mark.parametrize('text', GREETINGS)
+def test_greeting_only_messages_use_fast_path(text):
+    classifier = get_intent_classifier()
+    intent, confidence = classifier.classify(text)
+    assert intent == 'greeting'
+    assert confidence >= classifier.threshold
+    assert classifier.is_greeting(text)
+
+@pytest.mark.parametrize('text', MIXED)
+def test_greeting_before_request_is_not_greeting(text):
+    classifier = get_intent_classifier()
+    intent, _ = classifier.classify(text)
+    assert intent != 'greeting'
+    assert not classifier.is_greeting(text)
+
+def test_status_question_after_greeting_keeps_local_intent():
+    intent, confidence = get_intent_classifier().classify('bom dia, qual o status do meu reembolso?')
+    assert intent == 'status_inquiry'
+    assert confidence >= 0.6
+
+def test_empty_message_has_no_confidence():
+    assert get_intent_classifier().classify('   ') == ('greeting', 0.0)
+
+@pytest.mark.parametrize('text', MIXED)
+def test_llm_greeting_on_mixed_message_becomes_question(text):
+    assert checked_intent(text, 'greeting') == 'general_question'
+
+def test_llm_intent_validation():
+    assert checked_intent('bom dia', 'greeting') == 'greeting'
+    assert checked_intent('qual o prazo?', 'Intenção: prazo') == 'general_question'
+    assert checked_intent('cadê meu reembolso', 'status_inquiry') == 'status_inquiry'
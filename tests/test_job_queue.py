@@ -0,0 +1,131 @@
+import time
+from datetime import datetime, timedelta
+
+from src.models.queue_job import QueueJob
+from src.services.job_queue import (
+    LeaseKeeper, QueueWorkerPool, claim_jobs, complete_job, enqueue_many, fail_job,
+    process_available_jobs, purge_finished_jobs, register_handler, retry_delay
+)
+
+def test_purge_removes_only_old_finished_jobs(db_session):
+    old = datetime.utcnow() - timedelta(days=10)
+    db_session.add_all([
+        QueueJob(queue='test', dedup_key='done-old', payload={}, status='done', updated_at=old),
+        QueueJob(queue='test', dedup_key='failed-old', payload={}, status='failed', updated_at=old),
+        QueueJob(queue='test', dedup_key='pending-old', payload={}, status='pending', updated_at=old),
+        QueueJob(queue='test', dedup_key='done-new', payload={}, status='done'),
+    ])
+    db_session.commit()
+
+    assert purge_finished_jobs(timedelta(days=7), batch_size=1) == 2
+    assert {job.dedup_key for job in QueueJob.query} == {'pending-old', 'done-new'}
+
+def test_worker_pool_purges_once_per_interval(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'QUEUE_PURGE_INTERVAL', 3600)
+    monkeypatch.setitem(app.config, 'QUEUE_RETENTION_DAYS', 7)
+    pool = QueueWorkerPool(app, concurrency=1)
+    assert pool._purge_due()
+    assert not pool._purge_due()
+
+    monkeypatch.setitem(app.config, 'QUEUE_RETENTION_DAYS', 0)
+    assert not QueueWorkerPool(app, concurrency=1)._purge_due()
+
+def test_purge_command(app, db_session):
+    db_session.add(QueueJob(queue='test', payload={}, status='done',
+                            updated_at=datetime.utcnow() - timedelta(days=2)))
+    db_session.commit()
+    result = app.test_cli_runner().invoke(args=['queue-purge', '--days', '1'])
+    assert '1 jobs removidos' in result.output
+    assert QueueJob.query.count() == 0
+
+def test_enqueue_skips_duplicate_keys(db_session):
+    assert enqueue_many('test', [('a', {}), ('a', {}), ('b', {})]) == 2
+    assert enqueue_many('test', [('a', {}), ('c', {})]) == 1
+    assert QueueJob.query.count() == 3
+
+def test_claim_reserves_each_job_once(db_session):
+    enqueue_many('test', [('a', {}), ('b', {})])
+    first = claim_jobs(['test'], limit=1)
+    second = claim_jobs(['test'], limit=5)
+    assert [job.dedup_key for job in first] == ['a']
+    assert [job.dedup_key for job in second] == ['b']
+    assert claim_jobs(['test'], limit=5) == []
+    assert first[0].status == 'processing' and first[0].attempts == 1
+
+def test_failed_job_is_retried_with_backoff(app, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, 'QUEUE_RETRY_BASE_SECONDS', 60)
+    enqueue_many('test', [('a', {})], max_attempts=2)
+    job = claim_jobs(['test'])[0]
+    fail_job(job, RuntimeError('boom'))
+
+    db_session.expire_all()
+    job = QueueJob.query.one()
+    assert job.status == 'pending' and job.last_error == 'boom'
+    assert job.available_at > datetime.utcnow() + timedelta(seconds=25)
+    assert claim_jobs(['test']) == []
+
+    job.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    job = claim_jobs(['test'])[0]
+    fail_job(job, RuntimeError('boom'))
+    db_session.expire_all()
+    assert QueueJob.query.one().status == 'failed'
+
+def test_retry_delay_is_capped(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'QUEUE_RETRY_BASE_SECONDS', 2)
+    monkeypatch.setitem(app.config, 'QUEUE_RETRY_MAX_SECONDS', 10)
+    with app.app_context():
+        assert 1 <= retry_delay(1) <= 2
+        assert all(5 <= retry_delay(20) <= 10 for _ in range(20))
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(db_session):
+    past = datetime.utcnow() - timedelta(seconds=5)
+    db_session.add_all([
+        QueueJob(queue='test', dedup_key='alive', payload={}, status='processing',
+                 attempts=1, max_attempts=3, locked_until=past),
+        QueueJob(queue='test', dedup_key='spent', payload={}, status='processing',
+                 attempts=3, max_attempts=3, locked_until=past),
+    ])
+    db_session.commit()
+    assert [job.dedup_key for job in claim_jobs(['test'], limit=5)] == ['alive']
+    assert QueueJob.query.filter_by(dedup_key='spent').one().status == 'failed'
+
+def test_finish_is_ignored_after_losing_the_lease(db_session):
+    enqueue_many('test', [('a', {})])
+    job = claim_jobs(['test'])[0]
+    lease_until = job.locked_until
+    # Outro worker reservou o job depois que o lease deste venceu
+    QueueJob.query.filter_by(id=job.id).update({'locked_until': datetime.utcnow() + timedelta(hours=1)},
+                                               synchronize_session=False)
+    db_session.commit()
+    complete_job(job, lease_until)
+    db_session.expire_all()
+    assert QueueJob.query.one().status == 'processing'
+
+def test_lease_keeper_renews_while_handler_runs(db_session):
+    enqueue_many('test', [('a', {})])
+    job = claim_jobs(['test'])[0]
+    keeper = LeaseKeeper(job, db_session.get_bind(), lease_seconds=0.3)
+    keeper.start()
+    time.sleep(0.35)
+    keeper.stop()
+    assert keeper.locked_until != job.locked_until
+    # Com o lease renovado, só o prazo atual conclui o job
+    complete_job(job)
+    db_session.expire_all()
+    assert QueueJob.query.one().status == 'processing'
+    complete_job(job, keeper.locked_until)
+    db_session.expire_all()
+    assert QueueJob.query.one().status == 'done'
+
+def test_process_available_jobs_runs_handler(db_session):
+    seen = []
+    register_handler('test_ok', seen.append)
+    register_handler('test_error', lambda payload: 1 / 0)
+    enqueue_many('test_ok', [('ok', {'n': 1})])
+    enqueue_many('test_error', [('error', {'n': 2})])
+
+    assert process_available_jobs(['test_ok', 'test_error'], limit=5) == 2
+    assert seen == [{'n': 1}]
+    db_session.expire_all()
+    assert {job.dedup_key: job.status for job in QueueJob.query} == {'ok': 'done', 'error': 'pending'}
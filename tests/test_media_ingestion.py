@@ -0,0 +1,53 @@
+import threading
+
+from benchmarks.harness import seed_surgeries
+from src.models.document import Document
+from src.models.queue_job import QueueJob
+from src.services import media_ingestion
+
+def media_webhook(phone, message_id, media_id='media-1'):
+    return {'entry': [{'changes': [{'value': {'messages': [{
+        'from': phone, 'id': message_id, 'type': 'image', 'image': {'id': media_id, 'mime_type': 'image/jpeg'}
+    }]}}]}]}
+
+def test_sync_mode_acknowledges_before_ocr(app, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, 'WHATSAPP_INGESTION_MODE', 'sync')
+    monkeypatch.setitem(app.config, 'WHATSAPP_MEDIA_MODE', 'sync')
+    phone = seed_surgeries(app, 1)[0]['phone']
+
+    started, release, finished = threading.Event(), threading.Event(), threading.Event()
+    process_document_ocr = media_ingestion.process_document_ocr
+
+    def blocking_ocr(document):
+        started.set()
+        release.wait(5)
+        process_document_ocr(document)
+        finished.set()
+
+    monkeypatch.setattr(media_ingestion, 'process_document_ocr', blocking_ocr)
+
+    response = app.test_client().post('/api/whatsapp/webhook', json=media_webhook(phone, 'wamid.1'))
+    assert response.status_code == 200
+
+    # A requisição terminou com o OCR ainda bloqueado numa thread em segundo plano
+    assert started.wait(5)
+    db_session.expire_all()
+    document = Document.query.one()
+    assert not document.is_processed
+    assert QueueJob.query.filter_by(queue='document_ocr').count() == 1
+
+    release.set()
+    assert finished.wait(5)
+    db_session.expire_all()
+    assert Document.query.one().is_processed
+
+def test_resent_media_reuses_document(app, db_session):
+    phone = seed_surgeries(app, 1)[0]['phone']
+    first = media_ingestion.ingest_media(phone, {'id': 'media-1'})
+    second = media_ingestion.ingest_media(phone, {'id': 'media-2'})
+    assert first.id == second.id
+    assert QueueJob.query.filter_by(queue='document_ocr').count() == 1
+
+def test_unknown_phone_is_not_ingested(app, db_session):
+    assert media_ingestion.ingest_media('5511900000000', {'id': 'media-1'}) is None
+    assert Document.query.count() == 0
@@ -0,0 +1,39 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from src.services.metrics import integration_timer, record_cache
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_requests_are_measured_by_route_rule(app, db_session):
+    labels = {'blueprint': 'document_file', 'endpoint': '/api/documents/<int:document_id>/file'}
+    before = sample('http_request_duration_seconds_count', method='GET', status='404', **labels)
+    queries = sample('http_request_db_queries_sum', **labels)
+
+    assert app.test_client().get('/api/documents/987654/file').status_code == 404
+    assert sample('http_request_duration_seconds_count', method='GET', status='404', **labels) == before + 1
+    assert sample('http_request_db_queries_sum', **labels) >= queries + 1
+
+def test_metrics_endpoint_requires_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'segredo')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+    assert response.status_code == 200
+    assert b'http_request_duration_seconds' in response.data
+
+def test_integration_timer_labels_exceptions():
+    before = sample('integration_request_duration_seconds_count', integration='openai', method='test', outcome='ValueError')
+    with pytest.raises(ValueError):
+        with integration_timer('openai', 'test'):
+            raise ValueError('falhou')
+    assert sample('integration_request_duration_seconds_count',
+                  integration='openai', method='test', outcome='ValueError') == before + 1
+
+def test_cache_hits_and_misses():
+    hits = sample('cache_requests_total', cache='test', result='hit')
+    record_cache('test', True)
+    record_cache('test', False)
+    assert sample('cache_requests_total', cache='test', result='hit') == hits + 1
+    assert sample('cache_requests_total', cache='test', result='miss') >= 1
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from src.models.document import Document
+from src.models.ocr_cache_entry import OCRCacheEntry
+from src.services import ocr_cache
+from src.services.image_preprocessing import ImagePreprocessor
+from src.services.ocr_service import IncompleteOCR, OCRService, get_pdf_pool, shutdown_pdf_pool
+
+def test_lookup_counts_hits_and_duplicate_store_is_ignored(db_session):
+    ocr_cache.store('a' * 64, 'cfg', 'texto', 'cnh', 10)
+    ocr_cache.store('a' * 64, 'cfg', 'outro texto', 'guide', 10)
+    db_session.commit()
+
+    assert ocr_cache.lookup('a' * 64, 'cfg') == ('texto', 'cnh')
+    assert ocr_cache.lookup('a' * 64, 'other-cfg') is None
+    db_session.commit()
+    assert OCRCacheEntry.query.one().hits == 1
+
+def test_evict_removes_least_recently_used(db_session):
+    now = datetime.utcnow()
+    for index, name in enumerate(['old', 'middle', 'new']):
+        ocr_cache.store(name, 'cfg', 'x' * 100, 'other', 10)
+        OCRCacheEntry.query.filter_by(content_hash=name).update({'last_used_at': now + timedelta(minutes=index)})
+    db_session.commit()
+
+    ocr_cache.evict(max_bytes=150, batch_size=1)
+    db_session.commit()
+    assert [entry.content_hash for entry in OCRCacheEntry.query] == ['new']
+
+def test_invalidate_keeps_current_configuration(db_session):
+    ocr_cache.store('a', 'current', 'x', 'other', 1)
+    ocr_cache.store('b', 'stale', 'x', 'other', 1)
+    db_session.commit()
+    assert ocr_cache.invalidate(keep_config_key='current') == 1
+    assert ocr_cache.invalidate() == 1
+
+def test_fingerprint_follows_ocr_configuration(app):
+    with app.app_context():
+        base = OCRService(pdf_dpi=200).cache_fingerprint()
+        assert OCRService(pdf_dpi=200).cache_fingerprint() == base
+        assert OCRService(pdf_dpi=300).cache_fingerprint() != base
+        assert OCRService(pdf_dpi=200, preprocessor=ImagePreprocessor()).cache_fingerprint() != base
+
+def test_process_document_reuses_cached_result(app, db_session, stubs, tmp_path):
+    path = tmp_path / 'cnh.png'
+    path.write_bytes(b'same bytes')
+    ocr_requests = lambda: sum(stubs['ocr'].requests.values())
+    service = OCRService()
+
+    before = ocr_requests()
+    first = Document(id=1, file_path=str(path), document_type='other')
+    service.process_document(first)
+    db_session.commit()
+    second = Document(id=2, file_path=str(path), document_type='other')
+    service.process_document(second)
+
+    assert ocr_requests() == before + 1
+    assert second.ocr_text == first.ocr_text and second.is_processed
+    assert OCRCacheEntry.query.one().hits == 1
+
+def test_incomplete_ocr_is_not_cached(app, db_session, monkeypatch, tmp_path):
+    path = tmp_path / 'guia.pdf'
+    path.write_bytes(b'%PDF')
+    service = OCRService()
+
+    def extract(file_path):
+        raise IncompleteOCR('parcial', [2])
+
+    monkeypatch.setattr(service, '_extract', extract)
+
+    document = Document(id=1, file_path=str(path), document_type='other')
+    service.process_document(document)
+    assert document.ocr_text == 'parcial' and '2' in document.validation_notes
+    assert OCRCacheEntry.query.count() == 0
+
+def test_pdf_pool_is_shared_until_shutdown():
+    pool = get_pdf_pool(1)
+    try:
+        assert get_pdf_pool(1) is pool
+    finally:
+        shutdown_pdf_pool()
+    assert get_pdf_pool(1) is not pool
+    shutdown_pdf_pool()
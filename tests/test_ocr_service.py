@@ -0,0 +1,64 @@
+import pytest
+
+from src.services import ocr_service
+from src.services.ocr_service import IncompleteOCR, OCRService
+
+def test_pdf_settings_come_from_app_config(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'OCR_PDF_PROCESSES', 3)
+    monkeypatch.setitem(app.config, 'OCR_PAGE_TIMEOUT', 15)
+    monkeypatch.setitem(app.config, 'OCR_PDF_MAX_PAGES', 7)
+    monkeypatch.setitem(app.config, 'OCR_PDF_DPI', 150)
+    with app.app_context():
+        service = OCRService()
+    assert (service.pdf_processes, service.page_timeout, service.max_pages, service.pdf_dpi) == (3, 15, 7, 150)
+
+def test_pdf_settings_fall_back_to_environment(monkeypatch):
+    monkeypatch.setenv('OCR_PDF_MAX_PAGES', '4')
+    assert OCRService().max_pages == 4
+
+def test_preprocessing_follows_app_config(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'OCR_PREPROCESS', '1')
+    monkeypatch.setitem(app.config, 'OCR_BINARIZE', 'otsu')
+    with app.app_context():
+        assert OCRService().preprocessor.binarize == 'otsu'
+        monkeypatch.setitem(app.config, 'OCR_PREPROCESS', '0')
+        assert OCRService().preprocessor is None
+
+@pytest.fixture
+def scanned_pdf(monkeypatch, tmp_path):
+    """PDF de 4 páginas sem Poppler/Tesseract: OCR de cada página vem de `pages` (texto ou exceção)"""
+    import pdf2image
+
+    pages = {}
+    monkeypatch.setenv('OCR_PROVIDER', 'tesseract')
+    monkeypatch.setattr(pdf2image, 'pdfinfo_from_path', lambda path: {'Pages': len(pages)})
+
+    def ocr_page(pdf_path, page_number, *args):
+        result = pages[page_number]
+        if isinstance(result, Exception):
+            raise result
+        return result, 0.01
+
+    monkeypatch.setattr(ocr_service, '_ocr_pdf_page', ocr_page)
+    path = tmp_path / 'guia.pdf'
+    path.write_bytes(b'%PDF')
+    return str(path), pages
+
+def test_pdf_pages_are_joined_in_order(scanned_pdf):
+    path, pages = scanned_pdf
+    pages.update({1: 'página 1', 2: 'página 2', 3: '', 4: 'página 4'})
+    assert OCRService(pdf_processes=1)._extract(path) == 'página 1\n\npágina 2\n\npágina 4'
+    assert OCRService(pdf_processes=1, max_pages=2)._extract(path) == 'página 1\n\npágina 2'
+
+def test_failed_pages_keep_the_partial_text(scanned_pdf):
+    path, pages = scanned_pdf
+    pages.update({1: 'página 1', 2: RuntimeError('timeout'), 3: 'página 3'})
+    with pytest.raises(IncompleteOCR) as error:
+        OCRService(pdf_processes=1)._extract(path)
+    assert error.value.failed_pages == [2]
+    assert error.value.text == 'página 1\n\npágina 3'
+
+    # Texto parcial devolvido por extract_text; só falha quando nenhuma página foi lida
+    assert OCRService(pdf_processes=1).extract_text(path) == 'página 1\n\npágina 3'
+    pages.update({1: RuntimeError('x'), 3: RuntimeError('x')})
+    assert OCRService(pdf_processes=1).extract_text(path).startswith('Erro ao processar OCR')
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from src.models.surgery import Surgery, normalize_phone
+
+@pytest.mark.parametrize('phone', [
+    '(11) 98765-4321', '11 98765-4321', '+55 11 98765-4321', '5511987654321', '551187654321',
+    '0055 11 98765-4321', '011 98765-4321',
+])
+def test_phone_formats_share_one_key(phone):
+    assert normalize_phone(phone) == '551187654321'
+
+def test_landlines_and_empty_values():
+    assert normalize_phone('(11) 3333-4444') == '551133334444'
+    assert normalize_phone('') is None
+    assert normalize_phone('sem telefone') is None
+
+def surgery(name, phone, date):
+    return Surgery(patient_name=name, patient_cpf='000.000.000-00', patient_phone=phone, surgery_type='Catarata',
+                   surgery_date=date, doctor_name='Dr. A', hospital_name='H', insurance_company='Plano')
+
+def test_latest_for_phone_picks_most_recent_surgery(db_session):
+    db_session.add_all([
+        surgery('Recente', '(11) 98765-4321', datetime(2026, 5, 1)),
+        surgery('Antiga', '11987654321', datetime(2025, 5, 1)),
+        surgery('Outro', '(21) 98765-4321', datetime(2026, 6, 1)),
+    ])
+    db_session.commit()
+    # wa_id do WhatsApp no formato antigo, sem o nono dígito
+    assert Surgery.latest_for_phone('551187654321').patient_name == 'Recente'
+    assert Surgery.latest_for_phone('5531999999999') is None
+
+def test_phone_change_updates_normalized_column(db_session):
+    patient = surgery('A', '(11) 98765-4321', datetime(2026, 5, 1))
+    db_session.add(patient)
+    db_session.commit()
+    patient.patient_phone = '(21) 91234-5678'
+    db_session.commit()
+    assert Surgery.latest_for_phone('21912345678').id == patient.id
+
+def test_lookup_uses_phone_index(db_session):
+    plan = db_session.execute(text(
+        'EXPLAIN QUERY PLAN SELECT id FROM surgeries WHERE patient_phone_normalized = :phone '
+        'ORDER BY surgery_date DESC, id DESC LIMIT 1'), {'phone': '551187654321'}).all()
+    assert any('ix_surgeries_phone_date' in str(row) for row in plan)
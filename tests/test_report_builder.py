@@ -0,0 +1,112 @@
+import threading
+from datetime import datetime, timedelta
+
+from benchmarks.harness import seed_surgeries
+from src.models.surgery import Surgery
+from src.services.report_builder import ReportBuilder, aggregate_period, aggregate_rows, render_chunks
+
+class FakeAIService:
+    """Resumos determinísticos no lugar do LLM, contando as chamadas"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunks = 0
+        self.merges = 0
+
+    def summarize_report_chunk(self, overview, chunk, final=True):
+        with self.lock:
+            self.chunks += 1
+        return f'parte({chunk.count(chr(10)) + 1})', 10
+
+    def merge_report_summaries(self, overview, partials, final=True):
+        with self.lock:
+            self.merges += 1
+        return '+'.join(partials), 5
+
+def test_from_config_reads_report_keys(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'REPORT_CHUNK_GROUPS', 12)
+    monkeypatch.setitem(app.config, 'REPORT_SUMMARY_CONCURRENCY', 2)
+    builder = ReportBuilder.from_config(FakeAIService(), app.config)
+    assert (builder.max_groups, builder.concurrency) == (12, 2)
+
+def test_database_aggregation_matches_row_aggregation(app, db_session):
+    seed_surgeries(app, 300)
+    now = datetime.utcnow()
+    period = aggregate_period(now - timedelta(days=800), now + timedelta(days=1))
+    rows = aggregate_rows([surgery.to_dict(include_documents=False) for surgery in Surgery.query.all()])
+    assert period['totals']['count'] == rows['totals']['count'] == 300
+    assert period['totals']['reimbursement_total'] == rows['totals']['reimbursement_total']
+    for name in ('by_status', 'by_insurance', 'by_hospital', 'by_type', 'by_amount_bucket'):
+        assert [(group['key'], group['count']) for group in period[name]] == \
+            [(group['key'], group['count']) for group in rows[name]]
+
+def test_summary_is_map_reduced_over_chunks():
+    aggregates = aggregate_rows([
+        {'status': 'pending', 'insurance_company': f'Convênio {i}', 'hospital_name': 'Hospital',
+         'surgery_type': 'Catarata', 'reimbursement_amount': 100.0 * i}
+        for i in range(40)
+    ])
+    ai_service = FakeAIService()
+    builder = ReportBuilder(ai_service, max_groups=5, merge_fanout=3)
+    summary, usage = builder.summarize(aggregates)
+
+    chunks = render_chunks(aggregates, 5)
+    assert len(chunks) > 3
+    assert ai_service.chunks == len(chunks)
+    assert ai_service.merges >= 2
+    assert usage['calls'] == ai_service.chunks + ai_service.merges
+    assert summary.count('parte(') == len(chunks)
+
+def test_small_report_uses_single_call():
+    ai_service = FakeAIService()
+    summary, usage = ReportBuilder(ai_service).summarize(aggregate_rows([{'status': 'pending', 'reimbursement_amount': 10.0}]))
+    assert (ai_service.chunks, ai_service.merges, usage['calls']) == (1, 0, 1)
+
+def surgery(name, date, amount=100.0, status='pending'):
+    return Surgery(patient_name=name, patient_cpf='000.000.000-00', patient_phone='5511911111111',
+                   surgery_type='Catarata', surgery_date=date, doctor_name='Dr. A', hospital_name='H',
+                   insurance_company='Plano', reimbursement_amount=amount, status=status)
+
+def test_period_report_is_reused_and_refreshed_by_day(db_session):
+    start, end = datetime(2026, 3, 1), datetime(2026, 4, 1)
+    db_session.add_all([surgery('A', datetime(2026, 3, 2)), surgery('B', datetime(2026, 3, 5), status='approved')])
+    db_session.commit()
+    ai_service = FakeAIService()
+    builder = ReportBuilder(ai_service)
+
+    report, state = builder.get_or_build('monthly', 'Março', start, end)
+    db_session.commit()
+    assert state == 'created' and ai_service.chunks == 1
+
+    assert builder.get_or_build('monthly', 'Março', start, end) == (report, 'cached')
+    assert ai_service.chunks == 1
+
+    changed = Surgery.query.filter_by(patient_name='B').one()
+    changed.reimbursement_amount = 300.0
+    db_session.add(surgery('C', datetime(2026, 3, 9)))
+    db_session.delete(Surgery.query.filter_by(patient_name='A').one())
+    db_session.commit()
+
+    report, state = builder.get_or_build('monthly', 'Março', start, end)
+    db_session.commit()
+    assert state == 'refreshed' and ai_service.chunks == 2
+    assert sorted(report.data['days']) == ['2026-03-05', '2026-03-09']
+    expected = aggregate_period(start, end)
+    assert report.data['totals'] == expected['totals']
+    assert report.data['by_status'] == expected['by_status']
+
+def test_touched_rows_without_new_totals_skip_the_llm(db_session):
+    start, end = datetime(2026, 3, 1), datetime(2026, 4, 1)
+    db_session.add(surgery('A', datetime(2026, 3, 2)))
+    db_session.commit()
+    ai_service = FakeAIService()
+    builder = ReportBuilder(ai_service)
+    builder.get_or_build('monthly', 'Março', start, end)
+    db_session.commit()
+
+    # Campo fora dos agregados: o dia é reagregado, mas o resumo é reaproveitado
+    Surgery.query.one().doctor_name = 'Dr. B'
+    db_session.commit()
+    report, state = builder.get_or_build('monthly', 'Março', start, end)
+    assert state == 'refreshed' and ai_service.chunks == 1
+    assert report.data['llm_usage']['calls'] == 0
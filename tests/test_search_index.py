@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+from src.models.document import Document
+from src.models.surgery import Surgery
+from src.services.search_index import reindex, search, stem
+
+@pytest.fixture
+def index(db_session):
+    # O esvaziamento das tabelas entre testes não passa pelo ORM: o índice é limpo aqui
+    reindex()
+    return db_session
+
+def surgery(name, cpf='111.111.111-11', hospital='Hospital São Lucas', date=datetime(2026, 3, 1)):
+    return Surgery(patient_name=name, patient_cpf=cpf, patient_phone='5511911111111', surgery_type='Catarata',
+                   surgery_date=date, doctor_name='Dra. Ribeiro', hospital_name=hospital, insurance_company='Unimed')
+
+def names(result):
+    return [item['surgery']['patient_name'] for item in result['items']]
+
+def test_accents_plurals_prefixes_and_cpf(index):
+    index.add_all([surgery('João Conceição', cpf='123.456.789-09'), surgery('Maria Souza')])
+    index.commit()
+
+    assert names(search('joao conceicoes')) == ['João Conceição']
+    assert search('ribei')['total'] == 2
+    assert names(search('123.456.789-09')) == ['João Conceição']
+    assert search('maria joao')['total'] == 0
+
+def test_index_follows_updates_and_deletes(index):
+    patient = surgery('Ana Lima')
+    index.add(patient)
+    index.commit()
+
+    patient.hospital_name = 'Hospital Santa Clara'
+    index.commit()
+    assert search('lucas')['total'] == 0
+    assert names(search('santa clara')) == ['Ana Lima']
+
+    index.delete(patient)
+    index.commit()
+    assert search('ana')['total'] == 0
+
+def test_document_hits_come_with_snippet(index):
+    patient = surgery('Ana Lima')
+    index.add(patient)
+    index.flush()
+    index.add(Document(surgery_id=patient.id, document_type='medical_report', file_name='laudo.pdf',
+                       file_path='/tmp/laudo.pdf', file_size=1, mime_type='application/pdf',
+                       ocr_text='Relatório médico. Impressão diagnóstica: catarata senil bilateral.'))
+    index.commit()
+
+    result = search('senil', kind='document')
+    assert result['total'] == 1
+    item = result['items'][0]
+    assert item['type'] == 'document' and 'senil' in item['snippet']
+    assert 'ocr_text' not in item['document']
+    assert search('senil', kind='surgery')['total'] == 0
+
+def test_wide_search_ranks_a_window_and_pages(index):
+    index.add_all([surgery(f'Paciente {n}', date=datetime(2026, 1, n + 1)) for n in range(5)])
+    index.commit()
+
+    first = search('paciente', per_page=2, window=3)
+    assert first['total'] == 5 and len(first['items']) == 2
+    last = search('paciente', page=3, per_page=2, window=3)
+    assert len(last['items']) == 1
+
+def test_reindex_rebuilds_from_tables(index):
+    index.add(surgery('Ana Lima'))
+    index.commit()
+    assert reindex() == (1, 0)
+    assert search('ana')['total'] == 1
+
+def test_stem():
+    assert stem('hospitais') == 'hospital'
+    assert stem('analise') == 'analise'
+    assert stem('rapidamente') == 'rapida'
+
+def test_search_route_validates_parameters(app, index):
+    client = app.test_client()
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=ana&type=user').status_code == 400
+    assert client.get('/api/search?q=ana').get_json()['total'] == 0
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+from src.models.surgery import Surgery
+from src.services.session_store import (
+    DatabaseSessionBackend, MemorySessionBackend, SessionStore, extract_cpf, remember_cpf, session_surgery
+)
+
+PHONE = '+55 (11) 91111-1111'
+
+@pytest.fixture(params=['memory', 'database'])
+def store(request, db_session):
+    backend = MemorySessionBackend() if request.param == 'memory' else DatabaseSessionBackend()
+    return SessionStore(backend, max_turns=4)
+
+def test_concurrent_save_is_rejected(store):
+    first = store.load(PHONE)
+    second = store.load(PHONE)
+    assert store.save(first)
+    assert not store.save(second)
+    assert store.load(PHONE)['version'] == 1
+
+def test_record_turn_reapplies_over_newer_version(store):
+    first = store.load(PHONE)
+    second = store.load(PHONE)
+    store.record_turn(first, 'oi', 'olá')
+    saved = store.record_turn(second, 'status?', 'em análise', intent='status_inquiry')
+
+    assert [turn['content'] for turn in saved['turns']] == ['oi', 'olá', 'status?', 'em análise']
+    assert store.load(PHONE)['last_intent'] == 'status_inquiry'
+
+def test_turn_window_is_limited(store):
+    session = store.load(PHONE)
+    for index in range(3):
+        session = store.record_turn(session, f'pergunta {index}', f'resposta {index}')
+    assert [turn['content'] for turn in store.load(PHONE)['turns']] == [
+        'pergunta 1', 'resposta 1', 'pergunta 2', 'resposta 2']
+
+def test_same_phone_in_other_formats_shares_the_session(store):
+    store.record_turn(store.load(PHONE), 'oi', 'olá')
+    assert store.load('5511911111111')['turns']
+
+def surgery(name, cpf, phone, date):
+    return Surgery(patient_name=name, patient_cpf=cpf, patient_phone=phone, surgery_type='Catarata',
+                   surgery_date=date, doctor_name='Dr. A', hospital_name='H', insurance_company='Plano')
+
+def test_cpf_only_chooses_among_the_phone_surgeries(db_session):
+    db_session.add_all([
+        surgery('Mãe', '111.111.111-11', PHONE, datetime(2026, 1, 1)),
+        surgery('Filho', '222.222.222-22', PHONE, datetime(2025, 1, 1)),
+        surgery('Outro', '333.333.333-33', '5521999999999', datetime(2026, 5, 1)),
+    ])
+    db_session.commit()
+    session = SessionStore(MemorySessionBackend()).load(PHONE)
+
+    assert session_surgery(session).patient_name == 'Mãe'
+    assert remember_cpf(session, 'meu cpf é 222.222.222-22') == '22222222222'
+    assert session['surgery_ids'] == []
+    assert session_surgery(session).patient_name == 'Filho'
+
+    # CPF de outro número não dá acesso à cirurgia dele
+    remember_cpf(session, 'cpf 33333333333')
+    assert session_surgery(session).patient_name == 'Mãe'
+
+def test_extract_cpf():
+    assert extract_cpf('CPF: 123.456.789-09, obrigado') == '12345678909'
+    assert extract_cpf('protocolo 1234567890912') is None
+    assert extract_cpf(None) is None
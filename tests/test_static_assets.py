@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+from flask import request
+
+from src.services.static_assets import IMMUTABLE_CACHE_CONTROL, StaticManifest, precompress
+
+BUNDLE = b'console.log("reverse mci");\n' * 200
+
+@pytest.fixture
+def static_root(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'index-BQh2Gyyx.js').write_bytes(BUNDLE)
+    (tmp_path / 'index.html').write_text('<!doctype html><div id="root"></div>')
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' + bytes(4000))
+    return tmp_path
+
+def serve(app, manifest, path, **headers):
+    with app.test_request_context(headers=headers):
+        return manifest.response(manifest.get(path), request)
+
+def test_precompress_writes_gzip_once(static_root):
+    assert precompress(str(static_root)) >= 1
+    assert gzip.decompress((static_root / 'assets' / 'index-BQh2Gyyx.js.gz').read_bytes()) == BUNDLE
+    assert not (static_root / 'logo.png.gz').exists()
+    assert not (static_root / 'index.html.gz').exists()  # Menor que min_size
+    # Variantes mais novas que o original não são refeitas
+    assert precompress(str(static_root)) == 0
+
+def test_encoding_is_negotiated_with_strong_etags(app, static_root):
+    precompress(str(static_root))
+    manifest = StaticManifest.build(str(static_root))
+    assert 'assets/index-BQh2Gyyx.js.gz' not in manifest.assets
+
+    compressed = serve(app, manifest, 'assets/index-BQh2Gyyx.js', **{'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(compressed.get_data()) == BUNDLE
+
+    plain = serve(app, manifest, 'assets/index-BQh2Gyyx.js')
+    assert 'Content-Encoding' not in plain.headers and plain.get_data() == BUNDLE
+    assert plain.headers['ETag'] != compressed.headers['ETag']
+
+    revalidated = serve(app, manifest, 'assets/index-BQh2Gyyx.js',
+                        **{'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304 and revalidated.get_data() == b''
+
+def test_cache_policy_per_file(app, static_root):
+    manifest = StaticManifest.build(str(static_root), max_age=600)
+    assert manifest.index is manifest.get('index.html')
+    assert manifest.get('index.html').cache_control == 'no-cache'
+    assert manifest.get('logo.png').cache_control == 'public, max-age=600'
+
+def test_large_files_are_streamed_from_disk(app, static_root):
+    manifest = StaticManifest.build(str(static_root), memory_max_bytes=1024)
+    asset = manifest.get('assets/index-BQh2Gyyx.js')
+    assert asset.original.content is None
+    response = serve(app, manifest, 'assets/index-BQh2Gyyx.js')
+    response.direct_passthrough = False
+    assert response.get_data() == BUNDLE
+    response.close()
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from src.models.document import Document
+from src.models.surgery import Surgery
+
+def add_surgeries(db_session, count, documents_each=2):
+    for index in range(count):
+        surgery = Surgery(patient_name=f'Paciente {index}', patient_cpf='000.000.000-00',
+                          patient_phone='5511911111111', surgery_type='Catarata',
+                          surgery_date=datetime(2026, 1, index + 1), doctor_name='Dr. A',
+                          hospital_name='H', insurance_company='Plano')
+        surgery.documents = [
+            Document(document_type='cnh' if n == 0 else 'guide', file_name=f'{n}.pdf', file_path=f'/tmp/{n}.pdf',
+                     file_size=1, mime_type='application/pdf', ocr_text='texto longo do OCR')
+            for n in range(documents_each)
+        ]
+        db_session.add(surgery)
+    db_session.commit()
+    db_session.expire_all()
+
+@pytest.fixture
+def statements(db_session):
+    executed = []
+    engine = db_session.get_bind()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+@pytest.mark.parametrize('count', [1, 8])
+def test_list_page_uses_fixed_number_of_queries(db_session, statements, count):
+    add_surgeries(db_session, count)
+    statements.clear()
+    page = Surgery.list_page(per_page=20)
+
+    assert len(statements) == 3  # count, página e resumo dos documentos
+    assert not any('ocr_text' in statement for statement in statements)
+    assert page['total'] == count
+    assert page['items'][0]['document_count'] == 2
+    assert page['items'][0]['document_types'] == {'cnh': 1, 'guide': 1}
+    assert 'documents' not in page['items'][0]
+
+def test_list_page_with_documents_loads_them_in_one_query(db_session, statements):
+    add_surgeries(db_session, 5)
+    statements.clear()
+    page = Surgery.list_page(fields='patient_name,documents')
+
+    assert len(statements) == 3  # count, página e documentos (SELECT ... IN)
+    assert set(page['items'][0]) == {'id', 'patient_name', 'documents'}
+    assert len(page['items'][0]['documents']) == 2
+
+def test_list_page_orders_and_paginates(db_session):
+    add_surgeries(db_session, 5, documents_each=0)
+    page = Surgery.list_page(page=2, per_page=2, fields='patient_name,document_count')
+    assert [item['patient_name'] for item in page['items']] == ['Paciente 2', 'Paciente 1']
+    assert page['items'][0]['document_count'] == 0
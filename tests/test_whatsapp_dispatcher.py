@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from src.models.outbound_message import OutboundMessage
+from src.services.whatsapp_dispatcher import (
+    WhatsAppDispatcher, claim_messages, enqueue_messages, finish_message, text_payload
+)
+
+SEND_ROUTE = 'POST /{id}/messages'
+
+def test_claims_one_message_per_phone_in_order(db_session):
+    enqueue_messages([('5511911111111', text_payload('1')), ('5511911111111', text_payload('2')),
+                      ('5511922222222', text_payload('3'))])
+    claimed = claim_messages(10)
+    assert [message['payload']['text']['body'] for message in claimed] == ['1', '3']
+    # A segunda mensagem do telefone só sai depois que a primeira terminar
+    assert claim_messages(10) == []
+
+    finish_message(claimed[0], status='sent')
+    assert [message['payload']['text']['body'] for message in claim_messages(10)] == ['2']
+
+def test_stale_lease_on_last_attempt_fails(db_session):
+    past = datetime.utcnow() - timedelta(seconds=5)
+    db_session.add_all([
+        OutboundMessage(phone='1', payload={}, status='sending', attempts=5, max_attempts=5, locked_until=past),
+        OutboundMessage(phone='2', payload={}, status='sending', attempts=2, max_attempts=5, locked_until=past),
+    ])
+    db_session.commit()
+    assert [message['phone'] for message in claim_messages(10)] == ['2']
+    assert OutboundMessage.query.filter_by(phone='1').one().status == 'failed'
+
+def test_delivers_and_records_wamid(app, db_session, stubs):
+    sent = stubs['whatsapp'].requests[SEND_ROUTE]
+    enqueue_messages([('5511911111111', text_payload('oi'))])
+    message = claim_messages(1)[0]
+    WhatsAppDispatcher(app)._deliver(message)
+    db_session.expire_all()
+    row = OutboundMessage.query.one()
+    assert row.status == 'sent' and row.wa_message_id
+    assert stubs['whatsapp'].requests[SEND_ROUTE] == sent + 1
+
+def test_lost_lease_skips_send(app, db_session, stubs):
+    enqueue_messages([('5511911111111', text_payload('oi'))])
+    message = claim_messages(1, lease_seconds=-1)[0]
+    # Enquanto este envio esperava o balde, o lease venceu e outro dispatcher reservou a mensagem
+    assert claim_messages(1)[0]['id'] == message['id']
+
+    sent = stubs['whatsapp'].requests[SEND_ROUTE]
+    WhatsAppDispatcher(app)._deliver(message)
+    assert stubs['whatsapp'].requests[SEND_ROUTE] == sent
+    db_session.expire_all()
+    assert OutboundMessage.query.one().status == 'sending'
+
+def test_rate_limit_pauses_bucket_and_requeues(app, db_session, stubs, monkeypatch):
+    whatsapp = stubs['whatsapp']
+    monkeypatch.setattr(whatsapp, 'handle', lambda method, path, body, headers: (429, {'Retry-After': '7'}, {}))
+    enqueue_messages([('5511911111111', text_payload('oi'))])
+    message = claim_messages(1)[0]
+    dispatcher = WhatsAppDispatcher(app)
+    dispatcher._deliver(message)
+
+    assert dispatcher.bucket.tokens == 0
+    db_session.expire_all()
+    row = OutboundMessage.query.one()
+    assert row.status == 'queued'
+    assert row.available_at >= datetime.utcnow() + timedelta(seconds=6)
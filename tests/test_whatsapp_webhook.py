@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from src.models.queue_job import QueueJob
+from src.services.ai_service import GREETING_RESPONSE
+from src.services.job_queue import process_available_jobs
+
+def text_webhook(*messages):
+    return {'entry': [{'changes': [{'value': {'messages': [
+        {'from': phone, 'id': message_id, 'type': 'text', 'text': {'body': body}}
+        for phone, message_id, body in messages
+    ]}}]}]}
+
+@pytest.fixture
+def sent(stubs, monkeypatch):
+    """Corpos das mensagens enviadas ao stub do WhatsApp, na ordem de chegada"""
+    whatsapp = stubs['whatsapp']
+    handle = whatsapp.handle
+    bodies = []
+
+    def recording(method, path, body, headers):
+        if method == 'POST' and path.endswith('/messages'):
+            payload = json.loads(body)
+            bodies.append((payload['to'], payload['text']['body']))
+        return handle(method, path, body, headers)
+
+    monkeypatch.setattr(whatsapp, 'handle', recording)
+    return bodies
+
+def test_queue_mode_acknowledges_and_deduplicates(app, db_session, sent, monkeypatch):
+    monkeypatch.setitem(app.config, 'WHATSAPP_INGESTION_MODE', 'queue')
+    client = app.test_client()
+    delivery = text_webhook(('5511911111111', 'wamid.1', 'oi'))
+
+    assert client.post('/api/whatsapp/webhook', json=delivery).status_code == 200
+    # Reentrega da mesma mensagem pela Meta
+    assert client.post('/api/whatsapp/webhook', json=delivery).status_code == 200
+    assert sent == []
+    assert QueueJob.query.filter_by(queue='whatsapp_inbound').count() == 1
+
+    assert process_available_jobs(['whatsapp_inbound']) == 1
+    assert sent == [('5511911111111', GREETING_RESPONSE)]
+    db_session.expire_all()
+    assert QueueJob.query.one().status == 'done'
+
+def test_failed_reply_is_retried(app, db_session, stubs, monkeypatch):
+    monkeypatch.setitem(app.config, 'WHATSAPP_INGESTION_MODE', 'queue')
+    app.test_client().post('/api/whatsapp/webhook', json=text_webhook(('5511911111111', 'wamid.2', 'oi')))
+    monkeypatch.setattr(stubs['whatsapp'], 'handle', lambda method, path, body, headers: (400, {}, {}))
+
+    process_available_jobs(['whatsapp_inbound'])
+    db_session.expire_all()
+    job = QueueJob.query.one()
+    assert job.status == 'pending' and job.attempts == 1
+    assert 'WhatsApp' in job.last_error
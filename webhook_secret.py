@@ -0,0 +1,28 @@
+from datetime import datetime
+from src.models.user import db
+
+class WebhookSecret(db.Model):
+    """Segredo recebido no handshake de um webhook (ex.: X-Hook-Secret do Asana)"""
+    __tablename__ = 'webhook_secrets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50), nullable=False, unique=True)  # asana
+    secret = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def get_secret(cls, provider):
+        entry = cls.query.filter_by(provider=provider).first()
+        return entry.secret if entry else None
+
+    @classmethod
+    def set_secret(cls, provider, secret):
+        """Gravar (ou substituir) o segredo do provedor; o chamador faz o commit"""
+        entry = cls.query.filter_by(provider=provider).first()
+        if entry is None:
+            entry = cls(provider=provider, secret=secret)
+            db.session.add(entry)
+        else:
+            entry.secret = secret
+        return entry
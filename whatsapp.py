@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify, current_app
-import requests
 import json
 from src.models.user import db
-from src.models.surgery import Surgery
-from src.services.ai_service import AIService
+from src.services.ai_service import GREETING_RESPONSE, get_ai_service
+from src.services.async_runner import get_async_runner
+from src.services.intent_classifier import INTENTS, get_intent_classifier
+from src.services.job_queue import enqueue_many, register_handler
+from src.services.http_client import get_client
+from src.services.metrics import record_error
+from src.services.session_store import get_session_store, remember_cpf, session_surgery, surgery_context
+from src.services.media_ingestion import MediaTooLarge, ingest_media, start_background_ocr  # Registra também os handlers das filas whatsapp_media e document_ocr
+from src.services.whatsapp_dispatcher import apply_delivery_statuses, enqueue_messages, template_payload, text_payload
+from src.models.outbound_message import OutboundMessage
 
 whatsapp_bp = Blueprint('whatsapp', __name__)
 
@@ -23,101 +30,223 @@ def handle_webhook():
     try:
         data = request.get_json()
         
+        value = data.get('entry', [{}])[0].get('changes', [{}])[0].get('value', {})
+        
+        # Status de entrega das mensagens enviadas (sent, delivered, read, failed)
+        if 'statuses' in value:
+            apply_delivery_statuses(value['statuses'])
+        
         # Processar mensagens recebidas
-        if 'messages' in data.get('entry', [{}])[0].get('changes', [{}])[0].get('value', {}):
-            messages = data['entry'][0]['changes'][0]['value']['messages']
+        if 'messages' in value:
+            messages = value['messages']
             
-            for message in messages:
-                phone_number = message['from']
-                message_type = message['type']
-                
-                if message_type == 'text':
-                    text_content = message['text']['body']
-                    response = process_text_message(phone_number, text_content)
-                    send_whatsapp_message(phone_number, response)
-                
-                elif message_type in ['image', 'document']:
-                    media_id = message[message_type]['id']
-                    response = process_media_message(phone_number, media_id, message_type)
-                    send_whatsapp_message(phone_number, response)
+            ingestion_mode = current_app.config.get('WHATSAPP_INGESTION_MODE')
+            if ingestion_mode == 'queue':
+                # Apenas persistir na fila e responder imediatamente; os workers processam depois
+                enqueue_many('whatsapp_inbound', [
+                    (f"whatsapp:{message['id']}" if message.get('id') else None, message)
+                    for message in messages
+                ])
+            elif ingestion_mode == 'async':
+                # Responder imediatamente; o loop do processo atende telefones diferentes em paralelo
+                runner = get_async_runner()
+                for message in messages:
+                    runner.submit(message['from'], process_incoming_message_async, runner, message)
+            else:
+                for message in messages:
+                    process_incoming_message(message)
         
         return jsonify({'status': 'success'}), 200
     
     except Exception as e:
         print(f"Webhook error: {str(e)}")
+        record_error('whatsapp', 'webhook')
         return jsonify({'error': str(e)}), 500
 
+def process_incoming_message(message):
+    """Processar uma mensagem recebida e enviar a resposta; retorna False se o envio falhar"""
+    phone_number = message['from']
+    message_type = message['type']
+    
+    if message_type == 'text':
+        text_content = message['text']['body']
+        response = process_text_message(phone_number, text_content)
+        return send_whatsapp_message(phone_number, response)
+    
+    elif message_type in ['image', 'document']:
+        response = process_media_message(phone_number, message[message_type], message_type)
+        return send_whatsapp_message(phone_number, response)
+    
+    return True
+
+def handle_queued_message(message):
+    """Processar mensagem retirada da fila de entrada (falhas de envio geram nova tentativa)"""
+    if not process_incoming_message(message):
+        raise RuntimeError('Falha ao enviar resposta pelo WhatsApp')
+
+register_handler('whatsapp_inbound', handle_queued_message)
+
+async def process_incoming_message_async(runner, message):
+    """Versão assíncrona de process_incoming_message (WHATSAPP_INGESTION_MODE=async)"""
+    phone_number = message['from']
+    message_type = message['type']
+    
+    if message_type == 'text':
+        response = await process_text_message_async(runner, phone_number, message['text']['body'])
+    elif message_type in ['image', 'document']:
+        response = await runner.run_sync(process_media_message, phone_number, message[message_type], message_type)
+    else:
+        return True
+    
+    return await send_whatsapp_message_async(runner, phone_number, response)
+
+PROCESSING_ERROR_RESPONSE = "Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente em alguns minutos."
+
+def local_intent(text):
+    """Intenção pelo classificador local, ou None quando a confiança é baixa e o LLM deve decidir"""
+    intent, confidence = get_intent_classifier().classify(text)
+    
+    if confidence >= current_app.config.get('INTENT_CONFIDENCE_THRESHOLD', 0.6):
+        return intent
+    return None
+
+def resolve_intent(text, ai_service):
+    """Classificar a intenção localmente; só consulta o LLM quando a confiança é baixa"""
+    intent = local_intent(text)
+    if intent:
+        return intent
+    
+    return checked_intent(text, ai_service.classify_intent(text))
+
+def checked_intent(text, intent):
+    """Intenção vinda do LLM: desconhecida vira pergunta geral, e cumprimento só vale
+    quando a mensagem inteira é um cumprimento (senão a resposta fixa ignoraria o pedido)"""
+    if intent not in INTENTS or (intent == 'greeting' and not get_intent_classifier().is_greeting(text)):
+        return 'general_question'
+    return intent
+
 def process_text_message(phone_number, text):
-    """Processar mensagem de texto usando IA"""
+    """Processar mensagem de texto usando IA e a sessão de conversa do telefone"""
     try:
-        ai_service = AIService()
+        ai_service = get_ai_service()
+        store = get_session_store()
+        session = store.load(phone_number)
         
-        # Verificar se é uma consulta sobre status
-        if any(keyword in text.lower() for keyword in ['status', 'andamento', 'reembolso', 'cirurgia']):
-            # Buscar cirurgias do paciente pelo telefone
-            surgeries = Surgery.query.filter_by(patient_phone=phone_number).all()
-            
-            if surgeries:
-                latest_surgery = surgeries[-1]  # Pegar a mais recente
-                return f"Olá! Sua cirurgia de {latest_surgery.surgery_type} está com status: {latest_surgery.status}. "
-            else:
-                return "Não encontramos nenhuma cirurgia cadastrada para este número. Entre em contato conosco para mais informações."
+        new_cpf = remember_cpf(session, text)
+        intent = resolve_intent(text, ai_service)
+        # Paciente respondeu com o CPF depois de perguntar pelo status
+        if new_cpf and session['last_intent'] == 'status_inquiry':
+            intent = 'status_inquiry'
         
-        # Usar IA para responder outras perguntas
-        response = ai_service.generate_response(text, phone_number)
+        response = answer_text_message(session, text, intent, ai_service)
+        
+        try:
+            store.record_turn(session, text, response, intent, cpf=new_cpf)
+        except Exception as e:
+            # Sem sessão gravada a resposta ainda vale; a próxima mensagem só perde o contexto
+            print(f"Conversation session error: {str(e)}")
+            record_error('whatsapp', 'conversation_session')
         return response
     
     except Exception as e:
-        return "Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente em alguns minutos."
+        return PROCESSING_ERROR_RESPONSE
 
-def process_media_message(phone_number, media_id, media_type):
-    """Processar mensagem com mídia (imagem/documento)"""
+async def process_text_message_async(runner, phone_number, text):
+    """Mesmo fluxo de process_text_message: sessão e banco no pool de threads, LLM no loop"""
     try:
-        # Baixar mídia do WhatsApp
-        media_url = get_media_url(media_id)
+        ai_service = runner.ai_service()
+        store = get_session_store()
+        session = await runner.run_sync(store.load, phone_number)
         
-        if media_url:
-            # Aqui você salvaria o arquivo e processaria com OCR
-            return "Documento recebido com sucesso! Estamos processando e em breve entraremos em contato."
-        else:
-            return "Não foi possível processar o documento. Tente enviar novamente."
+        new_cpf = remember_cpf(session, text)
+        intent = local_intent(text)
+        if intent is None:
+            intent = checked_intent(text, await ai_service.classify_intent(text))
+        if new_cpf and session['last_intent'] == 'status_inquiry':
+            intent = 'status_inquiry'
+        
+        response, context = await runner.run_sync(prepare_answer, session, intent)
+        if response is None:
+            response = await ai_service.generate_response(text, session['phone'], history=session['turns'], context=context)
+        
+        try:
+            await runner.run_sync(store.record_turn, session, text, response, intent, new_cpf)
+        except Exception as e:
+            print(f"Conversation session error: {str(e)}")
+            record_error('whatsapp', 'conversation_session')
+        return response
     
     except Exception as e:
-        return "Erro ao processar documento. Tente novamente."
+        return PROCESSING_ERROR_RESPONSE
+
+def prepare_answer(session, intent):
+    """Resposta que dispensa o LLM, ou (None, contexto da cirurgia) quando o LLM deve responder
+
+    As cirurgias do paciente vêm da sessão quando já resolvidas.
+    """
+    # Cumprimentos são respondidos sem chamar o LLM nem consultar o banco
+    if intent == 'greeting':
+        return GREETING_RESPONSE, None
+    
+    latest_surgery = session_surgery(session)
+    
+    # Verificar se é uma consulta sobre status
+    if intent == 'status_inquiry':
+        if latest_surgery:
+            return f"Olá! Sua cirurgia de {latest_surgery.surgery_type} está com status: {latest_surgery.status}. ", None
+        else:
+            return "Não encontramos nenhuma cirurgia cadastrada para este número. Entre em contato conosco para mais informações.", None
+    
+    return None, surgery_context(latest_surgery) if latest_surgery else None
 
-def get_media_url(media_id):
-    """Obter URL da mídia do WhatsApp"""
+def answer_text_message(session, text, intent, ai_service):
+    """Responder conforme a intenção"""
+    response, context = prepare_answer(session, intent)
+    if response is not None:
+        return response
+    
+    # Usar IA para responder outras perguntas, com as últimas mensagens da conversa
+    return ai_service.generate_response(text, session['phone'], history=session['turns'], context=context)
+
+def process_media_message(phone_number, media, media_type):
+    """Processar mensagem com mídia (imagem/documento)
+    
+    No modo 'queue' (WHATSAPP_MEDIA_MODE), download, criação do Document e OCR rodam
+    nos workers da fila e aqui só o job é gravado; no modo 'sync' só o download e o
+    Document ficam na requisição, e o OCR roda em segundo plano.
+    """
     try:
-        api_url = current_app.config.get('WHATSAPP_API_URL')
-        api_token = current_app.config.get('WHATSAPP_API_TOKEN')
-        
-        headers = {
-            'Authorization': f'Bearer {api_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.get(f'{api_url}/{media_id}', headers=headers)
-        
-        if response.status_code == 200:
-            return response.json().get('url')
-        
-        return None
+        if current_app.config.get('WHATSAPP_MEDIA_MODE') == 'queue':
+            enqueue_many('whatsapp_media', [
+                (f"whatsapp_media:{media['id']}", {'phone_number': phone_number, 'media': media, 'media_type': media_type})
+            ])
+        elif ingest_media(phone_number, media) is None:
+            return "Não encontramos uma cirurgia cadastrada para este número. Entre em contato com nossa equipe."
+        else:
+            start_background_ocr(current_app._get_current_object())
+        return "Documento recebido com sucesso! Estamos processando e em breve entraremos em contato."
     
+    except MediaTooLarge:
+        return "O arquivo é muito grande. Envie uma versão menor ou em outro formato."
     except Exception as e:
-        print(f"Error getting media URL: {str(e)}")
-        return None
+        print(f"Error processing WhatsApp media: {str(e)}")
+        record_error('whatsapp', 'process_media')
+        db.session.rollback()
+        return "Erro ao processar documento. Tente novamente."
 
 def send_whatsapp_message(phone_number, message):
-    """Enviar mensagem via WhatsApp"""
+    """Enviar mensagem via WhatsApp (no modo 'queue', só grava na fila de saída)"""
+    if current_app.config.get('WHATSAPP_OUTBOUND_MODE') == 'queue':
+        try:
+            return enqueue_messages([(phone_number, text_payload(message))],
+                                    max_attempts=current_app.config.get('WHATSAPP_SEND_MAX_ATTEMPTS', 5)) == 1
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error queueing WhatsApp message: {str(e)}")
+            record_error('whatsapp', 'enqueue_message')
+            return False
+    
     try:
-        api_url = current_app.config.get('WHATSAPP_API_URL')
-        api_token = current_app.config.get('WHATSAPP_API_TOKEN')
-        
-        headers = {
-            'Authorization': f'Bearer {api_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'messaging_product': 'whatsapp',
             'to': phone_number,
@@ -127,14 +256,28 @@ def send_whatsapp_message(phone_number, message):
             }
         }
         
-        response = requests.post(f'{api_url}/messages', 
-                               headers=headers, 
-                               json=payload)
+        response = get_client('whatsapp').post('/messages', json=payload)
         
         return response.status_code == 200
     
     except Exception as e:
         print(f"Error sending WhatsApp message: {str(e)}")
+        record_error('whatsapp', 'send_message')
+        return False
+
+async def send_whatsapp_message_async(runner, phone_number, message):
+    """Enviar a resposta pelo cliente assíncrono (no modo 'queue' de saída, grava na fila pelo pool de threads)"""
+    if runner.app.config.get('WHATSAPP_OUTBOUND_MODE') == 'queue':
+        return await runner.run_sync(send_whatsapp_message, phone_number, message)
+    
+    try:
+        payload = {'messaging_product': 'whatsapp', 'to': phone_number, **text_payload(message)}
+        response = await runner.client('whatsapp').post('/messages', json=payload)
+        return response.status_code == 200
+    
+    except Exception as e:
+        print(f"Error sending WhatsApp message: {str(e)}")
+        record_error('whatsapp', 'send_message')
         return False
 
 @whatsapp_bp.route('/whatsapp/send', methods=['POST'])
@@ -147,7 +290,9 @@ def send_message():
         
         success = send_whatsapp_message(phone_number, message)
         
-        if success:
+        if success and current_app.config.get('WHATSAPP_OUTBOUND_MODE') == 'queue':
+            return jsonify({'status': 'Message queued'}), 202
+        elif success:
             return jsonify({'status': 'Message sent successfully'}), 200
         else:
             return jsonify({'error': 'Failed to send message'}), 500
@@ -155,3 +300,38 @@ def send_message():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@whatsapp_bp.route('/whatsapp/send-bulk', methods=['POST'])
+def send_bulk():
+    """Enfileirar várias mensagens (texto ou template) para o dispatcher enviar"""
+    try:
+        data = request.get_json()
+        items = []
+        for entry in data['messages']:
+            if entry.get('template'):
+                items.append((entry['phone_number'], template_payload(entry['template'])))
+            else:
+                items.append((entry['phone_number'], text_payload(entry['message'])))
+        
+        max_items = current_app.config.get('WHATSAPP_BULK_MAX_MESSAGES', 10000)
+        if len(items) > max_items:
+            return jsonify({'error': f'Too many messages (max {max_items})'}), 400
+        
+        queued = enqueue_messages(items, campaign=data.get('campaign'),
+                                  max_attempts=current_app.config.get('WHATSAPP_SEND_MAX_ATTEMPTS', 5))
+        return jsonify({'status': 'Messages queued', 'queued': queued, 'campaign': data.get('campaign')}), 202
+    
+    except KeyError as e:
+        return jsonify({'error': f'Missing field: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+@whatsapp_bp.route('/whatsapp/campaigns/<campaign>', methods=['GET'])
+def campaign_status(campaign):
+    """Quantidade de mensagens da campanha por status de entrega"""
+    rows = db.session.query(OutboundMessage.status, db.func.count(OutboundMessage.id)) \
+        .filter(OutboundMessage.campaign == campaign) \
+        .group_by(OutboundMessage.status) \
+        .all()
+    statuses = {status: count for status, count in rows}
+    return jsonify({'campaign': campaign, 'total': sum(statuses.values()), 'statuses': statuses}), 200
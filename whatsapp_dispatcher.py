@@ -0,0 +1,341 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, update
+from sqlalchemy.orm import aliased
+from src.models.user import db
+from src.models.outbound_message import OutboundMessage, DELIVERY_STATUS_ORDER
+from src.services.http_client import get_client
+from src.services.job_queue import retry_delay
+from src.services.metrics import record_error
+
+def text_payload(message):
+    return {'type': 'text', 'text': {'body': message}}
+
+def template_payload(template):
+    """Mensagem de template: {'name': ..., 'language': {'code': 'pt_BR'}, 'components': [...]}"""
+    return {'type': 'template', 'template': template}
+
+def enqueue_messages(items, campaign=None, max_attempts=None):
+    """Gravar mensagens de saída na fila (um INSERT em lote); retorna quantas foram gravadas
+
+    `items` é uma lista de (telefone, payload). Mensagens de um mesmo telefone saem
+    na ordem em que foram gravadas.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            'phone': re.sub(r'\D', '', phone),
+            'payload': payload,
+            'campaign': campaign,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or 5,
+            'available_at': now,
+            'created_at': now,
+            'updated_at': now
+        }
+        for phone, payload in items
+    ]
+    if rows:
+        db.session.execute(OutboundMessage.__table__.insert(), rows)
+        db.session.commit()
+    return len(rows)
+
+class TokenBucket:
+    """Limitador de taxa global do processo (token bucket, seguro entre threads)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquear até haver um token disponível"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Suspender os envios (ex.: 429 com Retry-After) e esvaziar o balde"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+def claim_messages(limit, lease_seconds=120):
+    """Reservar até `limit` mensagens, no máximo uma por telefone (a mais antiga pendente)"""
+    now = datetime.utcnow()
+
+    # Lease expirado: o dispatcher caiu durante o envio. Como em finish_message, quem já
+    # esgotou as tentativas falha; as demais mensagens voltam para a fila
+    stale = and_(OutboundMessage.status == 'sending', OutboundMessage.locked_until < now)
+    db.session.execute(
+        update(OutboundMessage)
+        .where(stale, OutboundMessage.attempts >= OutboundMessage.max_attempts)
+        .values(status='failed', locked_until=None, updated_at=now,
+                last_error='Lease expirado na última tentativa de envio')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(OutboundMessage)
+        .where(stale, OutboundMessage.attempts < OutboundMessage.max_attempts)
+        .values(status='queued', locked_until=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+    older = aliased(OutboundMessage)
+    blocked = exists().where(
+        older.phone == OutboundMessage.phone,
+        older.id < OutboundMessage.id,
+        older.status.in_(('queued', 'sending'))
+    )
+    candidate_ids = [
+        row[0] for row in db.session.query(OutboundMessage.id)
+        .filter(OutboundMessage.status == 'queued', OutboundMessage.available_at <= now, ~blocked)
+        .order_by(OutboundMessage.id)
+        .limit(limit)
+    ]
+
+    locked_until = now + timedelta(seconds=lease_seconds)
+    claimed = []
+    for message_id in candidate_ids:
+        # UPDATE condicional: só um dispatcher consegue reservar cada mensagem
+        result = db.session.execute(
+            update(OutboundMessage)
+            .where(OutboundMessage.id == message_id, OutboundMessage.status == 'queued')
+            .values(status='sending', locked_until=locked_until,
+                    attempts=OutboundMessage.attempts + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(message_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return [
+        {'id': row.id, 'phone': row.phone, 'payload': row.payload, 'attempts': row.attempts,
+         'max_attempts': row.max_attempts, 'locked_until': row.locked_until}
+        for row in db.session.query(
+            OutboundMessage.id, OutboundMessage.phone, OutboundMessage.payload, OutboundMessage.attempts,
+            OutboundMessage.max_attempts, OutboundMessage.locked_until
+        ).filter(OutboundMessage.id.in_(claimed)).order_by(OutboundMessage.id)
+    ]
+
+def renew_message_lease(message, lease_seconds):
+    """Estender o lease da mensagem reservada; False se ele expirou e a mensagem foi liberada"""
+    locked_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    result = db.session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.id == message['id'],
+               OutboundMessage.status == 'sending',
+               OutboundMessage.locked_until == message['locked_until'])
+        .values(locked_until=locked_until)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return False
+    message['locked_until'] = locked_until
+    return True
+
+def finish_message(message, **values):
+    """Gravar o resultado do envio se o lease ainda pertence a este dispatcher"""
+    now = datetime.utcnow()
+    values['updated_at'] = now
+    values['locked_until'] = None
+    db.session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.id == message['id'],
+               OutboundMessage.status == 'sending',
+               OutboundMessage.locked_until == message['locked_until'])
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def apply_delivery_statuses(statuses):
+    """Atualizar o status de entrega a partir dos eventos `statuses` do webhook
+
+    Os eventos são agrupados por wamid (vale o mais avançado) e as mensagens
+    afetadas são lidas com uma única consulta IN. Status nunca retrocedem.
+    """
+    latest = {}
+    for status in statuses:
+        wamid, value = status.get('id'), status.get('status')
+        if not wamid or (value not in DELIVERY_STATUS_ORDER and value != 'failed'):
+            continue
+        current = latest.get(wamid)
+        if current is None or value == 'failed' or \
+                DELIVERY_STATUS_ORDER.get(value, -1) > DELIVERY_STATUS_ORDER.get(current.get('status'), -1):
+            latest[wamid] = status
+    if not latest:
+        return 0
+
+    updated = 0
+    for message in OutboundMessage.query.filter(OutboundMessage.wa_message_id.in_(list(latest))):
+        status = latest[message.wa_message_id]
+        value = status['status']
+        timestamp = datetime.utcfromtimestamp(int(status['timestamp'])) if status.get('timestamp') else datetime.utcnow()
+
+        if value == 'failed':
+            message.status = 'failed'
+            message.last_error = str(status.get('errors') or 'failed')[:2000]
+        elif DELIVERY_STATUS_ORDER[value] > DELIVERY_STATUS_ORDER.get(message.status, -1):
+            message.status = value
+        else:
+            continue
+
+        if value == 'sent':
+            message.sent_at = message.sent_at or timestamp
+        elif value == 'delivered':
+            message.delivered_at = timestamp
+        elif value == 'read':
+            message.read_at = timestamp
+        updated += 1
+
+    db.session.commit()
+    return updated
+
+class WhatsAppDispatcher:
+    """Envio das mensagens de saída com taxa global limitada e ordem FIFO por destinatário
+
+    Uma thread reserva mensagens (só a primeira pendente de cada telefone) e as
+    entrega a um pool de threads de envio; cada envio consome um token do balde.
+    429 pausa o balde pelo Retry-After; 429/5xx/falhas de rede reagendam a
+    mensagem com backoff. O balde é por processo: com vários dispatchers, divida
+    WHATSAPP_SEND_RATE entre eles.
+    """
+
+    def __init__(self, app, rate=None, burst=None, workers=None):
+        self.app = app
+        config = app.config
+        self.bucket = TokenBucket(rate or config.get('WHATSAPP_SEND_RATE', 20),
+                                  burst or config.get('WHATSAPP_SEND_BURST', 20))
+        self.workers = workers or config.get('WHATSAPP_DISPATCH_WORKERS', 8)
+        self.lease_seconds = config.get('QUEUE_LEASE_SECONDS', 120)
+        self.poll_interval = config.get('QUEUE_POLL_INTERVAL', 1.0)
+        self._slots = threading.BoundedSemaphore(self.workers * 2)  # Mensagens reservadas ainda não enviadas
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # Um envio terminou: a próxima mensagem do telefone pode ser reservada
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        """Iniciar a thread de reserva e o pool de envio"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='whatsapp-send')
+        self._thread = threading.Thread(target=self._run, name='whatsapp-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Parar de reservar mensagens e aguardar os envios em andamento"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def run_forever(self):
+        """Executar até receber KeyboardInterrupt (uso via CLI)"""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            free = 0
+            while self._slots.acquire(blocking=False):
+                free += 1
+            messages = []
+            if free:
+                with self.app.app_context():
+                    try:
+                        messages = claim_messages(free, self.lease_seconds)
+                    except Exception as e:
+                        print(f"WhatsApp dispatcher error: {str(e)}")
+                        record_error('whatsapp_dispatcher', 'claim')
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+                for _ in range(free - len(messages)):
+                    self._slots.release()
+
+            for message in messages:
+                self._executor.submit(self._send, message)
+
+            if not messages:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _send(self, message):
+        try:
+            self.bucket.acquire()
+            with self.app.app_context():
+                try:
+                    self._deliver(message)
+                except Exception as e:
+                    print(f"WhatsApp dispatcher error: {str(e)}")
+                    record_error('whatsapp_dispatcher', 'send')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _deliver(self, message):
+        # A espera pelo balde pode passar do lease: outro dispatcher já pode ter reservado
+        # a mensagem de novo. Renovar logo antes do POST evita o envio em dobro
+        if not renew_message_lease(message, self.lease_seconds):
+            print(f"WhatsApp message {message['id']}: lease perdido antes do envio")
+            return
+        payload = dict(message['payload'], messaging_product='whatsapp', to=message['phone'])
+        retry_after = None
+        try:
+            # Sem retentativas no cliente: o reagendamento é feito aqui, sem prender a thread
+            response = get_client('whatsapp').post('/messages', json=payload, retry=False, max_retries=0)
+        except Exception as e:
+            error = str(e)
+        else:
+            if response.status_code == 200:
+                wa_message_id = (response.json().get('messages') or [{}])[0].get('id')
+                finish_message(message, status='sent', wa_message_id=wa_message_id,
+                               sent_at=datetime.utcnow(), last_error=None)
+                return
+
+            error = f'HTTP {response.status_code}: {response.text[:500]}'
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get('Retry-After', 1))
+                except ValueError:
+                    retry_after = 1.0
+                self.bucket.pause(retry_after)
+            elif response.status_code < 500:
+                # Erro do pedido (número inválido, template inexistente...): não adianta repetir
+                finish_message(message, status='failed', last_error=error)
+                return
+
+        if message['attempts'] >= message['max_attempts']:
+            finish_message(message, status='failed', last_error=error)
+        else:
+            delay = max(retry_after or 0, retry_delay(message['attempts']))
+            finish_message(message, status='queued', last_error=error,
+                           available_at=datetime.utcnow() + timedelta(seconds=delay))